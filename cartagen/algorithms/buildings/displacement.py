@@ -6,7 +6,7 @@ from cartagen.utils.partitioning.network import partition_networks
 
 def random_displacement(
         polygons, networks=None, polygon_distance=10.0, network_distance=10.0,
-        max_trials=25, max_displacement=10.0, network_partitioning=None
+        max_trials=25, max_displacement=10.0, network_partitioning=None, seed=None
     ):
     """
     Iteratively displace polygons overlapping each other and the provided network.
@@ -41,6 +41,9 @@ def random_displacement(
     network_partioning : GeoDataFrame of LineString, optional
         The network to partition the data with. If provided, each network
         face is treated individually, thus improving performance on larger dataset.
+    seed : int, optional
+        The seed of the random number generator. If provided, running twice the
+        algorithm on the same data returns the same solution.
 
     Returns
     -------
@@ -58,6 +61,8 @@ def random_displacement(
 
     POLYGONS = polygons.to_dict('records')
 
+    generator = random if seed is None else random.Random(seed)
+
     def __loop(indexes, network):
         """
         Launch a loop to iteratively displace polygons randomly
@@ -74,7 +79,7 @@ def random_displacement(
         # long as the rate mean is above 0 and the max trial count is not exceeded
         while rate_mean > 0 and trial <= max_trials:
             # Selecting a random building index
-            random_index = random.randint(0, len(indexes) - 1)
+            random_index = generator.randint(0, len(indexes) - 1)
             random_building = indexes[random_index]
 
             overlap = __get_building_overlap(random_building, indexes, network)
@@ -82,9 +87,9 @@ def random_displacement(
             # Checking if that building is overlapping
             if overlap > 0:
                 # Selecting a random angle (0-360)
-                random_angle = random.uniform(0, 360)
+                random_angle = generator.uniform(0, 360)
                 # Selecting a random length (0-max displacement variable)
-                random_length = random.uniform(0, max_displacement)
+                random_length = generator.uniform(0, max_displacement)
                 # Calculate displacement for x and y
                 dx = math.cos(random_angle) * random_length
                 dy = math.sin(random_angle) * random_length
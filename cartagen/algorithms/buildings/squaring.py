@@ -3,6 +3,7 @@ import numpy as np
 from shapely.geometry import Polygon, Point
 
 from cartagen.utils.geometry.polygon import orientation
+from cartagen.utils.math.least_squares import iterate_least_squares
 from cartagen.utils.math.vector import Vector2D
 
 def square_polygon_naive(polygon, orient='primary', angle_tolerance=8.0, correct_tolerance=0.6, remove_flat=True):
@@ -310,12 +311,16 @@ class Squarer:
     def __init__(
             self, max_iteration=1000, norm_tolerance=0.05,
             right_tolerance=10, flat_tolerance=10, half_right_tolerance=7,
-            fixed_weight=5, right_weight=100, flat_weight=50, half_right_weight=10, switch_new=False
+            fixed_weight=5, right_weight=100, flat_weight=50, half_right_weight=10, switch_new=False,
+            damping=1.0, line_search=False, stagnation=None
         ):
 
         self.SWITCH_NEW = switch_new
         self.MAX_ITERATION = max_iteration
         self.NORM_TOLERANCE = norm_tolerance
+        self.DAMPING = damping # fraction of dx applied at each iteration
+        self.LINE_SEARCH = line_search # halve dx until the weighted residuals decrease
+        self.STAGNATION = stagnation # minimum decrease ratio of the residuals over 5 iterations
         self.right_tolerance = right_tolerance # 10 90° angles tolerance
         self.flat_tolerance = flat_tolerance # 10 flat angles tolerance
         self.half_right_tolerance = half_right_tolerance # 7 45/135° angles tolerance
@@ -504,7 +509,8 @@ class Squarer:
         wRight = np.full(nb_rights, self.right_weight)
         wFlat = np.full(nb_flats, self.flat_weight)
         #wHr = np.full(nb_half_rights, self.half_right_weight)
-        self.P = np.diag(np.concatenate((wfix, wRight, wFlat)))
+        # diagonal of the weight matrix
+        self.P = np.concatenate((wfix, wRight, wFlat))
 
     ## new vectors
     def __partial_derivatives_dotp(self, points, indices):
@@ -572,17 +578,6 @@ class Squarer:
         #    a = np.vstack((a, partialHr2))
         return a
 
-    def __compute_dx(self, points):
-        A = self.__get_A(points)
-        B = self.__get_B(points)
-        atp = A.T @ self.P 
-        atpa = atp @ A
-        atpb = atp @ B
-        #dx = np.linalg.lstsq(atpa, atpb)
-        #dx = np.linalg.inv(atpa) @ atpb
-        dx = np.linalg.solve(atpa, atpb)
-        return dx
-    
     def __prepare_square(self, shapes):
         if len(shapes) == 0:
             return np.array([])
@@ -595,19 +590,24 @@ class Squarer:
         self.__get_P()
         return np.array(unik_points)
     
-    def square(self, shapes):
+    def square(self, shapes, warm_start=None):
         """squares a collection of shapely multilinestrings or polygons
         returns a numpy array of the points after the least square process
+        warm_start can be the points returned by a previous call on the same shapes
         """
         points = self.__prepare_square(shapes)
-        nb_points = len(points)
-        for i in range(self.MAX_ITERATION):
-            dx = self.__compute_dx(points)
-            points += dx.reshape((nb_points, 2))
-            # print(i, np.linalg.norm(dx, ord=np.inf))
-            if np.linalg.norm(dx, ord=np.inf) < self.NORM_TOLERANCE:
-                break
-        self.nb_iters = i
+        if warm_start is not None:
+            if len(warm_start) != len(points):
+                raise Exception('The warm start must contain the same points as the shapes.')
+            points = np.array(warm_start, dtype=float)
+
+        assemble = lambda p: (self.__get_A(p), self.P, self.__get_B(p))
+        points, self.iterations = iterate_least_squares(
+            points, assemble, self.MAX_ITERATION, self.NORM_TOLERANCE,
+            damping=self.DAMPING, line_search=self.LINE_SEARCH, residual=self.__get_B,
+            stagnation=self.STAGNATION
+        )
+        self.nb_iters = len(self.iterations) - 1
         return points
 
 
@@ -6,7 +6,7 @@ from cartagen.utils.network.roads import Crossroad
 from cartagen.utils.geometry.line import split_line_at_point
 from cartagen.utils.geometry.angle import angle_between_2lines
 
-def collapse_branching_crossroads(roads, crossroads, maximum_area=None):
+def collapse_branching_crossroads(roads, crossroads, maximum_area=None, topology=None):
     """
     Collapse branching crossroads to a point.
 
@@ -24,6 +24,10 @@ def collapse_branching_crossroads(roads, crossroads, maximum_area=None):
     maximum_area : float, optional
         The area, in square meter, below which branching crossroads are collapsed.
         Collpase all crossraods if left to None.
+    topology : RoadNetwork, optional
+        The topology of the road network, to share its spatial index
+        with other algorithms. It must be built on the provided roads.
+        The returned roads are modified, so the topology must be updated before being used again.
 
     Returns
     -------
@@ -69,7 +73,11 @@ def collapse_branching_crossroads(roads, crossroads, maximum_area=None):
         network.append(road['geometry'])
 
     # Build the spatial index
-    tree = shapely.STRtree(network)
+    if topology is None:
+        tree = shapely.STRtree(network)
+    else:
+        topology.check(network)
+        tree = topology.tree
 
     # This list will store the indexes of roads to throw away
     originals = []
@@ -7,7 +7,7 @@ from cartagen.utils.network.faces import NetworkFace
 from cartagen.utils.geometry.skeletonization import SkeletonTIN
 from cartagen.utils.geometry.line import extend_line_with_point, merge_linestrings
 
-def collapse_dual_carriageways(roads, carriageways, sigma=None, propagate_attributes=None):
+def collapse_dual_carriageways(roads, carriageways, sigma=None, propagate_attributes=None, topology=None):
     """
     Collapse dual carriageways using a TIN skeleton.
 
@@ -27,6 +27,10 @@ def collapse_dual_carriageways(roads, carriageways, sigma=None, propagate_attrib
     propagate_attributes : list of str, optional
         Propagate the provided list of column name to the resulting network.
         The propagated attribute is the one from the longest line.
+    topology : RoadNetwork, optional
+        The topology of the road network, to share its spatial index
+        with other algorithms. It must be built on the provided roads.
+        The returned roads are modified, so the topology must be updated before being used again.
 
     See Also
     --------
@@ -56,7 +60,11 @@ def collapse_dual_carriageways(roads, carriageways, sigma=None, propagate_attrib
         network.append(n['geometry'])
 
     # Calculate the spatial index on roads
-    tree = shapely.STRtree(network)
+    if topology is None:
+        tree = shapely.STRtree(network)
+    else:
+        topology.check(network)
+        tree = topology.tree
 
     # This list will store the indexes of roads to throw away
     originals = []
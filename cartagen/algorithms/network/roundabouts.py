@@ -3,7 +3,7 @@ import shapely
 
 from cartagen.utils.geometry.line import extend_line_with_point
 
-def collapse_roundabouts(roads, roundabouts, crossroads=None, maximum_diameter=None):
+def collapse_roundabouts(roads, roundabouts, crossroads=None, maximum_diameter=None, topology=None):
     """
     Collapse roundabouts to a point.
 
@@ -21,6 +21,10 @@ def collapse_roundabouts(roads, roundabouts, crossroads=None, maximum_diameter=N
         allows incoming branching crossroads on roundabouts to be collapsed as well. 
     maximum_diameter : float, optional
         Diameter, in meter, below which roundabouts are collapsed. Collpase all roundabouts if left to None.
+    topology : RoadNetwork, optional
+        The topology of the road network, to share its spatial index
+        with other algorithms. It must be built on the provided roads.
+        The returned roads are modified, so the topology must be updated before being used again.
 
     Returns
     -------
@@ -64,7 +68,11 @@ def collapse_roundabouts(roads, roundabouts, crossroads=None, maximum_diameter=N
         network.append(n['geometry'])
 
     # Calculate the spatial index on roads
-    tree = shapely.STRtree(network)
+    if topology is None:
+        tree = shapely.STRtree(network)
+    else:
+        topology.check(network)
+        tree = topology.tree
 
     # This list will store the indexes of interior roads to throw away
     nokeep = []
@@ -1,3 +1,5 @@
+import numpy as np
+import shapely
 from shapely.geometry import MultiPoint, Polygon
 from cartagen.utils.partitioning.quadtree import PointSetQuadTree
 from cartagen.utils.partitioning.tessellation import tessellate
@@ -446,59 +448,65 @@ class LabelGrid():
     def set_point_label_grid(self):
         """Set the attributes points_res and grid of the LabelGrid object."""
         self.__grid = self.__createGrid()
-        
-        lst_in_value = [self.__points.loc[cell.contains(self.__points['geometry'])] 
-                        for cell in self.__grid['geometry']]
 
-        lst_inter_value = [self.__points.loc[cell.touches(self.__points['geometry'])] 
-                           for cell in self.__grid['geometry']]
-        
-        lst_all_value = [lst_inter_value[i] 
-                         if lst_in_value[i].empty 
-                         else pd.concat([lst_in_value[i],lst_inter_value[i]]) 
-                         for i in range(len(lst_in_value))]
-               
+        cells, points, values = self.__get_cell_points()
+        centroids = np.asarray(self.__grid.centroid.values)
+
         if self.__mode == 'simplification':
-            simplified = []
-            for c, centroid in enumerate(self.__grid.centroid):
-                points = lst_all_value[c]
-                if not points.empty:
-                    mindist = float("inf")
-                    nearest = None
-                    for index, point in points.iterrows():
-                        dist = point['geometry'].distance(centroid)
-                        if dist < mindist:
-                            mindist = dist
-                            nearest = point
-                    nearest['cell'] = c
-                    simplified.append(nearest)
+            # Retain the point the closest to the center of each cell
+            distances = shapely.distance(np.asarray(self.__points.geometry.values)[points], centroids[cells])
+            nearest = self.__first_of_cells(cells, np.lexsort((np.arange(len(cells)), distances, cells)))
+            simplified = self.__points.iloc[points[nearest]].copy()
+            simplified['cell'] = cells[nearest]
             self.__points_res = gpd.GeoDataFrame(simplified, crs=self.__crs)
 
         elif self.__mode == 'selection':
-            selected = []
-            for c, cell in self.__grid.iterrows():
-                points = lst_all_value[c]
-                if not points.empty:
-                    largest = points.nlargest(1, self.__column).to_dict('records')[0]
-                    largest['cell'] = c
-                    selected.append(largest)
+            # Retain the point with the largest value in each cell
+            valid = ~np.isnan(values)
+            cells, points, values = cells[valid], points[valid], values[valid]
+            largest = self.__first_of_cells(cells, np.lexsort((np.arange(len(cells)), -values, cells)))
+            selected = self.__points.iloc[points[largest]].copy().reset_index(drop=True)
+            selected['cell'] = cells[largest]
             self.__points_res = gpd.GeoDataFrame(selected, crs=self.__crs)
             
         elif self.__mode == 'aggregation':
-            aggregation = []
-            for c, centroid in enumerate(self.__grid.centroid):
-                p = lst_all_value[c]
-                entry = { "count": len(p) }
-                if self.__column is not None:
-                    entry["sum"] = p[self.__column].sum()
-                    entry["mean"] = p[self.__column].mean()
-
-                entry["geometry"] = centroid
-                entry["cell"] = c
-                if len(p) > 0: #only keep centroid of cells that contains points
-                    aggregation.append(entry)
+            occupied, count = np.unique(cells, return_counts=True)
+            aggregation = { "count": count }
+            if self.__column is not None:
+                grouped = pd.Series(values).groupby(cells)
+                aggregation["sum"] = grouped.sum().values
+                aggregation["mean"] = grouped.mean().values
+
+            aggregation["geometry"] = centroids[occupied]
+            aggregation["cell"] = occupied
+            #only keep centroid of cells that contains points
             self.__points_res = gpd.GeoDataFrame(aggregation, crs=self.__crs)
 
+    def __get_cell_points(self):
+        """
+        Return the cells and the points they contain or touch, ordered by cell, with the
+        contained points before the touching ones, and the value of the points in the chosen column.
+        """
+        geometries = np.asarray(self.__points.geometry.values)
+        polygons = np.asarray(self.__grid.geometry.values)
+        cells, points = shapely.STRtree(geometries).query(polygons, predicate='intersects')
+        touches = shapely.touches(polygons[cells], geometries[points])
+        order = np.lexsort((points, touches, cells))
+        cells, points = cells[order], points[order]
+
+        values = None
+        if self.__column is not None and self.__mode != 'simplification':
+            values = self.__points[self.__column].to_numpy(dtype=float)[points]
+
+        return cells, points, values
+
+    def __first_of_cells(self, cells, order):
+        """Return the position of the first element of each cell given an ordering sorted by cell."""
+        cells = cells[order]
+        first = np.ones(len(cells), dtype=bool)
+        first[1:] = cells[1:] != cells[:-1]
+        return order[first]
+
     def getPointResults(self):
         """Get points results."""
         return self.__points_res
@@ -506,13 +514,13 @@ class LabelGrid():
     def getGrid(self):
         """Get the grid."""
         if self.__mode == 'aggregation':
-            grid = self.__grid.to_dict('records')
-            for p, point in self.__points_res.iterrows():
-                grid[point['cell']]['count'] = point['count']
-                if self.__column is not None:
-                    grid[point['cell']]['sum'] = point['sum']
-                    grid[point['cell']]['mean'] = point['mean']
-            self.__grid = gpd.GeoDataFrame(grid, crs=self.__crs)
+            grid = self.__grid.copy()
+            cells = self.__points_res['cell'].to_numpy()
+            grid.loc[cells, 'count'] = self.__points_res['count'].to_numpy()
+            if self.__column is not None:
+                grid.loc[cells, 'sum'] = self.__points_res['sum'].to_numpy()
+                grid.loc[cells, 'mean'] = self.__points_res['mean'].to_numpy()
+            self.__grid = grid
         return self.__grid
 
     def draw(self):
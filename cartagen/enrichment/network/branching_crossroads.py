@@ -8,7 +8,7 @@ from cartagen.utils.geometry.distances import distance_area
 def detect_branching_crossroads(roads, roundabouts=None,
         area_threshold=2500, maximum_distance_area=0.5, 
         allow_middle_node=True, middle_angle_tolerance=10.0,
-        allow_single_4degree_node=True
+        allow_single_4degree_node=True, topology=None
     ):
     """
     Detect branching crossroads based on geometric properties.
@@ -40,6 +40,9 @@ def detect_branching_crossroads(roads, roundabouts=None,
         for the fourth node of the crossroad to be considered the middle node.
     allow_single_4degree_node : bool, optional
         If set to True, allow one and only one node to have a degree of 4.
+    topology : RoadNetwork, optional
+        The topology of the road network, to share its faces and spatial indexes
+        between multiple algorithms. It must be built on the provided roads.
 
     Returns
     -------
@@ -73,17 +76,25 @@ def detect_branching_crossroads(roads, roundabouts=None,
     for road in roads:
         network.append(road['geometry'])
 
-    faces = network_faces(network, convex_hull=False)
-    tree = shapely.STRtree(network)
+    if topology is None:
+        faces = network_faces(network, convex_hull=False)
+        tree = shapely.STRtree(network)
+        incidence = None
+    else:
+        topology.check(network)
+        faces = topology.faces()
+        tree = topology.tree
+        incidence = topology.face_roads()
 
     crossroads = []
     index = 0
-    for face in faces:
+    for fid, face in enumerate(faces):
         add, infos = is_branching_crossroad(
             face, network, tree, area_threshold,
             maximum_distance_area, roundabouts,
             allow_middle_node, middle_angle_tolerance,
-            allow_single_4degree_node
+            allow_single_4degree_node,
+            None if incidence is None else incidence[fid]
         )
         if add:
             infos['cid'] = index
@@ -99,7 +110,7 @@ def detect_branching_crossroads(roads, roundabouts=None,
 def is_branching_crossroad(polygon, roads, tree,
         area_threshold, maximum_distance_area, roundabouts=None,
         allow_middle_node=True, middle_angle_tolerance=10,
-        allow_single_4degree_node=True
+        allow_single_4degree_node=True, original=None
     ):
     """
     Return True or False whether the given polygon is a branching crossroad or not depending on the given parameters.
@@ -127,6 +138,9 @@ def is_branching_crossroad(polygon, roads, tree,
     allow_single_4degree_node : bool, optional
         If set to True, allow one and only one node to have a degree of 4.
         Default value set to False.
+    original : list of int, optional
+        The indexes of the roads intersecting the polygon, if already known.
+        The default value is set to None.
     """
 
     def is_triangular(dist_area, polygon, nodes, middle=None):
@@ -157,7 +171,7 @@ def is_branching_crossroad(polygon, roads, tree,
     area = polygon.area
     # Check if the area of the polygon is larger than the threshold
     if area < area_threshold:
-        crossroad = Crossroad(roads, tree, polygon)
+        crossroad = Crossroad(roads, tree, polygon, original=original)
 
         if crossroad is not None:
             nodes = crossroad.nodes
@@ -3,7 +3,7 @@ import geopandas as gpd
 from cartagen.utils.partitioning.network import network_faces
 from cartagen.utils.network import *
 
-def detect_dead_ends(roads, outside_faces=False):
+def detect_dead_ends(roads, outside_faces=False, topology=None):
     """
     Detect dead-ends groups.
 
@@ -21,6 +21,9 @@ def detect_dead_ends(roads, outside_faces=False):
         Whether dead-ends should be calculated on the outside faces
         of the road network. This can induce wrong characterization
         on the border of the provided dataset.
+    topology : RoadNetwork, optional
+        The topology of the road network, to share its faces and spatial indexes
+        between multiple algorithms. It must be built on the provided roads.
 
     Returns
     -------
@@ -47,7 +50,11 @@ def detect_dead_ends(roads, outside_faces=False):
     for road in roads:
         network.append(road['geometry'])
 
-    faces = network_faces(network, convex_hull=outside_faces)
+    if topology is None:
+        faces = network_faces(network, convex_hull=outside_faces)
+    else:
+        topology.check(network)
+        faces = topology.faces(outside_faces)
 
     hull = None
     if outside_faces:
@@ -57,8 +64,12 @@ def detect_dead_ends(roads, outside_faces=False):
     deadends = []
 
     # Create a tree for the network roads and for the network faces
-    netree = shapely.STRtree(network)
-    facetree = shapely.STRtree(faces)
+    if topology is None:
+        netree = shapely.STRtree(network)
+        facetree = shapely.STRtree(faces)
+    else:
+        netree = topology.tree
+        facetree = topology.face_tree(outside_faces)
 
     # This list will store indexes of faces that are holes
     # Those faces won't be treated individually, but as part of the face they are inside of
@@ -1,13 +1,13 @@
 import geopandas as gpd
-import shapely
+import numpy as np
 
 from cartagen.utils.partitioning.network import network_faces
-from cartagen.utils.network.faces import NetworkFace
+from cartagen.utils.network.faces import NetworkFaces
 
 def detect_dual_carriageways(
         roads, importance=None, value=None,
         concavity=0.85, elongation=6.0, compactness=0.12,
-        area=60000.0, width=20.0, huber=16
+        area=60000.0, width=20.0, huber=16, topology=None
     ):
     """
     Detect dual carriageways based on geometric properties.
@@ -40,6 +40,10 @@ def detect_dual_carriageways(
         Maximum width of the the :func:`minimum_rotated_rectangle <shapely.minimum_rotated_rectangle>`.
     huber : int, optional
         Huber width for long motorways.
+    topology : RoadNetwork, optional
+        The topology of the road network, to share its faces and spatial indexes
+        between multiple algorithms. It must be built on the provided roads,
+        or on the roads kept by the importance attribute if provided.
 
     See Also
     --------
@@ -76,23 +80,32 @@ def detect_dual_carriageways(
         else:
             network.append(road['geometry'])
 
-    faces = network_faces(network, convex_hull=False)
-    tree = shapely.STRtree(network)
+    if topology is None:
+        faces = network_faces(network, convex_hull=False)
+    else:
+        topology.check(network)
+        faces = topology.faces()
+
+    # Calculate the cheap properties of every face at once
+    faces = NetworkFaces(faces)
+
+    detected = np.flatnonzero(_separators(faces, concavity, elongation, compactness, area, width, huber))
+    faces.calculate_rectangles(detected)
 
     separators = []
-    index = 0
-    for face in faces:
-        add, infos = is_dual_carriageway(
-            face, network, tree,
-            concavity=concavity,
-            elongation=elongation,
-            compactness=compactness,
-            area=area, width=width, huber=huber
-        )
-        if add:
-            infos['cid'] = index
-            separators.append(infos)
-            index += 1
+    for index, fid in enumerate(detected):
+        separators.append({
+            'area': faces.area[fid],
+            'perimeter': faces.perimeter[fid],
+            'concavity': faces.concavity[fid],
+            'elongation': faces.elongation[fid],
+            'compactness': faces.compactness[fid],
+            'length': faces.length[fid],
+            'width': faces.width[fid],
+            'huber': faces.huber[fid],
+            'geometry': faces.polygons[fid],
+            'cid': index
+        })
 
     if len(separators) > 0:
         return gpd.GeoDataFrame(separators, crs=crs)
@@ -108,45 +121,53 @@ def is_dual_carriageway(
     Return True or False if the network face is detected as a dual carriageway separator along with infos.
     """
 
-    face = NetworkFace(polygon)
+    faces = NetworkFaces([polygon])
+    faces.calculate_rectangles()
 
     infos = {
-        'area': face.area,
-        'perimeter': face.perimeter,
-        'concavity': face.concavity,
-        'elongation': face.elongation,
-        'compactness': face.compactness,
-        'length': face.length,
-        'width': face.width,
-        'huber': face.huber,
+        'area': faces.area[0],
+        'perimeter': faces.perimeter[0],
+        'concavity': faces.concavity[0],
+        'elongation': faces.elongation[0],
+        'compactness': faces.compactness[0],
+        'length': faces.length[0],
+        'width': faces.width[0],
+        'huber': faces.huber[0],
         'geometry': polygon
     }
 
-    # Check if the face is convex...
-    if face.concavity > concavity:
-        # False if the width is larger than the threshold
-        if face.width > width:
-            return False, infos
-        # Check the elongation only...
-        if (face.elongation > elongation):
-            return True, infos
-        # ...or the compactness with the elongation.
-        if (face.compactness < compactness) and (face.elongation > (elongation / 2)):
-            return True, infos
-    # ...or not convex.
-    else:
-        # Check the compactness and the surface area
-        if (face.compactness < compactness) and (face.area < area):
-            # If the compactness is above half the limit compactness
-            if face.compactness > (compactness / 2):
-                # Check that the huber width is below the threshold
-                if face.huber > huber:
-                    return False, infos
-            return True, infos 
+    separator = _separators(faces, concavity, elongation, compactness, area, width, huber)[0]
+
+    return bool(separator), infos
+
+def _separators(faces, concavity, elongation, compactness, area, width, huber):
+    """
+    Return a boolean array telling which of the network faces are detected as dual carriageway separators.
+    The minimum rotated rectangle is only calculated for the faces whose width is needed.
+    """
+    # Convex faces
+    convex = faces.concavity > concavity
+
+    # The width of convex faces is first checked against a lower bound calculated from their convex hull,
+    # the minimum rotated rectangle is calculated only for faces that may be narrow enough
+    narrow = convex & (faces.minimum_width <= width)
+    faces.calculate_rectangles(np.flatnonzero(narrow))
+
+    # Convex faces wider than the threshold are not separators, the others are if they
+    # are elongated enough, or if they are both elongated and not compact
+    wide = convex & ~(faces.width <= width)
+    elongated = convex & ~wide & (
+        (faces.elongation > elongation) |
+        ((faces.compactness < compactness) & (faces.elongation > (elongation / 2)))
+    )
+
+    # Non convex faces with a small compactness and a small area are separators,
+    # unless their compactness is above half the limit and their huber width is above the threshold
+    small = ~convex & (faces.compactness < compactness) & (faces.area < area)
+    thin = small & ~((faces.compactness > (compactness / 2)) & (faces.huber > huber))
 
     # Special case of long motorways, i.e. large area with small compactness
-    if (face.compactness < (compactness / 4)) and (face.area < (10 * area)):
-        return True, infos
+    remaining = (convex & ~wide & ~elongated) | (~convex & ~small)
+    motorways = remaining & (faces.compactness < (compactness / 4)) & (faces.area < (10 * area))
 
-    # Here, it's not a dual carriageway
-    return False, infos
\ No newline at end of file
+    return elongated | thin | motorways
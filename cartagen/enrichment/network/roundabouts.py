@@ -2,7 +2,7 @@ import geopandas as gpd
 import numpy as np
 from cartagen.utils.partitioning.network import network_faces
 
-def detect_roundabouts(roads, area_threshold=40000, miller_index=0.95):
+def detect_roundabouts(roads, area_threshold=40000, miller_index=0.95, topology=None):
     """
     Detect roundabouts based on geometric properties.
 
@@ -17,6 +17,9 @@ def detect_roundabouts(roads, area_threshold=40000, miller_index=0.95):
         The area (in square meters) above which the object is not considered a roundabout.
     miller_index : float, optional
         Index of compactess that determines if the shape is round or not.
+    topology : RoadNetwork, optional
+        The topology of the road network, to share its faces and spatial indexes
+        between multiple algorithms. It must be built on the provided roads.
 
     Returns
     -------
@@ -42,7 +45,11 @@ def detect_roundabouts(roads, area_threshold=40000, miller_index=0.95):
     for road in roads:
         network.append(road['geometry'])
 
-    faces = network_faces(network, convex_hull=False)
+    if topology is None:
+        faces = network_faces(network, convex_hull=False)
+    else:
+        topology.check(network)
+        faces = topology.faces()
 
     roundabouts = []
     index = 0
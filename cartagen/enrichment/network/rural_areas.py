@@ -1,11 +1,18 @@
-from random import sample
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from heapq import heappush, heappop
+from itertools import count
+from random import Random, sample
+import os
 import shapely
+import numpy as np
 import geopandas as gpd
-import networkx as nx
 
-from cartagen.utils.network.graph import create_graph
+from cartagen.utils.network.graph import create_adjacency
 
-def rural_betweeness(roads, sample_size=10, threshold=0, cost=None):
+def rural_betweeness(roads, sample_size=10, threshold=0, cost=None,
+        seed=None, convergence=None, processes=1
+    ):
     """
     Detect central roads inside a network using betweeness centrality.
 
@@ -28,6 +35,18 @@ def rural_betweeness(roads, sample_size=10, threshold=0, cost=None):
         The name of the attribute giving the cost of the road section.
         Make sure the attribute is a number.
         Default to None, which means the length of the road is used as the cost.
+    seed : int, optional
+        The seed of the random sample of nodes, to get reproducible results.
+        Default to None, which means the global random generator is used.
+    convergence : float, optional
+        If provided, the sampled nodes are processed by batches of 1% of the nodes of the network,
+        and the calculation stops when the betweeness of every road changed
+        by less than this value after a batch.
+        Default to None, which means all sampled nodes are processed.
+    processes : int, optional
+        The number of processes used to calculate the betweeness in parallel.
+        Default to 1, which means the betweeness is calculated in the current process.
+        If set to None, the number of processors of the machine is used.
 
     Returns
     -------
@@ -61,19 +80,58 @@ def rural_betweeness(roads, sample_size=10, threshold=0, cost=None):
         if hasattr(roads, cost) == False:
             raise Exception('Selected cost attribute does not exists.')
 
-    # Create the graph from the road network
-    graph = create_graph(roads, cost)
+    # Create the adjacency of the road network
+    nodes, indptr, indices, weights, rids = create_adjacency(roads, cost)
+    nb_nodes = len(nodes)
 
     # Determinate the number of nodes to compute the centrality index
-    k = round((len(list(graph.nodes)) * sample_size) / 100)
-
-    # Calculate the edge betweenness centrality
-    centrality = nx.edge_betweenness_centrality(graph, k=k, weight='weight')
-
-    # Assign the value of betweenness for each road
-    roads_centrality = [0] * len(network)
-    for edge, value in centrality.items():
-        roads_centrality[graph.edges[edge]['rid']] = value
+    k = round((nb_nodes * sample_size) / 100)
+    sources = (sample if seed is None else Random(seed).sample)(range(nb_nodes), k)
+
+    if processes is None:
+        processes = os.cpu_count()
+
+    # Process every source at once, or by batches until the betweenness converges
+    batch = max(1, len(sources)) if convergence is None else max(1, round(nb_nodes / 100))
+
+    adjacency = (indptr.tolist(), indices.tolist(), weights.tolist(), rids.tolist())
+    betweeness = np.zeros(len(network))
+    roads_centrality = np.zeros(len(network))
+
+    # The adjacency is sent once to each process, the tasks only hold the sources
+    executor = None
+    if processes > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=processes, initializer=_init_worker, initargs=(adjacency, len(network))
+        )
+
+    try:
+        for start in range(0, len(sources), batch):
+            current = sources[start:start + batch]
+            # Share the sources of the batch between processes
+            tasks = [ current[i::processes] for i in range(processes) ]
+            tasks = [ task for task in tasks if len(task) > 0 ]
+
+            if executor is None or len(tasks) == 1:
+                partial = [ _betweeness_from_sources(adjacency, task, len(network)) for task in tasks ]
+            else:
+                partial = list(executor.map(_betweeness_in_worker, tasks))
+
+            betweeness += np.sum(partial, axis=0)
+
+            # Normalize by the number of pairs of nodes the sources can form
+            previous = roads_centrality
+            roads_centrality = betweeness
+            if nb_nodes > 1:
+                roads_centrality = betweeness / ((start + len(current)) * (nb_nodes - 1))
+
+            if convergence is not None and np.max(np.abs(roads_centrality - previous)) < convergence:
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    roads_centrality = roads_centrality.tolist()
 
     result = []
     # Loop through the roads
@@ -99,7 +157,8 @@ def rural_betweeness(roads, sample_size=10, threshold=0, cost=None):
 
 def rural_traffic(roads, min_traffic=1,
         attraction_points=None, max_distance=None,
-        sample_size=80, export_samples=False, cost=None
+        sample_size=80, export_samples=False, cost=None,
+        processes=1
     ):
     """
     Detect central roads inside a network using traffic simulation.
@@ -137,6 +196,10 @@ def rural_traffic(roads, min_traffic=1,
     cost : str, optional
         The name of the attribute giving the cost of the road section. Make sure the attribute is a number.
         Default to None, which means the length of the road is used as the cost.
+    processes : int, optional
+        The number of processes used to calculate the shortest paths in parallel.
+        Default to 1, which means shortest paths are calculated in the current process.
+        If set to None, the number of processors of the machine is used.
 
     Returns
     -------
@@ -156,6 +219,11 @@ def rural_traffic(roads, min_traffic=1,
     rural_betweeness :
         Detect central roads inside a network using traffic simulation.
 
+    Notes
+    -----
+    The traffic of each pair of points is calculated using a single shortest path
+    tree for each point, and the path between two points is used in both directions.
+
     References
     ----------
     .. footbibliography::
@@ -170,30 +238,27 @@ def rural_traffic(roads, min_traffic=1,
         if hasattr(roads, cost) == False:
             raise Exception('Selected cost attribute does not exists.')            
 
-    # Create the graph from the road network
-    graph = create_graph(roads, cost)
+    # Create the adjacency of the road network
+    nodes, indptr, indices, weights, rids = create_adjacency(roads, cost)
 
     # Convert geodataframe to list of dicts
     roads = roads.to_dict('records')
 
-    # Create a counter for the number of time a road is used
-    count = [0] * len(roads)
-
     # If no attraction were provided
     if attraction_points is None:
         # Formula to convert the sample_size from percentage to size depending on nodes number
-        # nb_sample = round((len(list(graph.nodes)) * sample_size) / 100)
+        # nb_sample = round((len(nodes) * sample_size) / 100)
         
         # Select random targets in the graph node
-        targets = sample(list(graph.nodes), sample_size)
+        targets = sample(range(len(nodes)), sample_size)
     else:
         # Convert attraction points to a list of records
         points = attraction_points.to_dict('records')
 
         # Create a list of all the nodes as points
         ncoordinates = []
-        for n in graph.nodes:
-            ncoordinates.append(shapely.Point(graph.nodes[n]['coords']))
+        for n in nodes:
+            ncoordinates.append(shapely.Point(n))
 
         # Calculate the tree
         tree = shapely.STRtree(ncoordinates)
@@ -211,31 +276,28 @@ def rural_traffic(roads, min_traffic=1,
             nearest = tree.query_nearest(attraction, max_distance=max_distance, all_matches=False)
 
         # Set the list of node indexes as the targets
-        targets = list(nearest[1])
+        targets = nearest[1].tolist()
 
     if len(targets) < 2:
         raise Exception("Too few or too far attraction points to calculate traffic.")
 
-    # Loop through all targets to get the source
-    for source in targets:
-        # Loop through all targets to get the target
-        for target in targets:
-            # Make sure source and target is different
-            if source != target:
-                # Check if the pair of nodes has a path
-                if nx.has_path(graph, source, target):
-                    # Calculate the path
-                    path = nx.shortest_path(graph, source=source, target=target, weight='weight')
-                    # Loop through each node used
-                    for inode, node in enumerate(path):
-                        # Avoid last node
-                        if inode < len(path) - 1:
-                            # Get source and destination of the processed edge
-                            src, dst = node, path[inode + 1]
-                            # Check this edge exists
-                            if graph.has_edge(src, dst):
-                                # Increase the counter of the associated road
-                                count[graph.edges[src, dst]['rid']] += 1
+    if processes is None:
+        processes = os.cpu_count()
+
+    # Each target is the source of the paths to the following targets,
+    # the paths are shared between the processes in turn to balance their length
+    adjacency = (indptr.tolist(), indices.tolist(), weights.tolist(), rids.tolist())
+    tasks = [ (adjacency, targets, list(range(i, len(targets) - 1, processes)), len(roads)) for i in range(processes) ]
+    tasks = [ task for task in tasks if len(task[2]) > 0 ]
+
+    if processes == 1 or len(tasks) == 1:
+        counts = [ _traffic_from_sources(task) for task in tasks ]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            counts = list(executor.map(_traffic_from_sources, tasks))
+
+    # Paths are used in both directions
+    count = (2 * np.sum(counts, axis=0)).tolist()
 
     result = []
     # Loop through the roads
@@ -264,7 +326,7 @@ def rural_traffic(roads, min_traffic=1,
         for tid, target in enumerate(targets):
             samples.append({
                 'tid': tid,
-                'geometry': shapely.Point(graph.nodes[target]['coords'])
+                'geometry': shapely.Point(nodes[target])
             })
 
         rsamples = None
@@ -278,4 +340,150 @@ def rural_traffic(roads, min_traffic=1,
         if len(result) > 0:
             return gpd.GeoDataFrame(result, crs=crs)
         else:
-            return gpd.GeoDataFrame()
\ No newline at end of file
+            return gpd.GeoDataFrame()
+
+def _traffic_from_sources(task):
+    """
+    Count the number of time each road is used by the shortest paths
+    from the given sources to the targets following them.
+    """
+    adjacency, targets, sources, nb_roads = task
+    indptr, indices, weights, rids = adjacency
+
+    traffic = np.zeros(nb_roads, dtype=int)
+    for i in sources:
+        source = targets[i]
+
+        # Number of paths ending on each node
+        ends = Counter(targets[i + 1:])
+        ends.pop(source, None)
+        if len(ends) == 0:
+            continue
+
+        settled, predecessors = _shortest_path_tree(indptr, indices, weights, source, ends)
+
+        # Going up the tree, the number of paths using the edge leading to a node
+        # is the number of paths ending on this node or on the nodes below
+        paths = dict(ends)
+        for node in reversed(settled):
+            nb_paths = paths.get(node, 0)
+            if nb_paths > 0 and node != source:
+                parent, edge = predecessors[node]
+                traffic[rids[edge]] += nb_paths
+                paths[parent] = paths.get(parent, 0) + nb_paths
+
+    return traffic
+
+def _shortest_path_tree(indptr, indices, weights, source, targets):
+    """
+    Dijkstra algorithm on a compressed sparse row adjacency, stopping when all targets are reached.
+    Return the reached nodes in order and the predecessor node and adjacency entry of each node.
+    """
+    remaining = len(targets)
+    distances = {}
+    seen = { source: 0 }
+    predecessors = {}
+    settled = []
+
+    c = count()
+    heap = [(0, next(c), source)]
+    while heap:
+        distance, _, node = heappop(heap)
+        if node in distances:
+            continue
+        distances[node] = distance
+        settled.append(node)
+
+        if node in targets:
+            remaining -= 1
+            if remaining == 0:
+                break
+
+        for edge in range(indptr[node], indptr[node + 1]):
+            neighbour = indices[edge]
+            d = distance + weights[edge]
+            if neighbour in distances:
+                continue
+            if neighbour not in seen or d < seen[neighbour]:
+                seen[neighbour] = d
+                predecessors[neighbour] = (node, edge)
+                heappush(heap, (d, next(c), neighbour))
+
+    return settled, predecessors
+
+# Adjacency and number of roads of the network, set once in each worker process
+_worker_network = None
+
+def _init_worker(adjacency, nb_roads):
+    """
+    Keep the network in the worker process for the following tasks.
+    """
+    global _worker_network
+    _worker_network = (adjacency, nb_roads)
+
+def _betweeness_in_worker(sources):
+    """
+    Calculate the betweeness for the given sources on the network of the worker process.
+    """
+    adjacency, nb_roads = _worker_network
+    return _betweeness_from_sources(adjacency, sources, nb_roads)
+
+def _betweeness_from_sources(adjacency, sources, nb_roads):
+    """
+    Calculate the sum of the edge betweeness of each road for the given sources
+    using the algorithm of Brandes on a compressed sparse row adjacency.
+    """
+    indptr, indices, weights, rids = adjacency
+    nb_nodes = len(indptr) - 1
+
+    betweeness = [0.0] * nb_roads
+    for source in sources:
+        # Single source shortest paths, storing the number of shortest paths to each node
+        # and the predecessors with the adjacency entry leading to each node
+        settled = []
+        predecessors = [ None ] * nb_nodes
+        sigma = [ 0.0 ] * nb_nodes
+        done = [ False ] * nb_nodes
+        seen = [ None ] * nb_nodes
+        sigma[source] = 1.0
+        seen[source] = 0
+
+        c = count()
+        heap = [(0, next(c), source, source)]
+        while heap:
+            distance, _, predecessor, node = heappop(heap)
+            if done[node]:
+                continue
+            if node != source:
+                sigma[node] += sigma[predecessor]
+            settled.append(node)
+            done[node] = True
+
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbour = indices[edge]
+                d = distance + weights[edge]
+                s = seen[neighbour]
+                if not done[neighbour] and (s is None or d < s):
+                    seen[neighbour] = d
+                    heappush(heap, (d, next(c), node, neighbour))
+                    sigma[neighbour] = 0.0
+                    predecessors[neighbour] = [(node, edge)]
+                elif d == s:
+                    # Handle equal paths
+                    sigma[neighbour] += sigma[node]
+                    if predecessors[neighbour] is None:
+                        predecessors[neighbour] = []
+                    predecessors[neighbour].append((node, edge))
+
+        # Accumulate the dependencies from the furthest nodes
+        delta = [ 0.0 ] * nb_nodes
+        for node in reversed(settled):
+            if predecessors[node] is None:
+                continue
+            coefficient = (1 + delta[node]) / sigma[node]
+            for predecessor, edge in predecessors[node]:
+                c = sigma[predecessor] * coefficient
+                betweeness[rids[edge]] += c
+                delta[predecessor] += c
+
+    return np.array(betweeness)
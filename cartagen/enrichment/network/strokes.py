@@ -1,11 +1,14 @@
 import math
+from collections import deque
 from itertools import combinations
-from shapely.geometry import Point, MultiLineString
+import numpy as np
+import shapely
+from shapely.geometry import MultiLineString
 from shapely import ops
 import geopandas as gpd
-import networkx as nx
 
-from cartagen.utils.geometry.angle import angle_3_pts, angle_between_2lines
+from cartagen.utils.geometry.angle import angle_between_2lines
+from cartagen.utils.network.graph import _graph_arrays
 
 def strokes_roads(roads, attributes, angle=45.0, angle_sum=30.0):
     """
@@ -52,13 +55,63 @@ def strokes_rivers(rivers, attributes, angle=45.0, angle_sum=30.0):
     """
     crs = rivers.crs
     strokes = RiverStrokeNetwork(rivers, attributes)
-    strokes.buildRiverStrokes(attributes, angle, angle_sum)
-    s = strokes.reconstruct_strokes()
+    # Strokes are built and merged drainage basin by drainage basin
+    s = list(strokes.iter_strokes())
     return gpd.GeoDataFrame(s,  columns = ['id','geometry','strahler'], crs=crs, geometry='geometry') 
 
+def _adjacency(nodes, sections, size):
+    """
+    Return the sections touching each node as a compressed sparse row adjacency, ordered by section index.
+    The sections of the node i are ``sections[indptr[i]:indptr[i + 1]]``.
+    """
+    indptr = np.zeros(size + 1, dtype=int)
+    np.cumsum(np.bincount(nodes, minlength=size), out=indptr[1:])
+    return indptr.tolist(), sections[np.lexsort((sections, nodes))].tolist()
+
+def _continuity(tangents1, deviations1, tangents2, deviations2, deviatAngle, deviatSum):
+    """
+    Return the continuity difference between pairs of sections sharing a node, or -1.0 if there is
+    no good continuity between them, from the direction of both sections at the shared node
+    and their deviation at their second vertex, which is NaN if they only have two vertices.
+    """
+    angleThresh = deviatAngle / 180.0 * math.pi
+    sumThresh = deviatAngle / 180.0 * math.pi
+
+    # compute interAngle between both sections and put it between -pi and pi
+    inter_angle = tangents2 - tangents1
+    inter_angle = np.where(inter_angle > math.pi, inter_angle - 2 * math.pi, inter_angle)
+
+    def total_difference(angle):
+        # difference between the angle of the section and interAngle
+        difference = np.abs(angle - inter_angle)
+        return np.where(difference > math.pi, np.abs(difference - 2 * math.pi), difference)
+
+    # the angle of the first section is measured from its second vertex
+    difference1 = total_difference(-deviations1)
+    difference2 = total_difference(deviations2)
+
+    short1, short2 = np.isnan(deviations1), np.isnan(deviations2)
+    # there is good continuity if interAngle is > 45° and the differences of angles < 30°
+    deflected = (inter_angle < -angleThresh) | (inter_angle > angleThresh)
+
+    return np.select(
+        [
+            # case where both sections have only 2 vertices
+            short1 & short2 & deflected,
+            # case where the first section has 2 vertices
+            short1 & ~short2 & deflected & (difference2 < sumThresh),
+            # case where the second section has 2 vertices
+            ~short1 & short2 & deflected & (difference1 < sumThresh),
+            # general case
+            ~short1 & ~short2 & deflected & (difference1 < sumThresh) & (difference2 < sumThresh),
+        ],
+        [ math.pi - np.abs(inter_angle), 2 * difference2, 2 * difference1, difference1 + difference2 ],
+        -1.0
+    )
+
 class Stroke:
     """
-    
+    A stroke of a :class:`StrokeNetwork`, stored as the ordered indexes of its sections.
     """
     COUNTER = 0
     def __init__(self, network, root):
@@ -69,221 +122,70 @@ class Stroke:
         self.id = Stroke.COUNTER
         Stroke.COUNTER += 1
     
-    def is_good_continuity(temp_geom, geom_foll, deviatAngle, deviatSum):
-        angleThresh = deviatAngle / 180.0 * math.pi
-        sumThresh = deviatAngle / 180.0 * math.pi
-    
-        coord_ini1 = temp_geom["geom"].coords[0]
-        coord_fin1 = temp_geom["geom"].coords[-1]
-        coord_ini2 = geom_foll["geom"].coords[0]
-        coord_fin2 = geom_foll["geom"].coords[-1]
-        coord_inter = None
-        
-        if coord_ini2==coord_ini1:
-            coord_inter = coord_ini1
-            inter_geom1 = True
-            inter_geom2 = True
-        if coord_fin2==coord_ini1:
-            coord_inter = coord_ini1
-            inter_geom1 = True
-            inter_geom2 = False
-        if coord_fin2==coord_fin1:
-            coord_inter = coord_fin1
-            inter_geom1 = False
-            inter_geom2 = False
-        if coord_ini2==coord_fin1:
-            coord_inter = coord_ini2
-            inter_geom1 = False
-            inter_geom2 = True
-        if coord_inter is None:
-            return -1.0
-        
-        v1g1, v2g1, v1g2, v2g2 = None, None, None, None
-        # define the node to compute the angle
-        # get the first vertex on geometry 1
-        if inter_geom1:
-            v1g1 = Point(temp_geom["geom"].coords[1])
-        else:
-            v1g1 = Point(temp_geom["geom"].coords[-2])
-            
-        # get the first vertex on geometry 2
-        if inter_geom2:
-            v1g2 = Point(geom_foll["geom"].coords[1])
-        else:
-            v1g2 = Point(geom_foll["geom"].coords[-2])
-            
-        # if nbVert1 > 2, get the second vertex in geometry 1
-        if len(temp_geom["geom"].coords) > 2:
-            if inter_geom1:
-                v2g1 = Point(temp_geom["geom"].coords[2])
-            else:
-                v2g1 = Point(temp_geom["geom"].coords[-3])
-    
-        # if nbVert2 > 2, get the second vertex in geometry 2
-        if len(geom_foll["geom"].coords) > 2:
-            if inter_geom2:
-                v2g2 = Point(geom_foll["geom"].coords[2])
-            else:
-                v2g2 = Point(geom_foll["geom"].coords[-3])
-    
-        # now, compute interAngle between geom and geomFoll
-        inter_angle = angle_3_pts(v1g1,  Point(coord_inter), v1g2)
-        # put the angle between -pi and pi
-        if inter_angle > math.pi:
-            inter_angle -= 2 * math.pi    
-        #case where both geometries have only 2 vertices
-        if ((v2g1 is None) and (v2g2 is None)) :
-          #then, there is good continuity if the angle is < 45°
-          if ((inter_angle < (-angleThresh)) or (inter_angle > angleThresh)) :
-            return math.pi - abs(inter_angle)
-          return -1.0
-        #case where geom has 2 vertices
-        elif (v2g1 is None):
-          angleTotalDiff = 0.0
-          #on calcule angleGeom2
-          angleGeom2 = angle_3_pts( Point(coord_inter), v1g2, v2g2)
-         #on calcule l'écart entre les angles
-          angleDiff = max(angleGeom2, inter_angle)- min(angleGeom2, inter_angle)
-          if (angleDiff > math.pi) :
-            angleTotalDiff = abs(angleDiff - 2 * math.pi)
-          else:
-            angleTotalDiff = angleDiff
-          #il y a bonne continuité si l'angle est < 45° et la différence desangles < à 30°
-          if (((inter_angle < (-angleThresh)) or (inter_angle > angleThresh)) and (angleTotalDiff < sumThresh)):
-            return 2 * angleTotalDiff
-          return -1.0
-        #case where geomFoll has 2 vertices
-        elif (v2g2 is None):
-          angleTotalDiff = 0.0
-          #on calcule angleGeom2
-          angleGeom1 = angle_3_pts(v2g1, v1g1,  Point(coord_inter))
-          #on calcule l'écart entre les angles
-          angleDiff = max(angleGeom1, inter_angle)- min(angleGeom1, inter_angle)
-          if (angleDiff > math.pi) :
-            angleTotalDiff = abs(angleDiff - 2 * math.pi)
-          else:
-            angleTotalDiff = angleDiff
-          #il y a bonne continuité si l'angle est < 45° et la différence des angles < à 30°
-          if (((inter_angle < (-angleThresh)) or (inter_angle > angleThresh)) and (angleTotalDiff < sumThresh)) :
-            return 2 * angleTotalDiff
-          return -1.0
-        #general case
-        else:
-            angleTotalDiff1 = angleTotalDiff2 = 0.0
-            angleGeom1 = angle_3_pts(v2g1, v1g1,  Point(coord_inter))
-            angleGeom2 = angle_3_pts( Point(coord_inter), v1g2, v2g2)
-            #on calcule l'écart entre les angles 1 et inter
-            angleDiff1 = max(angleGeom1, inter_angle)-min(angleGeom1, inter_angle)
-            if (angleDiff1 > math.pi) :
-                angleTotalDiff1 = abs(angleDiff1 - 2 * math.pi)
-            else :
-                angleTotalDiff1 = angleDiff1
-            #on calcule l'écart entre les angles
-            DiffAngles2 = max(angleGeom2, inter_angle)-min(angleGeom2, inter_angle)
-            if (DiffAngles2 > math.pi):
-                angleTotalDiff2 = abs(DiffAngles2 - 2 * math.pi)
-            else :
-                angleTotalDiff2 = DiffAngles2
-            #il y a bonne continuité si l'angle est < 45° et les différences des angles < à 30°
-            if (((inter_angle < (-angleThresh)) or (inter_angle > angleThresh)) and (angleTotalDiff1 < sumThresh) and (angleTotalDiff2 < sumThresh)):
-                return angleTotalDiff1 + angleTotalDiff2
-            return -1.0
+    def is_good_continuity(self, arc, follower):
+        """
+        Return the continuity difference between two sections sharing a node, or -1.0
+        if there is no good continuity between them.
+        """
+        return self.network.continuities.get((arc, follower), -1.0)
     
-    def attribute_filter(arc,followers,attributeNames):
-        loopFoll = []
+    def attribute_filter(self, arc, followers, attributeNames):
+        """
+        Return the followers having the same attribute values as arc.
+        """
         for attribute in attributeNames:
-            # get the attribute value for 'arc'
-            value = arc[attribute]
-            if len(followers) != 0:
-                # loop on the followers to filter them
-                loopFoll = []
-                loopFoll+=followers
-                for a in loopFoll:
-                    # get the value of a for attribute
-                    valueA = a[attribute]
-                    if value != valueA:
-                        # remove 'a' from the followers set
-                        followers.remove(a)
+            # get the attribute values for 'arc' and the followers
+            values = self.network.attributes[attribute]
+            value = values[arc]
+            followers = [ a for a in followers if values[a] == value ]
+        return followers
 
     def filterFollowers(self, arc, followers):
-        loopFoll = []
-        #loop on the followers to filter them
-        loopFoll+=followers
-        for a in loopFoll:
-            if (a==arc):
-                #remove it from the set
-                followers.remove(a)
-                continue
-             #check that a does not belong to another stroke
-            if (a in self.network.groupedFeatures):
-                  #remove it from the set
-                  followers.remove(a)
-                  continue
-                  #check if it belongs to this stroke
-            if (a in self.features):
-             #remove it from the set
-                 followers.remove(a)
-                 continue
-            #check if it belongs to the network
-            if (not a in self.network.features) :
-            # remove it from the set
-                followers.remove(a)
-      
+        """
+        Return the followers that are not arc and do not already belong to a stroke.
+        """
+        grouped = self.network.grouped
+        return [ a for a in followers if a != arc and not grouped[a] ]
                         
     def chooseNextSegment(self,arc, followers, attributeNames, deviatAngle, deviatSum):
-        #first, if it's a node of degree two
-        if (len(followers) == 1) :
-            follower = next(iter(followers))
-            if (not follower in self.features):#COR
-                return follower
-            return None
-        # then, filter the followers
-        self.filterFollowers(arc, followers)
+        # first, filter the followers
+        followers = self.filterFollowers(arc, followers)
         if (len(followers) == 0) :
             return None
         # then, filter the followers from the attributeNames
-        Stroke.attribute_filter(arc, followers, attributeNames)
+        followers = self.attribute_filter(arc, followers, attributeNames)
         if (len(followers) == 0) :
             return None
-        continuity,bestSegment = True, None
+        bestSegment = None
         # Loop on the followers to choose the best continuity
         minDiff = math.pi
         for follower in followers:
             # get the continuity difference with this follower
-            diffContinuity = Stroke.is_good_continuity(arc, follower, deviatAngle, deviatSum) 
+            diffContinuity = self.is_good_continuity(arc, follower)
             if (diffContinuity > -1.0) :
-                continuity = True
                 if (diffContinuity < minDiff) :
                     # this is the current best continuity update the difference
                     minDiff = diffContinuity
                     # change the bestSegment
                     bestSegment = follower
+        if bestSegment is None:
+            return None
         
-        # final verification: if we found a continuous follower, check if there is a better continuity between the followers themselves
-        if (((continuity) and not bestSegment in self.network.groupedFeatures) or (minDiff < deviatAngle)) :
-            for pair in combinations(followers, 2):
-                diffContinuity = Stroke.is_good_continuity(pair[0], pair[1], deviatAngle, deviatSum)
-                if (diffContinuity > -1.0 and diffContinuity < minDiff) :
-                    # there is a pair of followers with a better continuity so we stop the stroke here and return None
-                    return None
-            return bestSegment
-        return None
+        # final verification: check if there is a better continuity between the followers themselves
+        for pair in combinations(followers, 2):
+            diffContinuity = self.is_good_continuity(pair[0], pair[1])
+            if (diffContinuity > -1.0 and diffContinuity < minDiff) :
+                # there is a pair of followers with a better continuity so we stop the stroke here and return None
+                return None
+        return bestSegment
 
-  
     def one_side_stroke(self, side, attributeNames, deviatAngle, deviatSum):
         # get the following network segments of the root of this stroke
-        node =None        
-        node = self.root["geom"].coords[side]
-        if (node is None):
-            return
-        followers =[]
-        followers+=self.network.dic_neighbours[self.root["geom"].coords[side]]
-        if self.root in followers:
-            followers.remove(self.root)
+        node = self.network.ends[self.root][side]
+        followers = [ a for a in self.network.neighbours(node) if a != self.root ]
         next1 = self.root
-        continuity = True
-        self.network.groupedFeatures.append(next1)
-        while (continuity) :
+        self.network.grouped[next1] = True
+        while True:
             # get the best candidate among the followers (the one with best continuity)
             best = self.chooseNextSegment(next1, followers, attributeNames,deviatAngle, deviatSum)
             if (best is None):
@@ -293,28 +195,22 @@ class Stroke:
                 self.features.insert(0, best)
             else:
                 self.features.append(best)
-            self.network.groupedFeatures.append(best) 
-            # get the followers of 'best'
-            followers=[]
-            nextNode = best["geom"].coords[0]
-            
-            side2=0
-            if (node==nextNode):
-                nextNode = best["geom"].coords[-1]
-                side2=-1 
-                
-            followers+=self.network.dic_neighbours[best["geom"].coords[side2]]#AC
-            followers.remove(best)
+            self.network.grouped[best] = True
+            # get the followers of 'best' at its other node
+            start, end = self.network.ends[best]
+            nextNode = end if node == start else start
+            followers = [ a for a in self.network.neighbours(nextNode) if a != best ]
             # if there is no follower, break
             if (len(followers)== 0):
                 break
             # update the 'next' segment with 'best'
             next1 = best
-            node = nextNode;         
+            node = nextNode
+
     def __str__(self):
         liste=""
         for elem in self.features: 
-            liste+=str(elem["id"])
+            liste+=str(elem)
             liste+=","
         return liste
     
@@ -325,66 +221,125 @@ class StrokeNetwork:
 
     The initialization of this class is required prior to computing strokes,
     it includes the precomputing of neighbouring relations between edges of the network.
+    Sections are identified by their position in the network, and the network stores
+    as arrays the nodes at both ends of each section, the sections touching each node
+    and the direction of each section at both ends.
     """
-    def __init__(self, features):
-            #Initialisation from a list of shapely geometry with the correct attributes
-          self.features = features
-          self.groupedFeatures = []
-          self.id = 0
-          self.strokes = []
-          
     def __init__(self, gdf, attributeNames):
         #Initialisation from a geopanda dataframe and the liste of desired attribute name
-        features=[]
+        self.geometries = np.asarray(gdf.geometry)
 
-        entries = gdf.to_dict('records')
-
-        for i, entry in enumerate(entries): 
-            elem = {}
-            elem["geom"] = entry['geometry']
-            elem["id"] = i
-
-            for attr in attributeNames:
-                if attr in entry:
-                    elem[attr] = entry[attr]
-                else:
-                    raise Exception("No attribute named '{0}' in the provided dataset.".format(attr))
-                
-            features.append(elem)
+        self.attributes = {}
+        for attr in attributeNames:
+            if attr in gdf.columns:
+                self.attributes[attr] = gdf[attr].tolist()
+            else:
+                raise Exception("No attribute named '{0}' in the provided dataset.".format(attr))
 
-        self.features = features
-        self.groupedFeatures = []
+        # Sections already belonging to a stroke
+        self.grouped = np.zeros(len(self.geometries), dtype=bool)
         self.id = 0
         self.strokes = []
-        self.dic_neighbours=StrokeNetwork.compute_neighbours(features)
-        
-    def compute_neighbours(network):
-        ntx=nx.DiGraph()
-        dic_neighbours={}
-        for edge in network:
-            ntx.add_edge(edge["geom"].coords[0],edge["geom"].coords[-1],elem=edge)
-            ntx.add_edge(edge["geom"].coords[-1],edge["geom"].coords[0],elem=edge)
-        for node in ntx.nodes:
-            dic_neighbours[node]=[]
-            for succnode in ntx.successors(node):
-                if ntx.has_edge(node,succnode) :
-                    temp=ntx[node][succnode]["elem"]
-                    dic_neighbours[node].append(temp)
-                if ntx.has_edge(succnode,node) : 
-                    temp=ntx[node][succnode]["elem"]
-                    dic_neighbours[node].append(temp)
-        return dic_neighbours
+        # Continuity differences of the pairs of sections with a good continuity, calculated when building strokes
+        self.continuities = {}
 
+        self.__compute_neighbours(gdf)
+        self.__compute_tangents()
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def __compute_neighbours(self, gdf):
+        """
+        Number the nodes of the network and store the sections touching each node
+        as a compressed sparse row adjacency ordered by section index.
+        """
+        nodes, edges, _ = _graph_arrays(gdf)
+        self.ends = edges.tolist()
+
+        # Each section is stored at both its nodes, and once for self loops
+        keep = np.ones(2 * len(edges), dtype=bool)
+        keep[1::2] = edges[:, 0] != edges[:, 1]
+        sections = np.repeat(np.arange(len(edges)), 2)
+        self.__indptr, self.__sections = _adjacency(edges.ravel()[keep], sections[keep], len(nodes))
+
+    def __compute_tangents(self):
+        """
+        Calculate the direction of each section from both its nodes, i.e. the angle of its first
+        segment, and the deviation at its second vertex, i.e. the angle between its first and second
+        segments. The deviation is NaN for sections having only two vertices.
+        """
+        coordinates = shapely.get_coordinates(self.geometries)
+        counts = shapely.get_num_coordinates(self.geometries)
+        last = np.cumsum(counts) - 1
+        first = last - counts + 1
+
+        tangents = np.empty((len(self), 2))
+        deviations = np.full((len(self), 2), np.nan)
+        for side, (v0, step) in enumerate(((first, 1), (last, -1))):
+            p0, p1 = coordinates[v0], coordinates[v0 + step]
+            tangents[:, side] = np.arctan2(p1[:, 1] - p0[:, 1], p1[:, 0] - p0[:, 0])
+            long = counts > 2
+            p0, p1, p2 = p0[long], p1[long], coordinates[v0[long] + 2 * step]
+            deviations[long, side] = np.arctan2(p2[:, 1] - p1[:, 1], p2[:, 0] - p1[:, 0]) - np.arctan2(p0[:, 1] - p1[:, 1], p0[:, 0] - p1[:, 0])
+
+        self.tangents = tangents
+        self.deviations = deviations
+
+    def __compute_continuities(self, deviatAngle, deviatSum):
+        """
+        Calculate the continuity difference between every ordered pair of sections sharing a node
+        and store the pairs with a good continuity in the continuities dictionary.
+        """
+        indptr = np.array(self.__indptr)
+        sections = np.array(self.__sections, dtype=int)
+        degrees = np.diff(indptr)
+
+        # Enumerate the positions of both sections of every pair of each node
+        sizes = degrees * degrees
+        offsets = np.repeat(np.cumsum(sizes) - sizes, sizes)
+        repeated = np.repeat(degrees, sizes)
+        local = np.arange(len(offsets)) - offsets
+        i, j = local // repeated, local % repeated
+        start = np.repeat(indptr[:-1], sizes)
+        distinct = i != j
+        first = sections[(start + i)[distinct]]
+        second = sections[(start + j)[distinct]]
+
+        # Find the side of each section touching the shared node, the last matching case is kept
+        ends = np.array(self.ends, dtype=int).reshape(-1, 2)
+        start1, end1 = ends[first, 0], ends[first, 1]
+        start2, end2 = ends[second, 0], ends[second, 1]
+        side1 = np.zeros(len(first), dtype=int)
+        side2 = np.zeros(len(first), dtype=int)
+        for matching, s1, s2 in ((start2 == start1, 0, 0), (end2 == start1, 0, 1), (end2 == end1, 1, 1), (start2 == end1, 1, 0)):
+            side1[matching], side2[matching] = s1, s2
+
+        differences = _continuity(
+            self.tangents[first, side1], self.deviations[first, side1],
+            self.tangents[second, side2], self.deviations[second, side2],
+            deviatAngle, deviatSum
+        )
+
+        good = differences > -1.0
+        self.continuities = dict(zip(zip(first[good].tolist(), second[good].tolist()), differences[good].tolist()))
+
+    def neighbours(self, node):
+        """
+        Return the indexes of the sections touching the given node.
+        """
+        return self.__sections[self.__indptr[node]:self.__indptr[node + 1]]
 
     def buildStrokes(self, attributeNames, deviatAngle, deviatSum) :
         """
         This method computes the strokes in a Strokenetwork
         using a loop on network features, and updates its strokes attribute.
         """
+        self.__compute_continuities(deviatAngle, deviatSum)
         #loop on the network features
-        for obj in self.features :
+        for obj in range(len(self)) :
             #test if the feature has already been treated
-            if obj in self.groupedFeatures :
+            if self.grouped[obj] :
                 continue
             #build a new stroke object
             stroke = Stroke(self, obj)
@@ -402,8 +357,8 @@ class StrokeNetwork:
             listline=[]
             section=""
             for j, seg in enumerate(stroke.features):
-                listline+=[seg["geom"]]
-                section += str(seg["id"])
+                listline+=[self.geometries[seg]]
+                section += str(seg)
                 if j < len(stroke.features):
                     section += ","
             multi_line = MultiLineString(listline)
@@ -413,92 +368,121 @@ class StrokeNetwork:
 
     def save_strokes_shp(self,path):
         #Save a shapefile of stroke eometry in the desired folder
-        strokes_list = self.strokes
-        array = self.reconstruct_strokes(strokes_list)
+        array = self.reconstruct_strokes()
         gdf = gpd.GeoDataFrame(array,  columns = ['id', 'geom',"section"],crs="epsg:2154",geometry="geom")   
         gdf.to_file(path, driver='ESRI Shapefile')
 
     def get_strokes(self):
-        return self.reconstruct_strokes(self.strokes)
+        return self.reconstruct_strokes()
 
 class RiverStroke:
+    """
+    A stroke of a :class:`RiverStrokeNetwork`, stored as the ordered indexes of its sections from upstream to downstream.
+    """
     def __init__(self, network, section): 
-        if type(section) is list:
-            self.features = section 
-        else:
-            self.features = []
-            self.features.append(section)
         self.network = network
+        self.id = None
+        self.features = []
+        self.length = 0
         self.isBraided = None
+        if type(section) is list:
+            for s in section:
+                self.append(s)
+        else:
+            self.append(section)
+
+    def append(self, section):
+        """
+        Add a section at the downstream end of the stroke.
+        """
+        self.features.append(section)
+        self.length += self.network.lengths[section]
 
     def setBraided(self,isBraided) :
         self.isBraided = isBraided;
         
     def getlength(self) :
-        l=0
-        for feat in self.features:
-            l+=feat['geom'].length
-        return l
+        return self.length
 
 class RiverStrokeNetwork:
+    """
+    This Class contains methods allowing the computation of strokes
+    and Strahler orders in a directed river network.
+
+    Sections are identified by their position in the network. The network stores
+    as arrays the start and end node of each section and the sections flowing
+    out of and into each node. Strokes are built drainage basin by drainage basin,
+    following the topological order of the nodes inside each basin.
+    """
     def __init__(self, lines, attributeName):
-        #Initialisation from a geopanda dataframe and the liste of desired attribute name
-        features=[]
+        #Initialisation from a geopanda dataframe and the name of the desired attribute
+        self.geometries = np.asarray(lines.geometry)
+        self.lengths = shapely.length(self.geometries).tolist()
 
         if attributeName is None: 
             self.NoAttribute=True
         else:
             self.NoAttribute=False
             self.attributeName=attributeName
-        for idx in lines.index: 
-            elem={}
-            elem["geom"]=lines.geometry[idx]
-            elem["id"]=idx
-            if not self.NoAttribute:
-                elem["name"]=getattr(lines,attributeName)[idx]
-            features+=[elem]
-
-        self.features = features
-        self.sources = []
-        self.sinks = []
-        self.strahlerOrders={}  
-        self.groupedFeatures = []
+            self.names = lines[attributeName].tolist()
+
+        nodes, edges, _ = _graph_arrays(lines)
+        self.starts = edges[:, 0].tolist()
+        self.ends = edges[:, 1].tolist()
+
+        sections = np.arange(len(edges))
+        self.__outgoing = _adjacency(edges[:, 0], sections, len(nodes))
+        self.__incoming = _adjacency(edges[:, 1], sections, len(nodes))
+
+        outdegree = np.bincount(edges[:, 0], minlength=len(nodes))
+        indegree = np.bincount(edges[:, 1], minlength=len(nodes))
+        self.sources = np.flatnonzero((outdegree > 0) & (indegree == 0)).tolist()
+        self.sinks = ((indegree > 0) & (outdegree == 0)).tolist()
+        self.__indegree = indegree.tolist()
+
+        # Strahler order and stroke of each section, 0 and -1 for sections not belonging to a stroke
+        self.strahlerOrders = np.zeros(len(edges), dtype=int)
+        self.strokeIds = np.full(len(edges), -1)
         self.strokes = []
-        self.dic_neighbours,self.dicentrant=self.compute_neighbours(features)
         self.dtf=lines
-        
-    def compute_neighbours(self, network):
-        ntx=nx.DiGraph()
-        dic_neighbours={}
-        dicentrant={}
-        for edge in network:
-            ntx.add_edge(edge["geom"].coords[0],edge["geom"].coords[-1],elem=edge)
-        for node in ntx.nodes:
-            dicentrant[node]=[]
-            dic_neighbours[node]=[]
-            la= list(ntx.successors(node))
-            lb= list(ntx.predecessors(node))
-            if (not len(la)==0) and  len(lb)==0: 
-                self.sources.append(node)
-            if (not len(lb)==0) and  len(la)==0: 
-                self.sinks.append(node)    
-            for prednode in ntx.predecessors(node):
-                if ntx.has_edge(prednode,node) : 
-                    temp=ntx[prednode][node]["elem"]
-                    dicentrant[node].append(temp)
-            for succnode in ntx.successors(node):
-                if ntx.has_edge(node,succnode) :
-                    temp=ntx[node][succnode]["elem"]
-                    dic_neighbours[node].append(temp)  
-        return dic_neighbours,dicentrant
-
-
-    def allBelongToStroke(self, sections) :
-        for section in sections:
-            if (not section in self.groupedFeatures) :
-                return False
-        return True
-    
+
+    def outgoing(self, node):
+        """
+        Return the indexes of the sections flowing out of the given node.
+        """
+        indptr, sections = self.__outgoing
+        return sections[indptr[node]:indptr[node + 1]]
+
+    def incoming(self, node):
+        """
+        Return the indexes of the sections flowing into the given node.
+        """
+        indptr, sections = self.__incoming
+        return sections[indptr[node]:indptr[node + 1]]
+
+    def basins(self):
+        """
+        Return the sources of each drainage basin, i.e. each weakly connected part of the network.
+        """
+        parent = list(range(len(self.__indegree)))
+
+        def find(node):
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+
+        for start, end in zip(self.starts, self.ends):
+            root1, root2 = find(start), find(end)
+            if root1 != root2:
+                parent[max(root1, root2)] = min(root1, root2)
+
+        # Basins are ordered by their first source
+        basins = {}
+        for source in self.sources:
+            basins.setdefault(find(source), []).append(source)
+        return list(basins.values())
+
     def getNonBraidedStroke(self, upstreamStrokes) :
         nb = 0
         unbraided = None
@@ -521,9 +505,9 @@ class RiverStrokeNetwork:
             return unbraidedStroke
         #first, make a decision on river name
         if not self.NoAttribute: 
-            if not downstreamSection["name"] is None:        
+            if not self.names[downstreamSection] is None:        
                 for stroke in upstreamStrokes:
-                    if (downstreamSection["name"]==stroke.features[-1]["name"]):
+                    if (self.names[downstreamSection]==self.names[stroke.features[-1]]):
                         return stroke
         #arrived here, decision is made on stroke length
         longest = None
@@ -547,25 +531,19 @@ class RiverStrokeNetwork:
         best =None
         mini = 1.0
         for stroke in upstreamStrokes:
-            angle = angle_between_2lines(stroke.features[-1]['geom'],downstreamSection['geom'])
+            angle = angle_between_2lines(self.geometries[stroke.features[-1]], self.geometries[downstreamSection])
             if (math.cos(angle) < mini) :
                 mini = math.cos(angle)
                 best = stroke
         return best;
 
-
-    def getUpstreamStrokes(self, node) :
-        upstreamStrokes = []
-        pfeats=[]
-        for stroke in self.strokes :
-            feats = stroke.features
-            pfeats=[]
-            for feat in feats : 
-                if feat in self.dicentrant[node]:
-                    pfeats.append(feat)
-            if (not len(pfeats) == 0):
-                upstreamStrokes.append(stroke)
-        return upstreamStrokes
+    def getUpstreamStrokes(self, node, strokes, offset=0) :
+        """
+        Return the strokes of the sections flowing into the node, in their order of creation.
+        The strokes of the current drainage basin are given with the index of the first one.
+        """
+        ids = sorted(set(self.strokeIds[self.incoming(node)].tolist()))
+        return [ strokes[i - offset] for i in ids if i >= 0 ]
 
     def computeStrahlerAtConfluence(self, orders) :
         if (len(orders) == 1):
@@ -578,30 +556,23 @@ class RiverStrokeNetwork:
             return maxi + 1
         return maxi
     
-    def manageBraidedConfluence(self, node, upStream, downstreamNodes) :
+    def manageBraidedConfluence(self, node, upStream) :
+        """
+        Return the branch flowing out of the node continuing the upstream section.
+        """
         mainBranch = None
         mini = 1.0
-        for branch in self.dic_neighbours[node]:
-			# first, make a decision on river name
+        for branch in self.outgoing(node):
+            # first, make a decision on river name
             if not self.NoAttribute: 
-                if branch['name']==upStream["name"]:
+                if self.names[branch]==self.names[upStream]:
                     mainBranch = branch
                     break
-			#then decide on angles
-            angle = angle_between_2lines(upStream["geom"], branch["geom"])
+            #then decide on angles
+            angle = angle_between_2lines(self.geometries[upStream], self.geometries[branch])
             if (math.cos(angle) < mini):
                 mini = math.cos(angle)
                 mainBranch = branch
-        if mainBranch is None :
-            return None
-		#continue the upstream stroke with mainBranch
-        upstreamStroke = self.getUpstreamStrokes(node)[0]
-        upstreamStroke.features.append(mainBranch)
-        self.groupedFeatures.append(mainBranch)
-		#find the next node
-        if (not mainBranch["geom"].coords[-1] in downstreamNodes):
-            downstreamNodes.insert(0, mainBranch["geom"].coords[-1])
-        self.strahlerOrders[mainBranch['id']]=self.strahlerOrders[upStream['id']]
         return mainBranch
 
     def getMainNonBraidedStroke(self, upstreamStrokes) :
@@ -617,145 +588,145 @@ class RiverStrokeNetwork:
         return unbraided
 
     def buildRiverStrokes(self, attributeNames, deviatAngle, deviatSum) :
-        downstreamNodes = []
-        total=len(self.features)
-        for source in self.sources:
-			#first get the downstream section
-            section = self.dic_neighbours[source][0]
-			#build a new RiverStroke with this section
-            stroke = RiverStroke(self, section)
-            self.strokes.append(stroke)
-            self.groupedFeatures.append(section)
-            if (not  section['geom'].coords[-1] in downstreamNodes) :
-                downstreamNodes.insert(0,section['geom'].coords[-1])
-			# compute Strahler orders
-            self.strahlerOrders[section['id']] = 1
-		# ****************************
-		# MAIN LOOP
-		# ****************************
-        counter = 0;
-        preva=int(len(self.groupedFeatures)*100/total)
-        
-        while (len(downstreamNodes)>0) :
-            
-			#test to break the loop when it's stuck
-            if (counter == len(downstreamNodes)) :
-                break
-            node = downstreamNodes.pop()
-            if (node in self.sinks): 
-                continue
-			#check that all entering sections already belong to a stroke
-            if (not self.allBelongToStroke(self.dicentrant[node])) :
-                downstreamNodes.insert(0, node)
-                counter+=1
-                continue
+        """
+        This method computes the strokes and the Strahler orders in a RiverStrokeNetwork
+        and updates its strokes attribute.
+        """
+        self.strokes = []
+        for strokes in self.iter_basins():
+            self.strokes += strokes
 
-			#arrived there, it has to be decided which stroke is stopped and which one continues.
-            counter = 0
-            if (len(self.dic_neighbours[node]) == 1) :
-                downstreamSection = self.dic_neighbours[node][0]
-                if downstreamSection in self.groupedFeatures:
+    def iter_basins(self):
+        """
+        Build the strokes of the network drainage basin by drainage basin and yield the strokes of each basin.
+        Only the strokes of the current basin are kept, which bounds the memory used by large networks.
+        """
+        # Forget the strokes of a previous build, every section is visited again
+        self.strahlerOrders[:] = 0
+        self.strokeIds[:] = -1
+
+        # Number of sections flowing into each node that do not belong to a stroke yet
+        remaining = list(self.__indegree)
+        offset = 0
+        for sources in self.basins():
+            strokes = self.__build_basin(sources, offset, remaining)
+            offset += len(strokes)
+            yield strokes
+
+    def __build_basin(self, sources, offset, remaining):
+        """
+        Build the strokes of the drainage basin of the given sources, whose first stroke
+        has the given index, by visiting the nodes in topological order.
+        """
+        strokes = []
+        downstreamNodes = deque()
+
+        def extend(stroke, section):
+            # Add the section to the stroke, the end node is visited once every entering section belongs to a stroke
+            stroke.append(section)
+            self.strokeIds[section] = stroke.id
+            end = self.ends[section]
+            remaining[end] -= 1
+            if remaining[end] == 0 and not self.sinks[end]:
+                downstreamNodes.append(end)
+
+        def create(section, braided=None):
+            # Create a new stroke starting with the section
+            stroke = RiverStroke(self, [])
+            stroke.id = offset + len(strokes)
+            stroke.setBraided(braided)
+            strokes.append(stroke)
+            extend(stroke, section)
+            self.strahlerOrders[section] = 1
+
+        for source in sources:
+            # first get the downstream section and build a new RiverStroke with it
+            leaving = self.outgoing(source)
+            create(leaving[0])
+            # the other sections flowing out of the source are braids
+            for branch in leaving[1:]:
+                create(branch, True)
+
+        while (len(downstreamNodes)>0) :
+            node = downstreamNodes.popleft()
+            entering = self.incoming(node)
+            leaving = self.outgoing(node)
+
+            #arrived there, it has to be decided which stroke is stopped and which one continues.
+            if (len(leaving) == 1) :
+                downstreamSection = leaving[0]
+                if self.strokeIds[downstreamSection] >= 0:
                     continue
                 #get the upstream strokes and find the one that continues
-                continuing = self.makeDecisionAtConfluence(node, downstreamSection,self.getUpstreamStrokes(node))#ac[]
-    
-                #now extends the continuing stroke with downstreamSection
-                continuing.features.append(downstreamSection)#AC features
-                self.groupedFeatures.append(downstreamSection)
-                
-                # find the next node
-                if (not downstreamSection['geom'].coords[-1] in downstreamNodes):
-                    
-                    downstreamNodes.insert(0,downstreamSection['geom'].coords[-1])
+                continuing = self.makeDecisionAtConfluence(node, downstreamSection, self.getUpstreamStrokes(node, strokes, offset))
                 #compute Strahler order
-                orders =[]
-                for arc in self.dicentrant[node] :
-                    orders.append(self.strahlerOrders[arc['id']])
-                if self.dicentrant[node]==[]:
-                    self.strahlerOrders[downstreamSection['id']] = 1
-                else:
-                    self.strahlerOrders[downstreamSection['id']] = self.computeStrahlerAtConfluence(orders)
-                
-                
-            elif (len(self.dic_neighbours[node]) > 1) :
+                orders = self.strahlerOrders[entering].tolist()
+                self.strahlerOrders[downstreamSection] = self.computeStrahlerAtConfluence(orders)
+                #now extends the continuing stroke with downstreamSection
+                extend(continuing, downstreamSection)
+
+            else :
                 #braided stream case
-                if (len(self.dicentrant[node]) == 1):
+                upstreamStrokes = self.getUpstreamStrokes(node, strokes, offset)
+                remainingBranches = list(leaving)
+                if (len(entering) == 1):
                     #normal case the main branch has to be found
-                    upStream =  self.dicentrant[node][0]
-                    mainBranch = self.manageBraidedConfluence(node, upStream, downstreamNodes)
-                    #build new RiverStrokes with remaining branches
-                    remainingBranches = self.dic_neighbours[node]
-                    remainingBranches.remove(mainBranch)
-                    for branch in remainingBranches :
-                        stroke = RiverStroke(self, branch)
-                        stroke.setBraided(True)
-                        self.strokes.append(stroke)
-                        self.groupedFeatures.append(branch)
-                        if (not branch['geom'].coords[-1] in downstreamNodes) :
-                            downstreamNodes.insert(0, branch['geom'].coords[-1])
-                        # compute Strahler orders
-                        self.strahlerOrders[branch['id']] = 1
+                    upStream = entering[0]
                 else :
                     #complex case with braids at a confluence point
-                    upstreamStrokes = self.getUpstreamStrokes(node)
-                    remainingBranches = self.dic_neighbours[node]
                     unbraided = self.getMainNonBraidedStroke(upstreamStrokes)
-                    if (unbraided is not None) :
-                        upstreamStrokes.remove(unbraided)
-                        mainBranch = self.manageBraidedConfluence(node,unbraided.features[-1], downstreamNodes)
+                    upStream = None if unbraided is None else unbraided.features[-1]
+                if upStream is not None:
+                    mainBranch = self.manageBraidedConfluence(node, upStream)
+                    if mainBranch is not None:
+                        #continue the upstream stroke with mainBranch
+                        self.strahlerOrders[mainBranch] = self.strahlerOrders[upStream]
+                        extend(upstreamStrokes[0], mainBranch)
                         remainingBranches.remove(mainBranch)
-                    for branch in remainingBranches:
-                        stroke = RiverStroke(self, branch)
-                        stroke.setBraided(True)
-                        self.strokes.append(stroke)
-                        self.groupedFeatures.append(branch)
-                        if (not branch['geom'].coords[-1] in downstreamNodes):
-                            
-                            downstreamNodes.insert(0, branch['geom'].coords[-1])
-                        #compute Strahler orders
-                        self.strahlerOrders[branch['id']]= 1
-            a=int(len(self.groupedFeatures)*100/total)
-            preva=a
+                #build new RiverStrokes with remaining branches
+                for branch in remainingBranches :
+                    create(branch, True)
+
+        return strokes
+
+    def __reconstruct(self, stroke):
+        """
+        Return the merged geometry of a stroke and its Strahler order.
+        """
+        multi_line = MultiLineString([ self.geometries[s] for s in stroke.features ])
+        merged_line = ops.linemerge(multi_line)
+        return merged_line, int(self.strahlerOrders[stroke.features].max())
+
+    def iter_strokes(self):
+        """
+        Build the strokes drainage basin by drainage basin and yield
+        the index, the geometry and the Strahler order of each stroke.
+        """
+        i = 0
+        for strokes in self.iter_basins():
+            for stroke in strokes:
+                yield [i, *self.__reconstruct(stroke)]
+                i += 1
 
     def reconstruct_strokes(self):
         array = []
         for i, stroke in enumerate(self.strokes):
-            listline=[]
-            section=0
-            for j, seg in enumerate(stroke.features):
-                            listline+=[seg["geom"]]
-                            section=max(section,self.strahlerOrders[seg['id']])
-            multi_line = MultiLineString(listline)
-            merged_line = ops.linemerge(multi_line)
-            array += [[i,merged_line,section]]
+            array += [[i, *self.__reconstruct(stroke)]]
         return array
     
     def save_strokes_shp(self,path):
-        strokes_list = self.strokes
-        array = self.__reconstruct_strokes(strokes_list)
+        array = self.reconstruct_strokes()
         gdf = gpd.GeoDataFrame(array,  columns = ['id', 'geom',"order"],crs="epsg:2154",geometry="geom")   
         gdf.to_file(path, driver='ESRI Shapefile')
         
     def add_strahler_and_strokes(self,path):
-        gdf = self.dtf 
-        strahlerL=[]
-        strokeL=[]
-        for i in gdf.index: 
-            strahlerL.append(self.strahlerOrders[gdf["id"][i]])
-            strokeid=self.getstrokeid(gdf["id"][i])
-            strokeL.append(strokeid)
-        gdf['strahler'] = strahlerL
-        gdf['stroke'] = strokeL
+        gdf = self.dtf.copy()
+        gdf['strahler'] = self.strahlerOrders
+        gdf['stroke'] = self.strokeIds
         gdf.to_file(path, driver='ESRI Shapefile')
 
     def get_strokes(self):
-        return self.__reconstruct_strokes(self.strokes)
+        return self.reconstruct_strokes()
     
     def getstrokeid(self,ids):
-        i=0
-        for elem in self.strokes:
-            for section in elem.features:
-                if section['id']==ids: 
-                    return i
-            i+=1
-        return -1
\ No newline at end of file
+        return int(self.strokeIds[ids])
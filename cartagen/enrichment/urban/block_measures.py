@@ -78,38 +78,52 @@ def mean_building_overlap_rate(buildings, min_sep, roads, road_sizes):
         a lists of symbol widths for all the sections around the block. 
         The list uses the same order as the sections around the block. 
     """
+    # the road symbols are merged once for every building
+    road_symbols = unary_union([ road.buffer(symbol_width) for road, symbol_width in zip(roads, road_sizes) ])
+
     mean = 0.0
     nb = 0
-    for building in buildings:
+    for i, building in enumerate(buildings):
         nb+=1
-        overlap_geoms = []
-        for other in buildings:
-            if other == building:
-                continue
-            if other.distance(building) > min_sep:
-                continue
-            overlap = other.buffer(min_sep).intersection(building)
-            if overlap.is_empty:
-                continue
-            overlap_geoms.append(overlap)
-        
-        road_id = 0
-        for road in roads:
-            symbol_width = road_sizes[road_id]
-            if road.distance(building) > (min_sep+symbol_width):
-                continue
-            overlap = road.buffer(symbol_width).intersection(building)
-            if overlap.is_empty:
-                continue
-            overlap_geoms.append(overlap)
-            road_id += 1
-        overlap_geom = unary_union(overlap_geoms)
-        if overlap_geom.is_empty:
-            continue
-        mean += overlap_geom.area
+        others = buildings[:i] + buildings[i + 1:]
+        mean += building_overlap_area(building, others, min_sep, road_symbols)
     
     if nb > 0:
         return mean / nb
     else:
         return 0.0
 
+def building_overlap_area(building, others, min_sep, road_symbols):
+    """
+    Measures the area of the portion of a building overlapping the other buildings, enlarged by the minimal separation,
+    or the road symbols.
+    Parameters
+    ----------
+    building : shapely Polygon.
+        The geometry of the measured building.
+    others : list of shapely Polygon features.
+        The geometries of the other buildings inside the block.
+    min_sep : float.
+        The minimal distance separating two buildings (in meters).
+    road_symbols : shapely Polygon.
+        The union of the polygonal symbols of the roads surrounding the block.
+        It can be prepared to speed up the measure when it is repeated.
+    """
+    overlap_geoms = []
+    for other in others:
+        if other.distance(building) > min_sep:
+            continue
+        overlap = other.buffer(min_sep).intersection(building)
+        if overlap.is_empty:
+            continue
+        overlap_geoms.append(overlap)
+
+    if road_symbols.intersects(building):
+        overlap = road_symbols.intersection(building)
+        if not overlap.is_empty:
+            overlap_geoms.append(overlap)
+
+    overlap_geom = unary_union(overlap_geoms)
+    if overlap_geom.is_empty:
+        return 0.0
+    return overlap_geom.area
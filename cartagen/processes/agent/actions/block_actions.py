@@ -15,17 +15,20 @@ class RandomBlockDisplacementAction(GeneralisationAction):
 
     def compute(self):
         """Compute the action, i.e. triggers the algorithm."""
-        buffered_sections = [self.agent.sections.iloc[i]['geometry'].buffer(self.section_symbols[i]) for i in range(len(self.section_symbols))]
+        # the road symbols are given as polygons, they are not buffered again by the displacement
+        buffered_sections = self.agent.get_road_symbols(self.section_symbols).polygons
         roads_gdf = gpd.GeoDataFrame(geometry=gpd.GeoSeries(buffered_sections))
-        components = [component.feature['geometry'] for component in self.agent.components]
-        buildings_gdf = gpd.GeoDataFrame(geometry=gpd.GeoSeries(components))
-        # create an empty rivers geodataframe because the algorithm takes one as input
-        rivers = gpd.GeoDataFrame(columns=['geom'], geometry='geom')
-        displacement = random_displacement(self.min_sep)
-        displaced_gdf = displacement.displace(buildings_gdf, roads_gdf, rivers)
-        for i in range(len(components)):
-            component = self.agent.components[i]
-            component.feature['geometry'] = displaced_gdf.iloc[i]['geometry']
+        components = [component for component in self.agent.components if not component.deleted]
+        if len(components) == 0:
+            return
+        buildings_gdf = gpd.GeoDataFrame(geometry=gpd.GeoSeries([component.geometry for component in components]))
+        # the seed is drawn from the generator of the block agent to make the displacement reproducible
+        displaced_gdf = random_displacement(
+            buildings_gdf, [roads_gdf], polygon_distance=self.min_sep, network_distance=0,
+            seed=self.agent.random.getrandbits(32)
+        )
+        for i, component in enumerate(components):
+            component.geometry = displaced_gdf.iloc[i]['geometry']
 
 class PromBlockEliminationAction(GeneralisationAction):
     nb_elim = 1
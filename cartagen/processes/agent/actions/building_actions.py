@@ -18,7 +18,7 @@ class EnlargementAction(GeneralisationAction):
         """Compute the action, i.e. triggers the algorithm."""
         geom = self.agent.feature['geometry']
         factor = self.goal_area / geom.area
-        self.agent.feature['geometry'] = affinity.scale(geom, xfact= factor, origin=geom.centroid)
+        self.agent.geometry = affinity.scale(geom, xfact= factor, origin=geom.centroid)
 
 class EnlargeToRectangleAction(GeneralisationAction):
     """Building rectangle enlargement action."""
@@ -34,7 +34,7 @@ class EnlargeToRectangleAction(GeneralisationAction):
         geom = self.agent.feature['geometry']
         ssr = enclosing_rectangle(geom, mode='input')
         factor = self.goal_area / ssr.area
-        self.agent.feature['geometry'] = affinity.scale(ssr, xfact= factor, origin=ssr.centroid)
+        self.agent.geometry = affinity.scale(ssr, xfact= factor, origin=ssr.centroid)
 
 class SimplificationAction(GeneralisationAction):
     """Building simplification action."""
@@ -49,7 +49,7 @@ class SimplificationAction(GeneralisationAction):
         """Compute the action, i.e. triggers the algorithm."""
         geom = self.agent.feature['geometry']
         new_geom = simplify_building(geom,self.edge_threshold)
-        self.agent.feature['geometry'] = new_geom
+        self.agent.geometry = new_geom
 
 class SquaringAction(GeneralisationAction):
     """Building squaring action."""
@@ -65,4 +65,4 @@ class SquaringAction(GeneralisationAction):
         squarer = Squarer()
         new_points = squarer.square([geom])
         new_geom = Polygon(squarer.get_shapes_from_new_points([geom],new_points)[0])
-        self.agent.feature['geometry'] = new_geom
\ No newline at end of file
+        self.agent.geometry = new_geom
\ No newline at end of file
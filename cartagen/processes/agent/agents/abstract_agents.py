@@ -2,27 +2,95 @@ import itertools
 
 class Agent:
     newid = itertools.count()
-    # id
-    lifecycle = None
-    satisfaction = 1.0
-    __constraints = []
-    actions_to_try = []
-    actions_tried = []
-    deleted = False
-    meso_agent = None
-    feature = None
-    type = ""
     verbose = False
 
+    # The state of each agent is stored per instance, the satisfaction, the deleted state
+    # and the geometry are kept in the agent store of the agent if it belongs to one.
+    # The version is incremented each time the geometry or the deleted state changes.
+    __slots__ = (
+        'id', 'feature', 'lifecycle', 'type', 'meso_agent', 'store', 'index', 'version',
+        '__satisfaction', '__deleted', '__constraints', 'actions_to_try', 'actions_tried'
+    )
+
     def __init__(self, feature):
         self.id = next(Agent.newid)
         self.feature = feature
+        self.lifecycle = None
+        self.type = ""
+        self.meso_agent = None
+        self.store = None
+        self.index = None
+        self.version = 0
+        self.__satisfaction = 100.0
+        self.__deleted = False
+        self.__constraints = []
+        self.actions_to_try = []
+        self.actions_tried = []
+
+    def __getstate__(self):
+        # agents are pickled without their store, which holds every agent,
+        # the state read from the store is kept in the agent instead
+        state = {}
+        for cls in type(self).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if name.startswith('__'):
+                    name = '_' + cls.__name__.lstrip('_') + name
+                if hasattr(self, name):
+                    state[name] = getattr(self, name)
+        state['_Agent__satisfaction'] = self.satisfaction
+        state['_Agent__deleted'] = self.deleted
+        state['store'] = None
+        state['index'] = None
+        return (None, state)
 
     @property
     def constraints(self):
         """Returns the constraints of the process."""
         return self.__constraints
 
+    @property
+    def satisfaction(self):
+        """The satisfaction of the agent."""
+        if self.store is None:
+            return self.__satisfaction
+        return self.store.satisfaction[self.index]
+
+    @satisfaction.setter
+    def satisfaction(self, value):
+        if self.store is None:
+            self.__satisfaction = value
+        else:
+            self.store.satisfaction[self.index] = value
+
+    @property
+    def deleted(self):
+        """True if the agent has been deleted."""
+        if self.store is None:
+            return self.__deleted
+        return bool(self.store.deleted[self.index])
+
+    @deleted.setter
+    def deleted(self, value):
+        if value != self.deleted:
+            self.version += 1
+        if self.store is None:
+            self.__deleted = value
+        else:
+            self.store.deleted[self.index] = value
+
+    @property
+    def geometry(self):
+        """The geometry of the feature of the agent."""
+        return self.feature['geometry']
+
+    @geometry.setter
+    def geometry(self, value):
+        if value is not self.feature['geometry']:
+            self.version += 1
+        self.feature['geometry'] = value
+        if self.store is not None:
+            self.store.geometries[self.index] = value
+
     def add_constraints(self, *constraints):
         """
         Set one or multiple constraints to the process.
@@ -39,31 +107,32 @@ class Agent:
         self.__constraints = []
         self.actions_to_try = []
 
-    # compute the satisfaction of the agent from the satisfactions of its constraints
+    # compute the satisfaction of the agent from the satisfactions of its constraints,
+    # the satisfaction of a constraint is only computed again if one of its dependencies has changed
     def compute_satisfaction(self):
         nb = len(self.__constraints)
 
+        # agents without constraints and deleted agents are satisfied
         if nb == 0 or self.deleted:
-            self.satisfaction = 1.0
+            self.satisfaction = 100.0
             return self.satisfaction
         
         sum = 0.0
         imp_sum = 0.0
         for constraint in self.__constraints:
-            constraint.compute_satisfaction()
+            constraint.update_satisfaction()
             if self.verbose:
                 print("satisfaction for constraint {}: {}".format(constraint.type, constraint.satisfaction))
             sum += constraint.satisfaction * constraint.importance
             imp_sum += constraint.importance
         
         if imp_sum == 0:
-            self.satisfaction = 1.0
+            self.satisfaction = 100.0
             return self.satisfaction
         
         self.satisfaction = sum / imp_sum
 
         return self.satisfaction
-
     # the best action to try is the one whose proposing constraint has 1/ the higher priority and 2/ the higher weight
     # the action proposal is an array with [action, constraint, weight]
     def get_best_action_proposal(self):
@@ -122,13 +191,11 @@ class Agent:
 
 
 class MesoAgent(Agent):
-    components = []
+    __slots__ = ('components',)
 
     def __init__(self, feature, components):
-        self.id = next(Agent.newid)
-        self.feature = feature
-        for micro in components:
-            self.components.append(micro)
+        super().__init__(feature)
+        self.components = list(components)
 
     # Compute the mean satisfaction of the components of the meso agent
     def get_components_satisfaction(self):
@@ -1,7 +1,9 @@
 from cartagen.processes.agent.agents.abstract_agents import MesoAgent
+from random import Random
+import shapely
 from shapely.ops import unary_union
 from cartagen.enrichment.urban.building_measures import block_triangulation
-from cartagen.enrichment.urban.block_measures import mean_building_overlap_rate
+from cartagen.enrichment.urban.block_measures import building_overlap_area
 
 class BlockAgent(MesoAgent):
     """
@@ -15,18 +17,28 @@ class BlockAgent(MesoAgent):
         The building blocks to create the agent from.
     importance : int, optional
         Importance of the agent within the process.
+    seed : int, optional
+        The seed of the random number generator used by
+        the random actions of the agent, e.g. the random displacement.
 
     See Also
     --------
     run_agents:
         Execute the AGENT process.
     """
-    triangulation = None
-    def __init__(self, feature, components, sections, importance=1):
+    __slots__ = ('importance', 'initial_geom', 'sections', 'triangulation', 'random', '__densities', '__overlaps', '__road_symbols')
+
+    def __init__(self, feature, components, sections, importance=1, seed=None):
         super().__init__(feature,components)
+        self.triangulation = None
         self.importance = importance
         self.initial_geom = feature['geometry']
         self.sections = sections
+        self.random = Random(seed)
+        # the block measures are updated building by building, they are stored by parameters
+        self.__densities = {}
+        self.__overlaps = {}
+        self.__road_symbols = {}
 
     # Gets the simulated density of the block taking into account the road symbol and the future size 
     # of the buildings once they are generalised.
@@ -41,27 +53,31 @@ class BlockAgent(MesoAgent):
             return 0.0
         
         block_geom = self.feature['geometry']
-        building_area = 0.0
-        for building in self.components:
-            if building.deleted:
-                continue
-            # if the building is no longer inside the block, do not count it
-            building_geom = building.feature['geometry']
-            if block_geom.intersects(building_geom) == False:
-                continue
 
-            building_area += max([building_min_size,building_geom.area])
+        # only the area of the buildings that changed since the last call is computed again
+        areas = self.__densities.get(building_min_size)
+        if areas is None or areas.block_geom is not block_geom:
+            areas = self.__densities[building_min_size] = _ComponentAreas(block_geom, building_min_size)
+        building_area = areas.update(self.components)
 
-        # now compute the area of road symbols inside the block
-        polygons = []
-        for index, road in self.sections.iterrows():
-            symbol_width = road_sizes[index]
-            polygons.append(road['geometry'].buffer(symbol_width))
-        merged_symbols = unary_union(polygons)
-        inter = merged_symbols.intersection(block_geom)
+        # now add the area of road symbols inside the block
+        symbols = self.get_road_symbols(road_sizes)
 
-        return (inter.area + building_area)/block_geom.area
+        return (symbols.inside_area + building_area)/block_geom.area
     
+    # Gets the road symbols of the sections around the block, their union and the part of their union inside the block.
+    # They are calculated once for each list of symbol widths and reused by the density and proximity measures.
+    # ----------
+    # road_sizes : list of floats
+    #     a lists of symbol widths for all the sections around the block. 
+    #     The list uses the same order as the sections around the block.
+    def get_road_symbols(self, road_sizes):
+        key = tuple(road_sizes)
+        symbols = self.__road_symbols.get(key)
+        if symbols is None or symbols.block_geom is not self.feature['geometry']:
+            symbols = self.__road_symbols[key] = _RoadSymbols(self.feature['geometry'], self.sections, road_sizes)
+        return symbols
+
     def compute_block_triangulation(self):
         buildings = []
         roads = []
@@ -86,26 +102,117 @@ class BlockAgent(MesoAgent):
         for building in self.components:
             building_geom = building.feature['geometry']
             building_area += building_geom.area
-        # now compute the area of road symbols inside the block
-        polygons = []
-        for index, road in self.sections.iterrows():
-            symbol_width = road_sizes[index]
-            polygons.append(road['geometry'].buffer(symbol_width))
-        merged_symbols = unary_union(polygons)
-        inter = merged_symbols.intersection(block_geom)
+        # now add the area of road symbols inside the block
+        symbols = self.get_road_symbols(road_sizes)
 
-        return (inter.area + building_area)/block_geom.area
+        return (symbols.inside_area + building_area)/block_geom.area
     
+    # Computes the mean overlapping area of the buildings of the block with the other buildings and the road symbols.
+    # The overlapping area is only computed again for the buildings that changed since the last call and their neighbours.
+    # ----------
+    # min_sep : float
+    #     The minimal distance separating two buildings.
+    # road_sizes : list of floats
+    #     a lists of symbol widths for all the sections around the block. 
+    #     The list uses the same order as the sections around the block. 
     def get_mean_overlapping_rate(self, min_sep, road_sizes):
-        buildings = []
-        for building in self.components:
-            if building.deleted:
+        key = (min_sep, tuple(road_sizes))
+        if key not in self.__overlaps:
+            self.__overlaps[key] = _ComponentOverlaps(min_sep, self.get_road_symbols(road_sizes).union)
+        return self.__overlaps[key].update(self.components)
+
+class _RoadSymbols:
+    """
+    The polygons of the road symbols around a block, their union and the part of their union inside the block.
+    The polygons and their union are prepared to speed up the repeated predicates.
+    """
+    def __init__(self, block_geom, sections, road_sizes):
+        self.block_geom = block_geom
+        # the symbol widths follow the order of the sections, whatever their index
+        self.polygons = [ road.buffer(width) for road, width in zip(sections['geometry'], road_sizes) ]
+        self.union = unary_union(self.polygons)
+        self.inside = self.union.intersection(block_geom)
+        self.inside_area = self.inside.area
+        shapely.prepare(self.polygons)
+        shapely.prepare(self.union)
+
+class _ComponentAreas:
+    """
+    Sum of the areas of the components of a block at the target scale.
+    The area of a component is only calculated again when its version changes,
+    and the sum is updated with the difference.
+    """
+    def __init__(self, block_geom, building_min_size):
+        self.block_geom = block_geom
+        self.building_min_size = building_min_size
+        self.versions = {}
+        self.values = {}
+        self.total = 0.0
+
+    def update(self, components):
+        for component in components:
+            if self.versions.get(component.id) == component.version:
                 continue
-            building_geom = building.feature['geometry']
-            buildings.append(building_geom)
-        roads = []
-        for index, road in self.sections.iterrows():
-            roads.append(road['geometry'])
-        rate = mean_building_overlap_rate(buildings, min_sep, roads, road_sizes)
-        return rate
+            value = self.area(component)
+            self.total += value - self.values.get(component.id, 0.0)
+            self.values[component.id] = value
+            self.versions[component.id] = component.version
+        return self.total
+
+    def area(self, building):
+        if building.deleted:
+            return 0.0
+        # if the building is no longer inside the block, do not count it
+        building_geom = building.geometry
+        if self.block_geom.intersects(building_geom) == False:
+            return 0.0
+        return max([self.building_min_size,building_geom.area])
+
+class _ComponentOverlaps:
+    """
+    Mean overlapping area of the components of a meso agent.
+    When a component changes, the overlapping area is calculated again for this
+    component and the components closer than the minimal separation to its previous
+    or its new geometry, the other ones are kept.
+    """
+    def __init__(self, min_sep, road_symbols):
+        self.min_sep = min_sep
+        self.road_symbols = road_symbols
+        self.versions = {}
+        self.geometries = {}
+        self.overlaps = {}
+
+    def update(self, components):
+        changed = [ c for c in components if self.versions.get(c.id) != c.version ]
+        if len(changed) > 0:
+            # geometries of the components that are not deleted
+            current = { c.id: c.geometry for c in components if not c.deleted }
+
+            dirty = set()
+            for component in changed:
+                dirty.add(component.id)
+                # the neighbours are only searched when some components did not change
+                if len(changed) == len(components):
+                    self.versions[component.id] = component.version
+                    self.geometries[component.id] = current.get(component.id)
+                    continue
+                for geometry in (self.geometries.get(component.id), current.get(component.id)):
+                    if geometry is None:
+                        continue
+                    for cid, other in current.items():
+                        if cid != component.id and other.distance(geometry) <= self.min_sep:
+                            dirty.add(cid)
+                self.versions[component.id] = component.version
+                self.geometries[component.id] = current.get(component.id)
+
+            for cid in dirty:
+                if cid not in current:
+                    self.overlaps.pop(cid, None)
+                    continue
+                others = [ other for oid, other in current.items() if oid != cid ]
+                self.overlaps[cid] = building_overlap_area(current[cid], others, self.min_sep, self.road_symbols)
+
+        if len(self.overlaps) == 0:
+            return 0.0
+        return sum(self.overlaps.values()) / len(self.overlaps)
 
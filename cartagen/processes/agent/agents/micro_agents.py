@@ -18,6 +18,8 @@ class BuildingAgent(Agent):
     run_agents:
         Execute the AGENT process.
     """
+    __slots__ = ('importance', 'initial_geom')
+
     def __init__(self, feature, importance=1):
         super().__init__(feature)
         self.importance = importance
@@ -4,15 +4,31 @@ class GeneralisationConstraint:
     Abstract generalisation constraint object for the AGENT process.
     """
 
-    actions = []
     current_value = None
     goal_value = None
     priority = 0
     satisfaction = 100.0
+    versions = None
 
     def __init__(self, importance, agent):
-        self.__importance = importance
-        self.__agent = agent
+        self.importance = importance
+        self.agent = agent
+        # The actions proposed by the constraint, stored per constraint
+        self.actions = []
+        # The versions of the dependencies when the satisfaction was last computed
+        self.versions = None
+
+    def dependencies(self):
+        """Return the agents whose geometry and deleted state the satisfaction of the constraint depends on."""
+        return [self.agent]
+
+    def update_satisfaction(self):
+        """Compute the satisfaction of the constraint only if one of its dependencies has changed since the last computation."""
+        versions = [ agent.version for agent in self.dependencies() ]
+        if versions != self.versions:
+            self.compute_satisfaction()
+            self.versions = versions
+        return self.satisfaction
 
     # def compute_priority(self):
     #     """compute the priority of the constraint given its current state."""
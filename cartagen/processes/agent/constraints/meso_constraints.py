@@ -5,10 +5,13 @@ from cartagen.processes.agent.actions.block_actions import PromBlockEliminationA
 class ComponentsSatisfactionConstraint(GeneralisationConstraint):
 
     def __init__(self, importance, agent):
-        self.importance = importance
-        self.agent = agent
+        super().__init__(importance, agent)
         self.type = "ComponentsSatisfaction"
 
+    def dependencies(self):
+        """The satisfaction depends on the block and its buildings."""
+        return [self.agent] + self.agent.components
+
     def compute_priority(self):
         """compute the priority of the constraint given its current state."""
         self.priority = 10
@@ -46,13 +49,16 @@ class BlockDensityConstraint(GeneralisationConstraint):
     initial_density = -1.0
     
     def __init__(self, importance, agent, build_min_size, density_ratio, road_sizes):
-        self.importance = importance
-        self.agent = agent
+        super().__init__(importance, agent)
         self.density_ratio = density_ratio
         self.build_min_size = build_min_size
         self.road_sizes = road_sizes
         self.type = "BlockDensity"
 
+    def dependencies(self):
+        """The satisfaction depends on the block and its buildings."""
+        return [self.agent] + self.agent.components
+
     def compute_priority(self):
         """compute the priority of the constraint given its current state."""
         self.priority = 9
@@ -105,12 +111,15 @@ class BlockProximityConstraint(GeneralisationConstraint):
     road_sizes = []
 
     def __init__(self, importance, agent, min_sep, road_sizes):
-        self.importance = importance
-        self.agent = agent
+        super().__init__(importance, agent)
         self.type = "BlockProximity"
         self.min_sep = min_sep
         self.road_sizes = road_sizes
 
+    def dependencies(self):
+        """The satisfaction depends on the block and its buildings."""
+        return [self.agent] + self.agent.components
+
     def compute_priority(self):
         """compute the priority of the constraint given its current state."""
         self.priority = 2
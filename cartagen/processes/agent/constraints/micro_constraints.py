@@ -38,8 +38,7 @@ class BuildingSizeConstraint(GeneralisationConstraint):
     """
 
     def __init__(self, agent, importance, min_area=0.0, area_threshold=70.0):
-        self.agent = agent
-        self.importance = importance
+        super().__init__(importance, agent)
         self.building_min_area = min_area
         self.elimination_area_threshold = area_threshold
         self.type = "Size"
@@ -129,8 +128,7 @@ class BuildingGranularityConstraint(GeneralisationConstraint):
     """
 
     def __init__(self, agent, importance, min_length=0.0):
-        self.importance = importance
-        self.agent = agent
+        super().__init__(importance, agent)
         self.min_length_granularity = min_length
         self.type = "Granularity"
 
@@ -228,8 +226,7 @@ class BuildingSquarenessConstraint(GeneralisationConstraint):
 
 
     def __init__(self, agent, importance, angle_tolerance=15.0):
-        self.importance = importance
-        self.agent = agent
+        super().__init__(importance, agent)
         self.angle_tolerance = angle_tolerance
         self.type = "Squareness"
 
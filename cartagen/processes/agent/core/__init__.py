@@ -1 +1,2 @@
-from cartagen.processes.agent.core.agent_scheduler import run_agents
\ No newline at end of file
+from cartagen.processes.agent.core.agent_scheduler import run_agents, run_agents_parallel
+from cartagen.processes.agent.core.agent_store import AgentStore
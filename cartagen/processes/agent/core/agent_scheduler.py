@@ -1,8 +1,17 @@
-def run_agents(agents, lifecycle='basic', store_states=False, verbose=0):
+import os
+from concurrent.futures import ProcessPoolExecutor
+from heapq import heappush, heappop
+from itertools import count
+from random import Random
+import shapely
+
+def run_agents(agents, lifecycle='basic', store_states=False, reactivation=None, max_activations=5, verbose=0):
     """
     Execute the generalisation process on the given agents.
 
     This function executes the AGENT process on the given list of agents.
+    Agents are activated from the least satisfied to the most satisfied,
+    and by decreasing importance for agents with the same satisfaction.
 
     Parameters
     ----------
@@ -13,8 +22,25 @@ def run_agents(agents, lifecycle='basic', store_states=False, verbose=0):
     store_states : bool, optional
         If True, the function will output all intermediate states
         of the agents.
+    reactivation : float, optional
+        If provided, when the lifecycle of an agent modifies its geometry,
+        the satisfaction of the agents closer than this distance to its previous
+        or new geometry is computed again. The agents whose satisfaction changed
+        are moved in the queue if they are waiting for activation, or activated
+        again if they were already activated and are no longer satisfied.
+        The process stops when no agent remains in the queue.
+        By default, each agent is activated once.
+    max_activations : int, optional
+        The maximum number of activations of an agent when reactivation is enabled.
     verbose : int, optional
         Verbose level.
+
+    Returns
+    -------
+    list of tuple or None
+        If store_states is True, the list of states of the agents in the order they were reached.
+        A state is a tuple of the agent id, the name of the applied action, None for the initial state,
+        the geometry and the satisfaction of the agent.
     """
     accepted_lifecycles = [
         'basic'
@@ -23,21 +49,220 @@ def run_agents(agents, lifecycle='basic', store_states=False, verbose=0):
     if lifecycle not in accepted_lifecycles:
         raise Exception('Lifecycle type not handled: {0}'.format(lifecycle))
 
-    while (len(agents) != 0):
-        agent = agents.pop()
+    states = [] if store_states else None
+
+    # The agents waiting for activation are stored in a heap keyed on their satisfaction and their importance.
+    # An agent pushed again invalidates its previous entry in the heap.
+    heap = []
+    order = count()
+    versions = {}
+    pending = set()
+
+    def push(agent):
+        versions[agent.id] = versions.get(agent.id, 0) + 1
+        pending.add(agent.id)
+        heappush(heap, (agent.satisfaction, -getattr(agent, 'importance', 1), next(order), versions[agent.id], agent))
+
+    for agent in agents:
+        agent.compute_satisfaction()
+        push(agent)
+
+    index = None if reactivation is None else _AgentIndex(agents)
+    activations = {}
+
+    while (len(heap) != 0):
+        satisfaction, importance, rank, version, agent = heappop(heap)
+        if version != versions[agent.id]:
+            continue
+        pending.discard(agent.id)
         
         if(verbose > 0):
             print("agent {} is processed by the scheduler.".format(agent.id))
 
+        previous_geom = agent.geometry
+        previous_deleted = agent.deleted
+
         if(lifecycle == 'basic'):
             # run the basic lifecycle on the current agent
-            __activate_agent_basic(agent, verbose=verbose)
+            __activate_agent_basic(agent, states=states, verbose=verbose)
+        activations[agent.id] = activations.get(agent.id, 0) + 1
+
+        if index is None:
+            continue
+
+        # the lifecycle keeps the satisfaction of the last tried action when it backtracks,
+        # it is computed again to compare it with the satisfaction after the moves of the other agents
+        agent.compute_satisfaction()
+
+        if agent.geometry is previous_geom and agent.deleted == previous_deleted:
+            continue
+
+        # mark the agents around the previous and the new geometry of the agent as dirty
+        index.update(agent)
+        dirty = index.query(previous_geom, reactivation)
+        if not agent.deleted:
+            dirty |= index.query(agent.geometry, reactivation)
+
+        for other in sorted(dirty, key=lambda a: a.id):
+            if other is agent or other.deleted or activations.get(other.id, 0) >= max_activations:
+                continue
+
+            # only the agents whose satisfaction changed are queued again, an agent waiting
+            # for activation is moved in the heap, an agent already activated is activated again
+            # if it is no longer satisfied
+            previous_satisfaction = other.satisfaction
+            other.compute_satisfaction()
+            if other.satisfaction == previous_satisfaction:
+                continue
+            if other.id not in pending and other.satisfaction >= 100:
+                continue
+
+            if(verbose > 0):
+                print("agent {} is marked dirty by agent {}.".format(other.id, agent.id))
+            push(other)
+
+    return states
+
+def run_agents_parallel(agents, lifecycle='basic', store_states=False, processes=None, seed=None, verbose=0):
+    """
+    Execute the generalisation process on independent agents in parallel.
+
+    This function executes the AGENT process on agents that do not interact with each other,
+    such as block agents of different urban blocks, whose constraints and actions
+    only involve their own components and road sections. The agents are shared between
+    processes, each agent being sent with its components and its sections,
+    and the resulting geometries, deleted states and satisfactions are written back
+    into the provided agents and their features.
+
+    As with :func:`run_agents <cartagen.run_agents>`, the GeoDataFrame the features
+    were taken from is not modified, as rows given by ``iterrows()`` are copies.
+    The generalised data must be rebuilt from the agents, for example with
+    ``gpd.GeoDataFrame([ a.feature for a in agents if not a.deleted ], crs=crs)``,
+    and from their components for meso agents.
+
+    Parameters
+    ----------
+    agents : list of Agent
+        The independent agents to use for generalisation.
+    lifecycle : str, optional
+        Type of life cycle to apply on the agents.
+    store_states : bool, optional
+        If True, the function will output all intermediate states
+        of the agents.
+    processes : int, optional
+        The number of processes used to run the agents.
+        If set to None, the number of processors of the machine is used.
+        If set to 1, agents are run one after another in the current process.
+    seed : int, optional
+        If provided, the random number generator of each agent, if it has one,
+        is seeded from this value and the position of the agent in the list,
+        which makes the result independent of the number of processes.
+    verbose : int, optional
+        Verbose level.
+
+    Returns
+    -------
+    list of tuple or None
+        If store_states is True, the list of states of the agents, agent after agent.
+
+    See Also
+    --------
+    run_agents :
+        Execute the AGENT process.
+    """
+    agents = list(agents)
+
+    seeds = [ None ] * len(agents)
+    if seed is not None:
+        generator = Random(seed)
+        seeds = [ generator.getrandbits(32) for agent in agents ]
+
+    if processes is None:
+        processes = os.cpu_count()
+
+    if processes == 1 or len(agents) < 2:
+        return _run_agents_task((agents, seeds, lifecycle, store_states, verbose))[1]
+
+    # Agents are sent by chunks, several per process to balance the load
+    size = max(1, -(-len(agents) // (4 * processes)))
+    chunks = [ (i, i + size) for i in range(0, len(agents), size) ]
+    tasks = [ (agents[start:end], seeds[start:end], lifecycle, store_states, verbose) for start, end in chunks ]
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        outputs = list(executor.map(_run_agents_task, tasks))
+
+    states = [] if store_states else None
+    for (start, end), (results, partial) in zip(chunks, outputs):
+        for agent, result in zip(agents[start:end], results):
+            for target, (geometry, deleted, satisfaction) in zip([ agent ] + _components(agent), result):
+                target.geometry = geometry
+                target.deleted = deleted
+                target.satisfaction = satisfaction
+        if store_states:
+            states.extend(partial)
 
-def __activate_agent_basic(agent, store_states=False, validity_satisfaction = 0.5, verbose=0, iter_max = 20):
-    # clean the possibly previously created and stored states
-    if(store_states):
-        agent.clean_states()
+    return states
 
+def _components(agent):
+    """
+    Return the components of a meso agent, or an empty list for a micro agent.
+    """
+    return list(getattr(agent, 'components', []))
+
+def _run_agents_task(task):
+    """
+    Run the agents of one task one after another.
+    Return the geometry, the deleted state and the satisfaction of each agent
+    followed by the ones of its components, and the states of the agents.
+    """
+    agents, seeds, lifecycle, store_states, verbose = task
+
+    results = []
+    states = [] if store_states else None
+    for agent, seed in zip(agents, seeds):
+        if seed is not None and getattr(agent, 'random', None) is not None:
+            agent.random.seed(seed)
+        partial = run_agents([ agent ], lifecycle=lifecycle, store_states=store_states, verbose=verbose)
+        if store_states:
+            states.extend(partial)
+        results.append([ (a.geometry, a.deleted, a.satisfaction) for a in [ agent ] + _components(agent) ])
+
+    return results, states
+
+class _AgentIndex:
+    """
+    Spatial index of the geometries of agents.
+    The agents whose geometry changed since the index was built are tested individually,
+    and the index is built again once too many agents have changed.
+    """
+    def __init__(self, agents):
+        self.agents = list(agents)
+        self.positions = { agent.id: i for i, agent in enumerate(self.agents) }
+        self.__build()
+
+    def __build(self):
+        self.tree = shapely.STRtree([ agent.geometry for agent in self.agents ])
+        self.moved = set()
+
+    def update(self, agent):
+        """
+        Register that the geometry of the agent has changed.
+        """
+        self.moved.add(self.positions[agent.id])
+        if len(self.moved) > max(16, len(self.agents) ** 0.5):
+            self.__build()
+
+    def query(self, geometry, distance):
+        """
+        Return the set of agents closer than the distance to the geometry.
+        """
+        candidates = set(self.tree.query(geometry, predicate='dwithin', distance=distance).tolist()) | self.moved
+        return set(
+            self.agents[i] for i in candidates
+            if shapely.dwithin(self.agents[i].geometry, geometry, distance)
+        )
+
+def __activate_agent_basic(agent, states=None, validity_satisfaction = 0.5, verbose=0, iter_max = 20):
     # compute the satisfaction of the agent
     agent.compute_satisfaction()
 
@@ -53,9 +278,8 @@ def __activate_agent_basic(agent, store_states=False, validity_satisfaction = 0.
             print(action)
 
     # if we store states, we create the current state as the root state
-    if(store_states):
-        # TODO
-        current_state = None
+    if states is not None:
+        states.append((agent.id, None, agent.geometry, agent.satisfaction))
     
     # test if the agent is satisfied
     if(agent.satisfaction >= 100.0 - validity_satisfaction):
@@ -94,6 +318,10 @@ def __activate_agent_basic(agent, store_states=False, validity_satisfaction = 0.
         if verbose > 0:
             print("new satisfaction after the action: {}".format(agent.satisfaction))
 
+        # store the new state of the agent
+        if states is not None:
+            states.append((agent.id, action.name, agent.geometry, agent.satisfaction))
+
         # get actions from constraints
         # agent.update_action_proposals()
         # remove the action that we just tested to avoid trying the same action if there is a backtrack
@@ -121,7 +349,7 @@ def __activate_agent_basic(agent, store_states=False, validity_satisfaction = 0.
             # the state is not valid and the agent is backtracked to its previous state
             if verbose > 0:
                 print("agent {} did not improve so it is backtracked to previous state".format(agent.id)) 
-            agent.feature['geometry'] = previous_geom
+            agent.geometry = previous_geom
             i += 1
 
 
@@ -0,0 +1,120 @@
+import numpy as np
+
+class AgentStore:
+    """
+    Columnar storage of the state of the agents.
+
+    This object keeps the satisfaction, the priority, the deleted state
+    and a reference to the geometry of every agent added to it in arrays,
+    so they can be read for all agents at once.
+    Agents added to the store read and write their satisfaction,
+    their deleted state and their geometry from it.
+
+    Parameters
+    ----------
+    agents : list of Agent, optional
+        The agents to add to the store.
+
+    See Also
+    --------
+    run_agents :
+        Execute the AGENT process.
+
+    Notes
+    -----
+    The priority of an agent is its importance, or 1 if the agent has no importance.
+
+    Examples
+    --------
+    >>> store = AgentStore(agents)
+    >>> run_agents(agents)
+    >>> unsatisfied = store.satisfaction < 100.0
+    """
+    def __init__(self, agents=None):
+        self.agents = []
+        self.__satisfaction = np.empty(0)
+        self.__priority = np.empty(0)
+        self.__deleted = np.empty(0, dtype=bool)
+        self.__geometries = np.empty(0, dtype=object)
+
+        if agents is not None:
+            self.add(*agents)
+
+    def __len__(self):
+        return len(self.agents)
+
+    @property
+    def satisfaction(self):
+        """The satisfaction of each agent."""
+        return self.__satisfaction[:len(self)]
+
+    @property
+    def priority(self):
+        """The priority of each agent."""
+        return self.__priority[:len(self)]
+
+    @property
+    def deleted(self):
+        """True for each deleted agent."""
+        return self.__deleted[:len(self)]
+
+    @property
+    def geometries(self):
+        """The geometry of each agent."""
+        return self.__geometries[:len(self)]
+
+    def add(self, *agents):
+        """
+        Add one or multiple agents to the store.
+        The current state of the agents is copied into the store.
+
+        Parameters
+        ----------
+        *agents : Agent
+            The agents to add to the store.
+        """
+        start = len(self)
+        end = start + len(agents)
+
+        # Grow the arrays by doubling their capacity
+        if end > len(self.__satisfaction):
+            capacity = max(end, 2 * len(self.__satisfaction))
+            self.__satisfaction = self.__grow(self.__satisfaction, capacity)
+            self.__priority = self.__grow(self.__priority, capacity)
+            self.__deleted = self.__grow(self.__deleted, capacity)
+            self.__geometries = self.__grow(self.__geometries, capacity)
+
+        for index, agent in enumerate(agents, start=start):
+            if agent.store is not None:
+                raise Exception('Agent {0} already belongs to an agent store.'.format(agent.id))
+            self.__satisfaction[index] = agent.satisfaction
+            self.__priority[index] = getattr(agent, 'importance', 1)
+            self.__deleted[index] = agent.deleted
+            self.__geometries[index] = agent.geometry
+            self.agents.append(agent)
+            agent.store, agent.index = self, index
+
+    def refresh(self):
+        """
+        Update the geometries of the store from the features of the agents,
+        in case they were modified without using the geometry of the agents.
+        """
+        for index, agent in enumerate(self.agents):
+            self.__geometries[index] = agent.feature['geometry']
+
+    def compute_satisfaction(self):
+        """
+        Compute the satisfaction of every agent of the store.
+
+        Returns
+        -------
+        ndarray of float
+        """
+        for agent in self.agents:
+            agent.compute_satisfaction()
+        return self.satisfaction
+
+    def __grow(self, array, capacity):
+        grown = np.empty(capacity, dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
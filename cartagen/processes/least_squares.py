@@ -1,8 +1,17 @@
-from collections import Counter
+import time
+from concurrent.futures import ProcessPoolExecutor
 import shapely
 import geopandas as gpd
 import numpy as np
-from cartagen.utils.partitioning.network import partition_networks
+from cartagen.utils.math.least_squares import iterate_least_squares
+from cartagen.utils.partitioning.network import network_faces
+from cartagen.utils.partitioning.tessellation import partition_grid
+
+# The movement weight fixing the shapes added as context to a network partition
+_FIXED_WEIGHT = 1000000
+
+# The approximate number of points of the tiles splitting the shapes lying on the partitioning network
+_TILE_POINTS = 2000
 
 class ConstraintMethod:
     """
@@ -22,17 +31,48 @@ class ConstraintMethod:
     crossing_node_threshold : int optional
         When two lines intersects, define the number of nodes from the intersection on wich spatial conflicts between those two lines doesn't apply.
         The default value is set to 7.
+    solver : str optional
+        The solver used to calculate the displacement at each iteration. Can be:
+            'dense' : The normal equations are built as dense matrices and solved with numpy.
+                Memory grows with the square of the number of points, use it for small datasets.
+            'sparse' : The matrices are assembled as scipy sparse matrices and the normal equations are solved with a sparse direct factorization.
+            'cg' : The matrices are assembled as scipy sparse matrices and the normal equations are solved with the conjugate gradient method.
+        Sparse solvers require scipy to be installed.
+        The default value is set to 'dense'.
+    damping : float optional
+        The fraction of the calculated displacement applied at each iteration, between 0 and 1.
+        The default value is set to 1.
+    line_search : boolean optional
+        If set to True, the applied displacement is halved until the weighted residuals of the model decrease.
+        The default value is set to False.
+    stagnation : float optional
+        If set, the iteration loop also breaks when the weighted residuals decreased by less than this ratio over the last 5 iterations.
+        The default value is set to None.
     verbose : boolean optional
         For debugging purposes, choose to print some key values while the constraint method is calculated.
         Default set to False.
     """
-    def __init__(self, max_iteration=1000, norm_tolerance=0.05, same_object_conflicts=True, crossing_node_threshold=7, verbose=False):
+    def __init__(self, max_iteration=1000, norm_tolerance=0.05, same_object_conflicts=True, crossing_node_threshold=7, solver='dense',
+            damping=1.0, line_search=False, stagnation=None, verbose=False):
         self.MAX_ITER = max_iteration
         self.NORM_TOLERANCE = norm_tolerance
         self.SAME_OBJECT_CONFLICTS = same_object_conflicts
         self.CROSSING_NODE_THRESHOLD = crossing_node_threshold
+        self.DAMPING = damping
+        self.LINE_SEARCH = line_search
+        self.STAGNATION = stagnation
         self.VERBOSE = verbose
 
+        if solver not in ['dense', 'sparse', 'cg']:
+            raise Exception('{0} solver does not exist. Available solvers: dense, sparse, cg.'.format(solver))
+        if solver != 'dense':
+            try:
+                import scipy.sparse
+                import scipy.sparse.linalg
+            except ImportError:
+                raise Exception('The {0} solver requires scipy to be installed.'.format(solver))
+        self.SOLVER = solver
+
         self.__ALLOWED_CONSTRAINTS = {
             'Point': ['movement'],
             'LineString': ['movement', 'stiffness', 'curvature'],
@@ -51,6 +91,10 @@ class ConstraintMethod:
         self.__WEIGHTS = []
         # Stores the number of different shapes
         self.__SHAPE_COUNT = 0
+        # Stores the time spent preparing the geometries and constraints
+        self.__PREPARATION_TIME = None
+        # Stores the records of the iterations
+        self.__ITERATIONS = []
         
         # Stores all points of all objects in nested lists of shapes
         self.__shapes = []
@@ -190,448 +234,552 @@ class ConstraintMethod:
         self.__CONFLICTS = spatial_weights
 
 
-    def generalize(self, network_partitioning=False):
+    def generalize(self, network_partitioning=False, processes=1, warm_start=None):
         """
         Launch the constraint generalisation on the added objects.
+        Parameters
+        ----------
+        network_partitioning : **Geopandas**, *GeoDataFrame* or list of *GeoDataFrame*, optional.
+            One or multiple networks used to partition the objects. Each shape is assigned to the network face strictly containing
+            a point of the shape. The shapes lying on the network, e.g. the network sections, or outside every face are split into
+            tiles of a square grid, which are generalized before the faces. Partitions with shapes within the conflict distance of
+            each other are generalized in successive rounds, and the shapes of the other partitions within the conflict distance
+            are added to each partition as fixed context, at their generalized position if their partition was already generalized.
+            The vertices shared with the context, e.g. the nodes between two tiles of the network, keep the position of the context.
+            If set to False, all objects are generalized at once.
+        processes : **int**, *optional*.
+            The number of processes used to generalize the partitions in parallel.
+            Default to 1, which means partitions are generalized one after another.
+            If set to None, the number of processors of the machine is used.
+            Ignored when no network partitioning is provided.
+        warm_start : list of **Geopandas**, *GeoDataFrame*, optional.
+            The result of a previous generalisation of the same objects, used as the starting position of the points.
+            The constraints are still calculated from the added objects.
         """
         # Checks if objects are present
         if len(self.__OBJECTS) < 1:
             raise Exception('No objects provided, cannot generalize.')
-        
+
+        if network_partitioning is not None and network_partitioning is not False:
+            if isinstance(network_partitioning, gpd.GeoDataFrame):
+                network_partitioning = [network_partitioning]
+            if not isinstance(network_partitioning, (list, tuple)) or len(network_partitioning) == 0 or \
+                    not all(isinstance(n, gpd.GeoDataFrame) for n in network_partitioning):
+                raise Exception('network_partitioning must be a GeoDataFrame or a list of GeoDataFrame of lines.')
+            return self.__generalize_partitions(network_partitioning, processes, warm_start)
+
+        start = time.time()
+
         # Prepare geometries before launching the constraint method
         points = self.__prepare_geometries()
 
+        # Convert the constraints to arrays of point indexes
+        self.__index_constraints()
+
+        self.__PREPARATION_TIME = time.time() - start
+        if self.VERBOSE:
+            print('Preparation time: {0:.3f}s'.format(self.__PREPARATION_TIME))
+
         # Build the observation matrix
         self.__build_Y(points)
 
         # Build the weighing matrice
         self.__build_W(points)
 
-        nb_points = len(points)
-        # Calculate dx as long as the maximum iteration is not reached
-        for i in range(self.MAX_ITER):
-            # Apply the least square method
-            dx = self.__compute_dx(points)
+        # Start from the points of a previous generalisation
+        if warm_start is not None:
+            points = self.__warm_start(points, warm_start)
+            self.__update_distances(points)
 
-            # Reshape the matrix
-            points += dx.reshape(nb_points, 2)
+        def assemble(points):
+            # Build the jacobian matrix A and the matrix B which is Y - S(X)
+            return self.__build_A(points), self.__W, self.__build_B(points)
 
-            # Calculate the norm
-            norm = np.linalg.norm(dx, ord=np.inf)
-            if self.VERBOSE:
-                print(norm)
-            # Break the loop if the norm is below the tolerance threshold
-            if norm < self.NORM_TOLERANCE:
-                break
-
-            # Recalculate distances between conflicting nodes after the first iteration
-            self.__update_distances(points)
+        # Calculate dx as long as the maximum iteration is not reached,
+        # distances between conflicting nodes are recalculated after each iteration
+        points, self.__ITERATIONS = iterate_least_squares(
+            points, assemble, self.MAX_ITER, self.NORM_TOLERANCE, self.SOLVER,
+            damping=self.DAMPING, line_search=self.LINE_SEARCH, residual=self.__residual,
+            stagnation=self.STAGNATION, update=self.__update_distances, verbose=self.VERBOSE
+        )
 
         # Recreate objects geometries
         result = self.__reconstruct_geometries(points)
 
         return result
 
-    def __build_Y(self, points):
+    def __warm_start(self, points, warm_start):
         """
-        Build the observation vector.
+        Replace the points by their position in the result of a previous generalisation.
         """
-        movement = self.__constraints['movement']
-        stiffness = self.__constraints['stiffness']
-        curvature = self.__constraints['curvature']
-        nodes = self.__constraints['nodes']
-        links = self.__constraints['links']
-
-        # Define the size of the vector
-        size = 2 * len(movement) +  2 * len(stiffness) + 3 * len(curvature) + len(nodes) + len(links)
-    
-        # Create a zero filled np array of the wanted shape
-        Y = np.zeros(size)
-
-        # Add x and y value to the begining of the vector representing the movement constraint
-        for i, p in enumerate(movement):
-            coordinates = points[p[0]]
-            Y[2 * i] = coordinates[0]
-            Y[2 * i + 1] = coordinates[1]
-
-        offset = 2 * len(movement)
-        for i, p in enumerate(stiffness):
-            dx, dy = self.__calculate_stiffness(p, points)
-            # Difference between the current and the following along the x axis (x - x+1)
-            Y[offset + 2 * i] = dx
-            # Difference between the current and the following along the y axis (y - y+1)
-            Y[offset + 2 * i + 1] = dy
-        
-        offset += 2 * len(stiffness)
-        for i, p in enumerate(curvature):
-            alpha, normp, normn = self.__calculate_curvature(p, points)
-            # First value of the constraint is the angle formed by the previous, the current and the next point
-            Y[offset + i] = alpha
-            # Second value is the norm of the vector formed by the previous and the current point
-            Y[offset + i + 1] = normp
-            # Third value is the norm of the vector formed by the current and the next point
-            Y[offset + i + 2] = normn
-
-        # Keep 0 for the spatial conflicts (nodes and links)
-
-        self.__Y = Y
-
-    def __build_B(self, points):
+        if len(warm_start) != len(self.__OBJECTS):
+            raise Exception('The warm start must contain the same objects as the constraint method.')
+
+        points = np.array(points, dtype=float)
+        for oid, o in enumerate(warm_start):
+            if len(o) != len(self.__shapes[oid]):
+                raise Exception('The warm start must contain the same shapes as the constraint method.')
+            for shape, geometry in zip(self.__shapes[oid], o.geometry):
+                coordinates = _get_coordinates(geometry)
+                for i, p in enumerate(shape):
+                    points[p] = coordinates[i][:2]
+        return points
+
+    def __generalize_partitions(self, networks, processes, warm_start=None):
         """
-        Build the matrix B -> Y - S(X).
+        Partition the shapes of all objects using the network faces and generalize each partition independently.
+        The shapes lying on the network are split into tiles generalized first, then the shapes inside each face.
+        Partitions close to each other are generalized in successive rounds, each partition using the
+        generalized shapes of the previous rounds and the other shapes within the conflict distance as fixed context.
         """
-        movement = self.__constraints['movement']
-        stiffness = self.__constraints['stiffness']
-        curvature = self.__constraints['curvature']
-        nodes = self.__constraints['nodes']
-        links = self.__constraints['links']
-
-        S = np.zeros(2 * len(movement) + 2 * len(stiffness) + 3 * len(curvature) + len(nodes) + len(links))
-
-        for i, p in enumerate(movement):
-            coordinates = points[p[0]]
-            S[2 * i] = coordinates[0]
-            S[2 * i + 1] = coordinates[1]
-
-        offset = 2 * len(movement)
-        for i, p in enumerate(stiffness):
-            dx, dy = self.__calculate_stiffness(p, points)
-            # Difference between the current and the following along the x axis (x - x+1)
-            S[offset + 2 * i] = dx
-            # Difference between the current and the following along the y axis (y - y+1)
-            S[offset + 2 * i + 1] = dy
-
-        offset += 2 * len(stiffness)
-        for i, p in enumerate(curvature):
-            alpha, normp, normn = self.__calculate_curvature(p, points)
-            # First value of the constraint is the angle formed by the previous, the current and the next point
-            S[offset + i] = alpha
-            # Second value is the norm of the vector formed by the previous and the current point
-            S[offset + i + 1] = normp
-            # Third value is the norm of the vector formed by the current and the next point
-            S[offset + i + 2] = normn
-
-        offset += 3 * len(curvature)
-        for i, n in enumerate(nodes):
-            if n[3] > n[2]:
-                # Add 0 if the actual distance is higher than the minimum distance
-                S[offset + i] = 0
-            else:
-                # Add dist_min - dist if the actual distance is below the minimum distance
-                S[offset + i] = n[2] - n[3]
-
-        offset += len(nodes)
-        for i, l in enumerate(links):
-            if l[4] > l[3]:
-                # Same as nodes
-                S[offset + i] = 0
+        start = time.time()
+
+        # Stores all shapes in one array, along with their object and row
+        shapes, objects, rows = [], [], []
+        for oid, o in enumerate(self.__OBJECTS):
+            shapes.extend(o.geometry)
+            objects.extend([oid] * len(o))
+            rows.extend(range(len(o)))
+        shapes = np.array(shapes, dtype=object)
+        objects, rows = np.array(objects, dtype=int), np.array(rows, dtype=int)
+
+        faces = list(network_faces(*[ n.geometry for n in networks ]))
+
+        # Each shape belongs to the face strictly containing a point of the shape
+        owner = np.full(len(shapes), -1)
+        tree = shapely.STRtree(shapely.point_on_surface(shapes))
+        if len(faces) > 0:
+            fids, sids = tree.query(faces, predicate='contains_properly')
+            owner[sids] = fids
+
+        # The shapes lying on the network, e.g. the network sections, or outside every face are split
+        # into tiles of a square grid holding about the same number of points
+        groups, regions = [], []
+        seams = np.flatnonzero(owner == -1)
+        if len(seams) > 0:
+            layer = gpd.GeoDataFrame(geometry=shapes[seams])
+            nb_tiles = -(-int(shapely.get_num_coordinates(shapes[seams]).sum()) // _TILE_POINTS)
+            xmin, ymin, xmax, ymax = layer.total_bounds
+            width = max(np.sqrt((xmax - xmin) * (ymax - ymin) / nb_tiles), max(xmax - xmin, ymax - ymin) / nb_tiles, 1.0)
+            (offsets, members), cells = partition_grid(layer, width, compact=True)
+            for i in range(len(cells)):
+                groups.append(seams[members[offsets[i]:offsets[i + 1]]])
+                regions.append(None)
+        phases = [ 0 ] * len(groups)
+
+        for fid, face in enumerate(faces):
+            groups.append(np.flatnonzero(owner == fid))
+            regions.append(face)
+            phases.append(1)
+
+        # The shapes closer than the largest conflict distance to a partition are its context
+        reach = 0.0
+        if np.size(self.__DISTANCES) > 0:
+            reach = 1.5 * float(np.max(self.__DISTANCES))
+        tree = shapely.STRtree(shapes)
+
+        partitions = []
+        for group, region, phase in zip(groups, regions, phases):
+            if len(group) == 0:
+                continue
+            if region is None:
+                context = tree.query(shapes[group], predicate='dwithin', distance=reach)[1]
             else:
-                # Same as nodes
-                S[offset + i] = l[3] - l[4]
+                context = tree.query(region, predicate='dwithin', distance=reach)
+            partitions.append((group, np.setdiff1d(context, group), phase))
+
+        # Partitions with shapes in the context of each other are neighbours and are given different rounds,
+        # the tiles of the network being generalized before the faces
+        partition = np.full(len(shapes), -1)
+        for pid, (group, context, phase) in enumerate(partitions):
+            partition[group] = pid
+        neighbours = [ set() for p in partitions ]
+        for pid, (group, context, phase) in enumerate(partitions):
+            for other in np.unique(partition[context]).tolist():
+                neighbours[pid].add(other)
+                neighbours[other].add(pid)
+        rounds, first = [], 0
+        for pid, (group, context, phase) in enumerate(partitions):
+            if phase == 1 and (pid == 0 or partitions[pid - 1][2] == 0):
+                first = len(set(rounds))
+            taken = set(rounds[other] for other in neighbours[pid] if other < pid)
+            r = first
+            while r in taken:
+                r += 1
+            rounds.append(r)
+
+        parameters = {
+            'max_iteration': self.MAX_ITER,
+            'norm_tolerance': self.NORM_TOLERANCE,
+            'same_object_conflicts': self.SAME_OBJECT_CONFLICTS,
+            'crossing_node_threshold': self.CROSSING_NODE_THRESHOLD,
+            'solver': self.SOLVER,
+            'damping': self.DAMPING,
+            'line_search': self.LINE_SEARCH,
+            'stagnation': self.STAGNATION,
+            'verbose': False,
+        }
 
-        return self.__Y - S
+        # The current geometries, replaced by the generalized ones after each round
+        current = shapes.copy()
 
-    def __build_W(self, points):
-        """
-        Build the weighting matrix.
-        """
-        # Stores arrays inside a list
-        constraints = []
-
-        movement = []
-        # Loop through moving points
-        for m in self.__constraints['movement']:
-            w = m[1]
-            # Add the weight value to the movement list two times for x and y
-            movement.extend([w, w])
-        constraints.append(np.full(len(movement), movement))
-
-        stiffness = []
-        # Loop through stiffness constrained points
-        for s in self.__constraints['stiffness']:
-            w = s[2]
-            stiffness.extend([w, w])
-        constraints.append(np.full(len(stiffness), stiffness))
-
-        curvature = [] 
-        # Loop through curvature constrained points
-        for c in self.__constraints['curvature']:
-            w = c[3]
-            curvature.extend([w, w, w])
-        constraints.append(np.full(len(curvature), curvature))
+        executor = None
+        if processes != 1 and len(partitions) > 1:
+            executor = ProcessPoolExecutor(max_workers=processes)
 
-        spatial = []
-        # Loop through node to node conflicts
-        for n in self.__constraints['nodes']:
-            w = n[4]
-            # Add the weight to the list
-            spatial.append(w)
-        # Loop through node to link conflicts
-        for l in self.__constraints['links']:
-            w = l[5]
-            # Add the weight to the list
-            spatial.append(w)
-        # Create the spatial conflict weight matrix
-        constraints.append(np.full(len(spatial), spatial))
+        self.__ITERATIONS = []
+        try:
+            for r in range(max(rounds, default=-1) + 1):
+                pids = [ pid for pid in range(len(partitions)) if rounds[pid] == r ]
+                prepared = [ self.__partition_task(partitions[pid], shapes, current, objects, rows, parameters, warm_start) for pid in pids ]
+                tasks = [ task for task, inputs, anchors in prepared ]
+
+                if executor is None or len(tasks) == 1:
+                    results = [ _generalize_partition(task) for task in tasks ]
+                else:
+                    results = list(executor.map(_generalize_partition, tasks))
+
+                for pid, (task, inputs, anchors), (result, records) in zip(pids, prepared, results):
+                    # Keep the records of the iterations of each partition
+                    for record in records:
+                        self.__ITERATIONS.append(dict(record, partition=pid))
+                    # Only the shapes belonging to the partition are kept, the context is discarded,
+                    # and the vertices shared with the context are kept exactly at its position
+                    group = partitions[pid][0]
+                    for oid, before, after in zip(np.unique(objects[group]), inputs, result):
+                        current[np.sort(group[objects[group] == oid])] = [
+                            _pin_vertices(b, a, anchors) for b, a in zip(before, after)
+                        ]
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        # Update the geometries of the results
+        for oid, o in enumerate(self.__RESULTS):
+            o['geometry'] = gpd.GeoSeries(list(current[objects == oid]), index=o.index, crs=o.crs)
+
+        self.__PREPARATION_TIME = None
+        if self.VERBOSE:
+            print('{0} partitions generalized in {1} rounds in {2:.3f}s'.format(len(partitions), max(rounds, default=-1) + 1, time.time() - start))
 
-        # Create the diagonal weighting matrix by concatenating all constraints matrices
-        self.__W = np.diag(np.concatenate((constraints)))
+        return self.__OBJECTS
 
-    def __compute_dx(self, points):
+    def __partition_task(self, partition, shapes, current, objects, rows, parameters, warm_start):
         """
-        Apply the least square method to the model.
+        Prepare the generalisation of a partition. The objects with shapes inside the partition are added with their own weights,
+        followed by the objects of the context at their current position with a movement weight fixing their points.
         """
-        # Build the jacobian matrix A
-        A = self.__build_A(points)
-        # Build the matrix B which is S - Y
-        B = self.__build_B(points)
-
-        atp = A.T @ self.__W
-        atpa = atp @ A
-        atpb = atp @ B
-
-        # Solves the equation
-        dx = np.linalg.solve(atpa, atpb)
+        group, context, phase = partition
+
+        # The vertices shared with context shapes that have already been generalized follow them
+        moved = {}
+        for sid in context:
+            if current[sid] is not shapes[sid]:
+                for before, after in zip(_get_coordinates(shapes[sid]), _get_coordinates(current[sid])):
+                    moved[before[:2]] = after[:2]
+
+        anchors = set()
+        for sid in context:
+            anchors.update(c[:2] for c in _get_coordinates(current[sid]))
+
+        layers, present, fixed, sources, inputs = [], [], [], [], []
+        for members, is_context in ((group, False), (context, True)):
+            for oid in np.unique(objects[members]):
+                sids = np.sort(members[objects[members] == oid])
+                weights = self.__WEIGHTS[oid]
+                if is_context:
+                    geometries = current[sids]
+                    weights = dict(weights, movement=_FIXED_WEIGHT)
+                else:
+                    geometries = [ _move_vertices(g, moved) for g in shapes[sids] ] if len(moved) > 0 else list(shapes[sids])
+                    inputs.append(geometries)
+                layers.append((gpd.GeoDataFrame(geometry=list(geometries), crs=self.__OBJECTS[oid].crs), weights))
+                present.append(oid)
+                fixed.append(is_context)
+                sources.append((oid, rows[sids], geometries))
+        present, fixed = np.array(present, dtype=int), np.array(fixed, dtype=bool)
+
+        # The previous positions of the shapes of the partition, the context stays at its current position
+        warm = None
+        if warm_start is not None:
+            warm = []
+            for (oid, r, geometries), is_context in zip(sources, fixed):
+                source = geometries if is_context else warm_start[oid].geometry.iloc[r].values
+                warm.append(gpd.GeoDataFrame(geometry=list(source)))
+
+        # The distances and weights of the spatial conflicts between the present objects
+        distances, conflicts = None, None
+        if np.size(self.__DISTANCES) > 0:
+            distances = np.array(self.__DISTANCES, dtype=float)[np.ix_(present, present)]
+            conflicts = np.array(self.__CONFLICTS, dtype=float)[np.ix_(present, present)]
+            # The shapes of an object and its context do not conflict when the shapes of the object do not
+            for i, oid in enumerate(present):
+                lines = self.__OBJECTS[oid].geom_type.iloc[0] == 'LineString'
+                if lines or not self.SAME_OBJECT_CONFLICTS:
+                    same = (present == oid) & (fixed != fixed[i])
+                    distances[i, same] = 0
+                    conflicts[i, same] = 0
+
+        return (parameters, layers, distances, conflicts, warm), inputs, anchors
+
+    def __index_constraints(self):
+        """
+        Convert the constraints into arrays of point indexes, weights and distances.
+        Also build the position of the non-zero entries of the jacobian matrix, which do not change between iterations.
+        """
+        def table(name, width):
+            return np.array(self.__constraints[name], dtype=float).reshape(-1, width)
+
+        movement = table('movement', 2)
+        stiffness = table('stiffness', 3)
+        curvature = table('curvature', 4)
+        nodes = table('nodes', 5)
+        links = table('links', 6)
+
+        self.__indexes = {
+            'movement': movement[:, 0].astype(int),
+            'stiffness': stiffness[:, :2].astype(int),
+            'curvature': curvature[:, :3].astype(int),
+            'nodes': nodes[:, :2].astype(int),
+            'links': links[:, :3].astype(int),
+        }
 
-        return dx
+        self.__weights = {
+            'movement': movement[:, 1],
+            'stiffness': stiffness[:, 2],
+            'curvature': curvature[:, 3],
+            'nodes': nodes[:, 4],
+            'links': links[:, 5],
+        }
 
-    def __build_A(self, points):
+        # Minimum and current distances of the spatial conflicts
+        self.__min_distances = { 'nodes': nodes[:, 2], 'links': links[:, 3] }
+        self.__distances = { 'nodes': nodes[:, 3], 'links': links[:, 4] }
+
+        s = self.__indexes['stiffness']
+        i = np.arange(len(s))
+        # Stiffness: x and y of the current and the next point
+        srows = np.column_stack((2 * i, 2 * i, 2 * i + 1, 2 * i + 1))
+        scols = np.column_stack((2 * s[:, 0], 2 * s[:, 1], 2 * s[:, 0] + 1, 2 * s[:, 1] + 1))
+
+        c = self.__indexes['curvature']
+        i = np.arange(len(c))
+        pp, p, pn = c[:, 0], c[:, 1], c[:, 2]
+        # Curvature: the angle depends on the three points, the length of the previous
+        # segment on the previous and current point and the length of the next segment on the next and current point
+        crows = np.column_stack([3 * i] * 6 + [3 * i + 1] * 4 + [3 * i + 2] * 4)
+        ccols = np.column_stack((
+            2 * pp, 2 * pp + 1, 2 * p, 2 * p + 1, 2 * pn, 2 * pn + 1,
+            2 * p, 2 * p + 1, 2 * pp, 2 * pp + 1,
+            2 * pn, 2 * pn + 1, 2 * p, 2 * p + 1
+        ))
+
+        n = self.__indexes['nodes']
+        i = np.arange(len(n))
+        # Node to node conflicts: x and y of both nodes
+        nrows = np.column_stack([i] * 4)
+        ncols = np.column_stack((2 * n[:, 0], 2 * n[:, 0] + 1, 2 * n[:, 1], 2 * n[:, 1] + 1))
+
+        l = self.__indexes['links']
+        i = np.arange(len(l)) + len(n)
+        # Node to link conflicts: x and y of the node and of both points of the link
+        lrows = np.column_stack([i] * 6)
+        lcols = np.column_stack((
+            2 * l[:, 0], 2 * l[:, 0] + 1, 2 * l[:, 1], 2 * l[:, 1] + 1, 2 * l[:, 2], 2 * l[:, 2] + 1
+        ))
+
+        size = 2 * len(self.__points)
+        identity = np.arange(size)
+
+        # Stack the blocks below the identity matrix of the movement constraint
+        offsets = np.cumsum([size, 2 * len(s), 3 * len(c)])
+        self.__A_rows = np.concatenate((
+            identity, srows.ravel() + offsets[0], crows.ravel() + offsets[1],
+            nrows.ravel() + offsets[2], lrows.ravel() + offsets[2]
+        ))
+        self.__A_columns = np.concatenate((
+            identity, scols.ravel(), ccols.ravel(), ncols.ravel(), lcols.ravel()
+        ))
+        self.__A_shape = (offsets[2] + len(n) + len(l), size)
+        self.__A_identity = np.ones(size)
+        self.__A_stiffness = np.tile([1., -1., 1., -1.], len(s))
+
+    def __evaluate(self, points):
         """
-        Build the jacobian matrix of the model.
+        Evaluate the movement, stiffness and curvature constraints on the given points.
         """
-        # Build an identity matrix for the movement constraint
-        identity = np.identity(2 * len(points))
+        movement = points[self.__indexes['movement']].ravel()
 
-        # Calulcate the stiffness matrix and stacking it on A
-        stiffness = self.__build_stiffness(points)
-        A = np.vstack((identity, stiffness))
+        s = self.__indexes['stiffness']
+        # Difference between the current and the following point along the x and y axis
+        stiffness = (points[s[:, 0]] - points[s[:, 1]]).ravel()
 
-        # Calulcate the stiffness matrix and stacking it on A
-        curvature = self.__build_curvature(points)
-        A = np.vstack((A, curvature))
+        alpha, normp, normn = self.__calculate_curvature(points)
+        # The angle formed by the previous, the current and the next point,
+        # the norm of the vector formed by the previous and the current point
+        # and the norm of the vector formed by the current and the next point
+        curvature = np.column_stack((alpha, normp, normn)).ravel()
 
-        # Calulcate the spatial conflicts matrix and stacking it on A
-        spatial = self.__build_spatial(points)
-        A = np.vstack((A, spatial))
+        return np.concatenate((movement, stiffness, curvature))
 
-        return A
-
-    def __build_stiffness(self, points):
+    def __build_Y(self, points):
         """
-        Create a matrix for the stiffness constraint.
+        Build the observation vector.
         """
-        stiffness = self.__constraints['stiffness']
+        # The observations of the spatial conflicts (nodes and links) are 0,
+        # they are not stored as their number can change between iterations
+        self.__Y = self.__evaluate(points)
 
-        # Create the matrix
-        m = np.zeros((2 * len(stiffness), 2 * len(points)))
+    def __build_B(self, points, distances=None):
+        """
+        Build the matrix B -> Y - S(X).
+        """
+        if distances is None:
+            distances = self.__distances
 
-        for i, s in enumerate(stiffness):
-            # x for the current point
-            m[2 * i][2 * s[0]] = 1
-            # x for the next point
-            m[2 * i][2 * s[1]] = -1
-            # y for the current point
-            m[2 * i + 1][2 * s[0] + 1] = 1
-            # y for the next point
-            m[2 * i + 1][2 * s[1] + 1] = -1
+        spatial = []
+        for name in ('nodes', 'links'):
+            min_dist, dist = self.__min_distances[name], distances[name]
+            # Add 0 if the actual distance is higher than the minimum distance,
+            # dist_min - dist if the actual distance is below the minimum distance
+            spatial.append(0 - np.where(dist > min_dist, 0, min_dist - dist))
 
-        return m
+        return np.concatenate((self.__Y - self.__evaluate(points), *spatial))
 
-    def __build_curvature(self, points):
+    def __build_W(self, points):
         """
-        Create a matrix for the curvature constraint.
+        Build the weighting matrix.
         """
-        curvature = self.__constraints['curvature']
+        w = self.__weights
+        # Stores the diagonal of the weighting matrix, with the weight repeated for each equation of the constraint
+        self.__W = np.concatenate((
+            np.repeat(w['movement'], 2),
+            np.repeat(w['stiffness'], 2),
+            np.repeat(w['curvature'], 3),
+            w['nodes'],
+            w['links']
+        ))
 
-        # Create the matrix
-        m = np.zeros((3 * len(curvature), 2 * len(points)))
-
-        for i, c in enumerate(curvature):
-            pp, p, pn = c[0], c[1], c[2]
+    def __build_A(self, points):
+        """
+        Build the jacobian matrix of the model.
+        """
+        # Only the values change between iterations, their positions have been calculated once
+        values = np.concatenate((
+            self.__A_identity,
+            self.__A_stiffness,
+            self.__build_curvature(points),
+            self.__build_spatial(points),
+        ))
+
+        if self.SOLVER == 'dense':
+            A = np.zeros(self.__A_shape)
+            A[self.__A_rows, self.__A_columns] = values
+        else:
+            from scipy import sparse
+            A = sparse.coo_matrix((values, (self.__A_rows, self.__A_columns)), shape=self.__A_shape).tocsr()
 
-            # Coordinates of the previous point
-            xp, yp = points[pp][0], points[pp][1]
-            # Coordinates of the current point
-            x, y = points[p][0], points[p][1]
-            # Coordinates of the next point
-            xn, yn = points[pn][0], points[pn][1]
+        return A
 
-            x_xp = x - xp
-            y_yp = y - yp
-            x_xn = x - xn
-            y_yn = y - yn
-            b = ((x_xp) * (x_xp) + (y_yp) * (y_yp))
-            d = ((x_xn) * (x_xn) + (y_yn) * (y_yn))
-            c = ((x_xp) * (y_yn) - (x_xn) * (y_yp))
-            bd = b * d
-            a = (bd) ** (-0.5)
-            
-            # df/dxi-1
-            m[3 * i][2 * pp] = a * (-x_xp * c + y_yn * b) / b
-            # df/dyi-1
-            m[3 * i][2 * pp + 1] = a * (-x_xn * b - y_yp * c) / b
-            # df/dxi
-            m[3 * i][2 * p] = a * ((-yp + yn) * bd + c * ((x_xp) * d + (x_xn) * b)) / bd
-            # df/dyi
-            m[3 * i][2 * p + 1] = a * ((xp - xn) * bd + c * ((y_yp) * d + (y_yn) * b)) / bd
-            # df/dxi+1
-            m[3 * i][2 * pn] = a * (-x_xn * c - y_yp * d) / d
-            # df/dyi+1
-            m[3 * i][2 * pn + 1] = a * (x_xp * d - y_yn * c) / d
-
-            # Calculate length of the previous and next segment
-            lp = np.sqrt((x - xp) * (x - xp) + (y - yp) * (y - yp))
-            ln = np.sqrt((xn - x) * (xn - x) + (yn - y) * (yn - y))
-
-            # Influence of the length of previous segment on the current point
-            # x
-            m[3 * i + 1][2 * p] = (x - xp) / lp
-            # y
-            m[3 * i + 1][2 * p + 1] = (y - yp) / lp
-            # Influence of the length of previous segment on the previous point (p)
-            # xp
-            m[3 * i + 1][2 * pp] = -((x - xp) / lp)
-            # yp
-            m[3 * i + 1][2 * pp + 1] = -((y - yp) / lp)
-
-            # Influence of the length of following segment on the next point (n)
-            # xn
-            m[3 * i + 2][2 * pn] = (xn - x) / ln
-            # yn
-            m[3 * i + 2][2 * pn + 1] = (yn - y) / ln
-            # Influence of the length of following segment on the current point
-            # x
-            m[3 * i + 2][2 * p] = -((xn - x) / ln)
-            # y
-            m[3 * i + 2][2 * p + 1] = -((yn - y) / ln)
-
-        return m
+    def __build_curvature(self, points):
+        """
+        Calculate the partial derivatives of the curvature constraint.
+        """
+        c = self.__indexes['curvature']
+
+        # Coordinates of the previous point
+        xp, yp = points[c[:, 0], 0], points[c[:, 0], 1]
+        # Coordinates of the current point
+        x, y = points[c[:, 1], 0], points[c[:, 1], 1]
+        # Coordinates of the next point
+        xn, yn = points[c[:, 2], 0], points[c[:, 2], 1]
+
+        x_xp = x - xp
+        y_yp = y - yp
+        x_xn = x - xn
+        y_yn = y - yn
+        b = ((x_xp) * (x_xp) + (y_yp) * (y_yp))
+        d = ((x_xn) * (x_xn) + (y_yn) * (y_yn))
+        c = ((x_xp) * (y_yn) - (x_xn) * (y_yp))
+        bd = b * d
+        a = (bd) ** (-0.5)
+
+        # Calculate length of the previous and next segment
+        lp = np.sqrt(b)
+        ln = np.sqrt(d)
+
+        return np.column_stack((
+            # df/dxi-1, df/dyi-1
+            a * (-x_xp * c + y_yn * b) / b,
+            a * (-x_xn * b - y_yp * c) / b,
+            # df/dxi, df/dyi
+            a * ((-yp + yn) * bd + c * ((x_xp) * d + (x_xn) * b)) / bd,
+            a * ((xp - xn) * bd + c * ((y_yp) * d + (y_yn) * b)) / bd,
+            # df/dxi+1, df/dyi+1
+            a * (-x_xn * c - y_yp * d) / d,
+            a * (x_xp * d - y_yn * c) / d,
+            # Influence of the length of previous segment on the current and the previous point
+            x_xp / lp, y_yp / lp, -(x_xp / lp), -(y_yp / lp),
+            # Influence of the length of following segment on the next and the current point
+            -x_xn / ln, -y_yn / ln, x_xn / ln, y_yn / ln
+        )).ravel()
 
     def __build_spatial(self, points):
         """
-        Create a matrix for the spatial conflicts constraint.
-        """
-        nodes = self.__constraints['nodes']
-        links = self.__constraints['links']
-
-        # Create the matrix
-        m = np.zeros((len(nodes) + len(links), 2 * len(points)))
-
-        # Loop through all node to node conflicts
-        for i, n in enumerate(nodes):
-            # Retrieve both points coordinates
-            n1, n2 = points[n[0]], points[n[1]]
-            x1, x2, y1, y2 = n1[0], n2[0], n1[1], n2[1]
-            # Calculate the vector formed by those two points
-            v = np.array([x2 - x1, y2 - y1])
-            # Calculate the vector norm
-            norm = np.linalg.norm(v)
-
-            # Calculate equations factors
-            a = - ((x1 - x2) / norm)
-            b = - ((y1 - y2) / norm)
-            c = - ((x2 - x1) / norm)
-            d = - ((y2 - y1) / norm)
-
-            # Filling the matrix
-            m[i][2 * n[0]] = a
-            m[i][2 * n[0] + 1] = b
-            m[i][2 * n[1]] = c
-            m[i][2 * n[1] + 1] = d
-
-        offset = len(nodes)
-        # Loop through all node to link conflicts
-        for i, n in enumerate(links):
-            # Retrieve the three points coordinates
-            n0, n1, n2 = points[n[0]], points[n[1]], points[n[2]]
-            x0, y0 = n0[0], n0[1]
-            x1, y1 = n1[0], n1[1]
-            x2, y2 = n2[0], n2[1]
-
-            # Calculate the line formed by n1 and n2
-            a = (y2 - y1) / (x1 - x2)
-            b = 1.0
-            c = x1 * (y1 - y2) / (x1 - x2) - y1
-
-            # Calculate the equation factors
-            h = 0.001
-            u = - ((np.abs(a * (x0 + h) + b * y0 + c) - np.abs(a * (x0 - h) + b * y0 + c)) \
-                / np.sqrt(a * a + b * b) * 2 * h)
-            v = - ((np.abs(a * x0 + b * (y0 + h) + c) - np.abs(a * x0 + b * (y0 - h) + c)) \
-                / np.sqrt(a * a + b * b) * 2 * h)
-
-            w = - (1 / (2 * h) * (
-                np.abs(y0 + x0 * (y2 - y1) / (x1 + h - x2) - y1 + (x1 + h) * (y1 - y2) / (x1 + h - x2)) \
-                / np.sqrt((y2 - y1) * (y2 - y1) / ((x1 + h - x2) * (x1 + h - x2)) + 1) \
-                - np.abs(y0 + x0 * (y2 - y1) / (x1 - h - x2) - y1 + (x1 - h) * (y1 - y2) / (x1 - h - x2)) \
-                / np.sqrt((y2 - y1) * (y2 - y1) / ((x1 - h - x2) * (x1 - h - x2)) + 1)
-            ))
-
-            d = - (1 / (2 * h) * (
-                np.abs(y0 + x0 * (y2 - (y1 + h)) / (x1 - x2) - y1 - h + x1 * (y1 + h - y2) / (x1 - x2)) \
-                / np.sqrt((y2 - (y1 + h)) * (y2 - (y1 + h)) / ((x1 - x2) * (x1 - x2)) + 1) \
-                - np.abs(y0 + x0 * (y2 - (y1 - h)) / (x1 - x2) - y1 + h + x1 * (y1 - h - y2) / (x1 - x2)) \
-                / np.sqrt((y2 - (y1 - h)) * (y2  - (y1 - h)) / ((x1 - x2) * (x1 - x2)) + 1)
-            ))
-
-            e = - (1 / (2 * h) * (
-                np.abs(y0 + x0 * (y2 - y1) / (x1 - (x2 + h))- y1 + x1 * (y1 - y2) / (x1 - (x2 + h))) \
-                / np.sqrt((y2 - y1)* (y2 - y1) / ((x1 - (x2 + h)) * (x1 - (x2 + h))) + 1) \
-                - np.abs(y0 + x0 * (y2 - y1) / (x1 - (x2 - h)) - y1 + x1 * (y1 - y2) / (x1 - (x2 - h))) \
-                / np.sqrt((y2 - y1) * (y2 - y1) / ((x1 - (x2 - h)) * (x1 - (x2 - h))) + 1)))
-
-            f = - (1 / (2 * h) * (
-                np.abs(y0 + x0 * (y2 + h - y1) / (x1 - x2) - y1 + x1 * (y1 - (y2 + h)) / (x1 - x2)) \
-                / np.sqrt((y2 + h - y1) * (y2 + h - y1) / ((x1 - x2) * (x1 - x2)) + 1) \
-                - np.abs(y0 + x0 * (y2 - h - y1) / (x1 - x2) - y1 + x1 * (y1 - (y2 - h)) / (x1 - x2)) \
-                / np.sqrt((y2 - h - y1) * (y2 - y1 - h) / ((x1 - x2) * (x1 - x2)) + 1)))
-
-            # Filling the matrix with the partial derivatives
+        Calculate the partial derivatives of the spatial conflicts constraint.
+        """
+        n = self.__indexes['nodes']
+
+        # Retrieve both points coordinates
+        n1, n2 = points[n[:, 0]], points[n[:, 1]]
+        # Calculate the norm of the vector formed by those two points
+        norm = np.linalg.norm(n2 - n1, axis=1)
+        # The derivatives of minus the distance between both nodes
+        u = (n2 - n1) / norm[:, np.newaxis]
+        nodes = np.column_stack((u, -u))
+
+        l = self.__indexes['links']
+
+        # Retrieve the node and the two points of the link
+        n0, n1, n2 = points[l[:, 0]], points[l[:, 1]], points[l[:, 2]]
+        x0, y0 = n0[:, 0], n0[:, 1]
+        x1, y1 = n1[:, 0], n1[:, 1]
+        x2, y2 = n2[:, 0], n2[:, 1]
+
+        # The distance between the node and the line is |cross| / length
+        ex, ey = x2 - x1, y2 - y1
+        length = np.sqrt(ex * ex + ey * ey)
+        cross = ex * (y0 - y1) - ey * (x0 - x1)
+        sign = np.sign(cross)
+        distance = np.abs(cross) / length
+
+        # Partial derivatives of the distance, divided by the length of the link
+        k = sign / length
+        m = distance / (length * length)
+        links = - np.column_stack((
             # For point 0, the node in the node-to-link conflict
-            # x0
-            m[offset + i][2 * n[0]] = u
-            # y0
-            m[offset + i][2 * n[0] + 1] = v
+            -k * ey, k * ex,
             # For point 1 of the line (1, 2)
-            # x1
-            m[offset + i][2 * n[1]] = w
-            # y1
-            m[offset + i][2 * n[1] + 1] = d
+            k * (y2 - y0) + m * ex, k * (x0 - x2) + m * ey,
             # For point 2 of the line (1, 2)
-            # x2
-            m[offset + i][2 * n[2]] = e
-            # y2
-            m[offset + i][2 * n[2] + 1] = f
-
-        return m
-
-    def __calculate_stiffness(self, stiffness, points):
-        """
-        Estimate the stiffness by calculating the amount of movement between following point on a shape.
-        """
-        current_id, next_id = stiffness[0], stiffness[1]
-
-        x0, y0 = points[current_id][0], points[current_id][1]
-        x1, y1 = points[next_id][0], points[next_id][1]
+            k * (y0 - y1) - m * ex, k * (x1 - x0) - m * ey
+        ))
 
-        return x0 - x1, y0 - y1
+        return np.concatenate((nodes.ravel(), links.ravel()))
 
-    def __calculate_curvature(self, curvature, points):
+    def __calculate_curvature(self, points):
         """
         Estimate the curvature by calculating the angle formed by the point, its previous and its following point.
         """
-        previous_id, current_id, next_id = curvature[0], curvature[1], curvature[2]
-
-        pp = np.array((points[previous_id][0], points[previous_id][1]))
-        pc = np.array((points[current_id][0], points[current_id][1]))
-        pn = np.array((points[next_id][0], points[next_id][1]))
+        c = self.__indexes['curvature']
+        pp, pc, pn = points[c[:, 0]], points[c[:, 1]], points[c[:, 2]]
 
         u = (pc - pp)
-        normu = np.linalg.norm(u)
+        normu = np.linalg.norm(u, axis=1)
         v = (pn - pc)
-        normv = np.linalg.norm(v)
+        normv = np.linalg.norm(v, axis=1)
 
-        return np.cross(u / normu, v / normv), normu, normv
+        return (u[:, 0] * v[:, 1] - u[:, 1] * v[:, 0]) / (normu * normv), normu, normv
 
     def __prepare_geometries(self):
         """
@@ -646,6 +794,13 @@ class ConstraintMethod:
         # Flag spatially conflicting points
         self.__calculate_spatial_conflicts(points)
 
+        # Conflicts are searched again around points that moved by more than an eighth of the smallest minimum distance,
+        # as conflicts are retrieved up to 1.5 times the minimum distance
+        distances = np.asarray(self.__DISTANCES, dtype=float)
+        distances = distances[distances > 0]
+        self.__refresh_margin = distances.min() / 8 if len(distances) > 0 else None
+        self.__reference = np.array(points, dtype=float)
+
         return np.array(points)
 
     def __generate_point_list(self):
@@ -655,6 +810,8 @@ class ConstraintMethod:
         Generate lists of points that will accept constraints
         """
         unique_points = []
+        # Index of each unique point, keyed by its coordinates
+        unique_indexes = {}
 
         def get_coordinates(self, shape):
             """
@@ -672,9 +829,9 @@ class ConstraintMethod:
             Return True or False if those coordinates already exists.
             If they exist, return the index of the already existing point.
             """
-            for pid, c in enumerate(unique_points):
-                if c == coordinates:
-                    return True, pid
+            pid = unique_indexes.get(coordinates)
+            if pid is not None:
+                return True, pid
             return False, None
 
         point_id = 0
@@ -682,9 +839,7 @@ class ConstraintMethod:
         for oid, shapes in enumerate(self.__OBJECTS):
             o = []
             # Loop through each shape of the object
-            for sid, shape in shapes.iterrows():
-                geom = shape.geometry
-
+            for geom in shapes.geometry:
                 s = []
                 # Retrieve the geometry type
                 geomtype = geom.geom_type
@@ -721,6 +876,7 @@ class ConstraintMethod:
                         s.append(point_id)
                         # Append the coordinates to the full list of points
                         unique_points.append(p)
+                        unique_indexes[p] = point_id
                         # Increment the point index if it's a new point
                         point_id += 1
                     
@@ -739,6 +895,8 @@ class ConstraintMethod:
         """
         Create constraint and their related properties to easily create matrices afterwards.
         """
+        # Position of the movement constraint of each point inside the list of constraints
+        movements = {}
 
         def add_movement(obj, value):
             """
@@ -749,12 +907,12 @@ class ConstraintMethod:
             """
             for s in obj:
                 for pid in s:
-                    add = True
-                    for eid, existing in enumerate(self.__constraints['movement']):
-                        if existing[0] == pid:
-                            self.__constraints['movement'][eid][1] = max(value, existing[1])
-                            add = False
-                    if add:
+                    eid = movements.get(pid)
+                    if eid is not None:
+                        existing = self.__constraints['movement'][eid]
+                        existing[1] = max(value, existing[1])
+                    else:
+                        movements[pid] = len(self.__constraints['movement'])
                         self.__constraints['movement'].append([pid, value])
         
         def add_stiffness(obj, value, geomtype):
@@ -827,56 +985,207 @@ class ConstraintMethod:
                 elif name == 'curvature':
                     add_curvature(o, value, geomtype)
 
-    def __calculate_spatial_conflicts(self, points):
+    def __index_shapes(self):
         """
-        Retrieve conflicting pairs of nodes and nodes, or nodes and links.
+        Stores the points of each shape, and the segments formed by consecutive points or the point shapes
+        they can conflict with, as arrays in the order the shapes have been added.
+        """
+        occurrences = { 'pid': [], 'oid': [], 'shape': [] }
+        targets = { 'p1': [], 'p2': [], 'oid': [], 'shape': [], 'notlast': [], 'segment': [] }
+        shapes, types = [], []
+
+        for oid, o in enumerate(self.__shapes):
+            geometries = self.__OBJECTS[oid].geometry
+            for sid, s in enumerate(o):
+                shape = len(shapes)
+                geomtype = geometries[sid].geom_type
+                shapes.append(s)
+                types.append(geomtype)
+
+                for p in s:
+                    occurrences['pid'].append(p)
+                    occurrences['oid'].append(oid)
+                    occurrences['shape'].append(shape)
+
+                # Points are conflicting as a whole, lines and polygons through their segments
+                if geomtype == 'Point':
+                    ends = [(s[0], s[0], False)]
+                else:
+                    nb = len(s) if geomtype == 'Polygon' else len(s) - 1
+                    ends = [ (s[i], s[(i + 1) % len(s)], i < (len(s) - 1)) for i in range(nb) ]
+
+                for p1, p2, notlast in ends:
+                    targets['p1'].append(p1)
+                    targets['p2'].append(p2)
+                    targets['oid'].append(oid)
+                    targets['shape'].append(shape)
+                    targets['notlast'].append(notlast)
+                    targets['segment'].append(geomtype != 'Point')
+
+        self.__occurrences = { k: np.array(v, dtype=int) for k, v in occurrences.items() }
+        self.__targets = { k: np.array(v, dtype=(bool if k in ('notlast', 'segment') else int)) for k, v in targets.items() }
+
+        # Stores the shapes and their geometry types, indexed by the shape ids of the arrays
+        self.__flat_shapes = shapes
+        self.__flat_types = np.array(types)
+
+    def __find_candidates(self, points, moved=None):
+        """
+        Find the pairs of point occurrences and segments or point shapes that are within the conflict distance,
+        using spatial indexes. Return them in the order they would have been found by looping through the shapes.
+        If moved is provided, only the pairs involving at least one moved point are returned.
+        """
+        occurrences, targets = self.__occurrences, self.__targets
+        distances = np.asarray(self.__DISTANCES, dtype=float)
+
+        # The largest conflict distance of each object with the other objects, in both directions
+        reach = 1.5 * distances.max(axis=1)
+        reached = 1.5 * distances.max(axis=0)
+
+        occurrences_xy = points[occurrences['pid']]
+        p1, p2 = points[targets['p1']], points[targets['p2']]
+
+        # One spatial index for the segments, one for the point shapes
+        segment = targets['segment']
+        geoms = np.empty(len(segment), dtype=object)
+        geoms[segment] = shapely.linestrings(np.stack((p1[segment], p2[segment]), axis=1))
+        geoms[~segment] = shapely.points(p1[~segment])
+        trees = [ (np.flatnonzero(kind), shapely.STRtree(geoms[kind])) for kind in (segment, ~segment) ]
+
+        if moved is None:
+            sources = np.arange(len(occurrences_xy))
+        else:
+            sources = np.flatnonzero(moved[occurrences['pid']])
+        sources_geoms = shapely.points(occurrences_xy[sources])
+        sources_reach = reach[occurrences['oid'][sources]]
+
+        # Query the segments and the point shapes around the point occurrences
+        found = []
+        for ids, tree in trees:
+            q = tree.query(sources_geoms, predicate='dwithin', distance=sources_reach)
+            found.append((sources[q[0]], ids[q[1]]))
+
+        # Query the point occurrences around the moved segments and point shapes
+        if moved is not None:
+            tree = shapely.STRtree(shapely.points(occurrences_xy))
+            tmoved = np.flatnonzero(moved[targets['p1']] | moved[targets['p2']])
+            q = tree.query(geoms[tmoved], predicate='dwithin', distance=reached[targets['oid'][tmoved]])
+            found.append((q[1], tmoved[q[0]]))
+
+        # Remove duplicated pairs
+        nb_targets = len(segment)
+        key = np.unique(np.concatenate([ f[0] * nb_targets + f[1] for f in found ]))
+        occurrence, target = key // nb_targets, key % nb_targets
+
+        oid, oid1 = occurrences['oid'][occurrence], targets['oid'][target]
+        shape, shape1 = occurrences['shape'][occurrence], targets['shape'][target]
+        is_segment = segment[target]
+
+        # Checks if it's the same object
+        same = oid == oid1
+        skip = same & ((self.__flat_types[shape1] == 'LineString') | (shape == shape1) | (not self.SAME_OBJECT_CONFLICTS))
+
+        # Setting a distance equal to 1.5 times the min distance to retrieve conflicting objects
+        conflict_dist = 1.5 * distances[oid, oid1]
+
+        # Calculate the distance between the point and point 1 and 2, and with the segment
+        pdist1, pdist2, ldist = self.__point_segment_distances(occurrences_xy[occurrence], p1[target], p2[target])
+
+        # Segments must be strictly within the distance, point shapes can be at the distance
+        keep = ~skip & np.where(is_segment, ldist < conflict_dist, ldist <= conflict_dist)
+
+        # Targets are ordered as if all the shapes had been looped through for each point occurrence
+        occurrence, target = occurrence[keep], target[keep]
+        sort = np.lexsort((target, occurrence))
+
+        return occurrence[sort], target[sort], pdist1[keep][sort], pdist2[keep][sort], ldist[keep][sort]
+
+    @staticmethod
+    def __point_segment_distances(p, p1, p2):
+        """
+        Calculate the distances between points and both ends of segments, and between points and segments.
         """
+        def norm(a, b):
+            dx, dy = a[:, 0] - b[:, 0], a[:, 1] - b[:, 1]
+            return np.sqrt(dx * dx + dy * dy)
+
+        pdist1 = norm(p, p1)
+        pdist2 = norm(p, p2)
+
+        ex, ey = p2[:, 0] - p1[:, 0], p2[:, 1] - p1[:, 1]
+        length2 = ex * ex + ey * ey
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Position of the projection of the point along the segment
+            r = ((p[:, 0] - p1[:, 0]) * ex + (p[:, 1] - p1[:, 1]) * ey) / length2
+            s = ((p1[:, 1] - p[:, 1]) * ex - (p1[:, 0] - p[:, 0]) * ey) / length2
+            ldist = np.abs(s) * np.sqrt(length2)
+
+        # The closest point is one end of the segment if the projection falls outside
+        ldist = np.where((length2 == 0) | (r <= 0), pdist1, np.where(r >= 1, pdist2, ldist))
 
+        return pdist1, pdist2, ldist
+
+    def __calculate_spatial_conflicts(self, points, moved=None):
+        """
+        Retrieve conflicting pairs of nodes and nodes, or nodes and links.
+        If moved is provided, only look for new conflicts involving the moved points.
+        Return True if conflicts have been added or removed.
+        """
+        if moved is None:
+            self.__index_shapes()
+            self.__detection = {
+                # Sets of already flagged crossings, the nodes for node crossings and the sorted nodes for edge crossings
+                'node_crossing_keys': set(),
+                'edge_crossing_keys': set(),
+                # Sets of already existing node to node and node to link conflicts
+                'node_keys': set(),
+                'link_keys': set(),
+                # For each point, the crossings whose conflicts around the point must be removed
+                'removed': {},
+                # For each crossing, the points of both crossing lines
+                'crossing_lines': [],
+            }
+
+        # Without distances, there is no spatial conflicts
+        if np.size(self.__DISTANCES) == 0:
+            return False
+
+        detection = self.__detection
+        node_crossing_keys, edge_crossing_keys = detection['node_crossing_keys'], detection['edge_crossing_keys']
+        node_keys, link_keys = detection['node_keys'], detection['link_keys']
+        removed, crossing_lines = detection['removed'], detection['crossing_lines']
+
+        # Crossings found during this call
         node_crossing = []
         edge_crossing = []
 
-        def remove_conflicts(remove, line1, line2):
-            def remove_node_to_node(n1, n2):
-                indexes = []
-                for i, c in enumerate(self.__constraints['nodes']):
-                    c1, c2 = c[0], c[1]
-                    remove = False
-                    if c1 == n1 and c2 == n2:
-                        remove = True
-                    if c1 == n2 and c2 == n1:
-                        remove = True
-                    if remove:
-                        indexes.append(i)
-                for r in indexes:
-                    self.__constraints['nodes'].pop(r)
-            
-            def remove_node_to_link(n, n1, n2):
-                indexes = []
-                for i, c in enumerate(self.__constraints['links']):
-                    c, c1, c2 = c[0], c[1], c[2]
-                    remove = False
-                    if c == n and c1 == n1 and c2 == n2:
-                        remove = True
-                    if remove:
-                        indexes.append(i)
-                for r in indexes:
-                    self.__constraints['links'].pop(r)
-            
-            for n1 in remove:
-                for n2 in line1:
-                    remove_node_to_node(n1, n2)
-            for n1 in remove:
-                for n2 in line2:
-                    remove_node_to_node(n1, n2)
-            for n in line1:
-                for n1 in remove:
-                    for n2 in remove:
-                        remove_node_to_link(n, n1, n2)
-            for n in line2:
-                for n1 in remove:
-                    for n2 in remove:
-                        remove_node_to_link(n, n1, n2)
+        nb_conflicts = len(self.__constraints['nodes']) + len(self.__constraints['links'])
 
+        def remove_conflicts(remove, line1, line2):
+            """
+            Register the conflicts to remove around a crossing, i.e. node to node conflicts between a removed point
+            and a point of one of the lines, and node to link conflicts between a point of the lines and two removed points.
+            """
+            crossing = len(crossing_lines)
+            crossing_lines.append(set(line1) | set(line2))
+            for n in remove:
+                removed.setdefault(n, set()).add(crossing)
+
+        def is_removed_node_to_node(c):
+            for crossing in removed.get(c[0], ()):
+                if c[1] in crossing_lines[crossing]:
+                    return True
+            for crossing in removed.get(c[1], ()):
+                if c[0] in crossing_lines[crossing]:
+                    return True
+            return False
+
+        def is_removed_node_to_link(c):
+            crossings = removed.get(c[1], set()) & removed.get(c[2], set())
+            for crossing in crossings:
+                if c[0] in crossing_lines[crossing]:
+                    return True
+            return False
 
         # Get the surrounding points in a shape with a given threshold
         def get_surrounding_in_shape(shape, value, threshold, previous_only=False, next_only=False):
@@ -904,11 +1213,8 @@ class ConstraintMethod:
         def flag_crossing(n, n1, n2, shape, shape1):
             # If the lines cross at one node
             if n == n1:
-                add = True
-                for nc in node_crossing:
-                    if nc[0] == n:
-                        add = False
-                if add:
+                if n not in node_crossing_keys:
+                    node_crossing_keys.add(n)
                     node_crossing.append([n, shape, shape1])
             else:
                 # Create the line with the two nodes
@@ -936,127 +1242,70 @@ class ConstraintMethod:
 
                 # If a crossing has been found
                 if crossing is not None:
-                    add = True
                     # Check if it's not already present before adding to the list
-                    for ec in edge_crossing:
-                        if Counter(ec[0]) == Counter(crossing):
-                            add = False
-                    if add:
+                    key = tuple(sorted(crossing))
+                    if key not in edge_crossing_keys:
+                        edge_crossing_keys.add(key)
                         edge_crossing.append([crossing, shape, shape1])
 
-
         # Check if a node to link conflict already exists before adding one
         def add_node_to_link(c):
-            add = True
-            for n in self.__constraints['links']:
-                if (c[0] == n[0] and c[1] == n[1] and c[2] == n[2]):
-                    add = False
-                if (c[0] == n[0] and c[1] == n[2] and c[2] == n[1]):
-                    add = False
-            if add:
+            key = (c[0], min(c[1], c[2]), max(c[1], c[2]))
+            if key not in link_keys:
+                link_keys.add(key)
                 self.__constraints['links'].append(c)
 
         # Check if a node to node conflict already exists before adding one
         def add_node_to_node(c):
-            add = False
             if c[0] != c[1]:
-                add = True
-                for n in self.__constraints['nodes']:
-                    if (c[0] == n[0] and c[1] == n[1]):
-                        add = False
-                    if (c[0] == n[1] and c[1] == n[0]):
-                        add = False
-            if add:
-                self.__constraints['nodes'].append(c)
-
-        def retrieve_nodes_links(shape, shape1, geomtype, geomtype1, p, conflict_dist, min_dist, weight):
-            point = shapely.Point(points[p])
-            # Loop through all the points of the LineString or Polygon shape
-            for pid1, p1 in enumerate(shape1):
-                notlast = True
-                # Check if it's not the last point of the shape
-                if pid1 < (len(shape1) - 1):
-                    p2 = shape1[pid1 + 1]
+                key = (min(c[0], c[1]), max(c[0], c[1]))
+                if key not in node_keys:
+                    node_keys.add(key)
+                    self.__constraints['nodes'].append(c)
+
+        # Check if a conflict between the point and the segment, or one of its ends, already exists
+        def is_known(p, p1, p2):
+            if (p, min(p1, p2), max(p1, p2)) in link_keys:
+                return True
+            return (min(p, p1), max(p, p1)) in node_keys or (min(p, p2), max(p, p2)) in node_keys
+
+        occurrence, target, pdist1, pdist2, ldist = self.__find_candidates(points, moved)
+        occurrences, targets = self.__occurrences, self.__targets
+
+        # Loop through the pairs of point occurrences and segments or point shapes within the conflict distance
+        for i in range(len(occurrence)):
+            o, t = occurrence[i], target[i]
+            p, p1, p2 = int(occurrences['pid'][o]), int(targets['p1'][t]), int(targets['p2'][t])
+            oid, oid1 = occurrences['oid'][o], targets['oid'][t]
+            shape, shape1 = occurrences['shape'][o], targets['shape'][t]
+
+            if moved is not None and is_known(p, p1, p2):
+                continue
+
+            # Getting the weight of the spatial conflict constraint from the matrix
+            weight = self.__CONFLICTS[oid][oid1]
+            # Getting the distance value from the distances matrix
+            min_dist = self.__DISTANCES[oid][oid1]
+
+            # Checks if the shape is a point
+            if not targets['segment'][t]:
+                add_node_to_node([p, p1, min_dist, ldist[i], weight])
+                continue
+
+            # For LineString, check if the two lines intersects
+            if self.__flat_types[shape] == self.__flat_types[shape1] == 'LineString':
+                flag_crossing(p, p1, p2, self.__flat_shapes[shape], self.__flat_shapes[shape1])
+
+            # If the line distance is the smallest, insert a node to link spatial conflict
+            if ldist[i] < pdist1[i] and ldist[i] < pdist2[i]:
+                add_node_to_link([p, p1, p2, min_dist, ldist[i], weight])
+            else:
+                # Determine which node is the closest
+                if pdist1[i] < pdist2[i]:
+                    add_node_to_node([p, p1, min_dist, pdist1[i], weight])
                 else:
-                    notlast = False
-                    if geomtype1 == 'Polygon':
-                        p2 = shape1[0]
-                    else:
-                        continue
-                
-                # Retrieve the current and next point, calculate the line between them
-                point1 = shapely.Point(points[p1])
-                point2 = shapely.Point(points[p2])
-                line = shapely.LineString([point1, point2])
-                # Calculate the distance between the point and point 1 and 2, and with the line
-                pdist1 = shapely.distance(point, point1)
-                pdist2 = shapely.distance(point, point2)
-                ldist = shapely.distance(point, line)
-                # First, checks if one of the three distance is below the minimum distance threshold
-                if pdist1 < conflict_dist or pdist2 < conflict_dist or ldist < conflict_dist:
-                    # For LineString, check if the two lines intersects
-                    if geomtype == geomtype1 == 'LineString':
-                        flag_crossing(p, p1, p2, shape, shape1)
-
-                    # If the line distance is the smallest, insert a node to link spatial conflict
-                    if ldist < pdist1 and ldist < pdist2:
-                        # if line_crossing(p, point, line, points) == False:
-                        add_node_to_link([p, p1, p2, min_dist, ldist, weight])
-                    else:                      
-                        # Determine which node is the closest
-                        if pdist1 < pdist2:
-                            add_node_to_node([p, p1, min_dist, pdist1, weight])
-                        else:
-                            if notlast:
-                                add_node_to_node([p, p2, min_dist, pdist2, weight])
-
-        # Check if the considered point is spatially conflicting with other points
-        def check_conflicts(shape, p, oid, sid, pid):
-            geomtype = self.__OBJECTS[oid].geometry[sid].geom_type
-            point = shapely.Point(points[p])
-            # Loop through all objects
-            for oid1, o in enumerate(self.__shapes):
-                # Loop through all shapes
-                for sid1, s in enumerate(o):
-                    # Retrieve the geometry of the shape
-                    shape1 = self.__OBJECTS[oid1].geometry[sid1]
-                    # Stores the geometry type
-                    geomtype1 = shape1.geom_type
-
-                    # Checks if it's the same object
-                    if oid1 == oid:
-                        if geomtype1 == 'LineString':
-                            continue
-                        if sid1 == sid:
-                            continue
-                        if self.SAME_OBJECT_CONFLICTS == False:
-                            continue
-                    # Getting the weight of the spatial conflict constraint from the matrix
-                    weight = self.__CONFLICTS[oid][oid1]
-                    # Getting the distance value from the distances matrix
-                    min_dist = self.__DISTANCES[oid][oid1]
-                    # Setting a distance equal to 1.5 times the min distance to retrieve conflicting objects
-                    # Setting conflict_dist = min_dist doesn't take the 1.5 time conflicting entities
-                    conflict_dist = 1.5 * min_dist
-                    
-                    # Checks if that shape is within the minimum distance before retrieving pairs of nodes and links
-                    if shapely.dwithin(point, shape1, conflict_dist):
-                        # Checks if the shape is a point
-                        if geomtype1 == 'Point':
-                            distance = shapely.distance(point, shape1)
-                            add_node_to_node([p, s[0], min_dist, distance, weight])
-                        # If it's not, checking if it's closer to a node or a segment
-                        else:
-                            retrieve_nodes_links(shape, s, geomtype, geomtype1, p, conflict_dist, min_dist, weight)
-
-        # Loop through all objects
-        for oid, o in enumerate(self.__shapes):
-            # Loop through all shapes
-            for sid, s in enumerate(o):
-                # Loop through all points
-                for pid, p in enumerate(s):
-                    # Check conflicts with other points
-                    check_conflicts(s, p, oid, sid, pid)
+                    if targets['notlast'][t]:
+                        add_node_to_node([p, p2, min_dist, pdist2[i], weight])
 
         threshold = self.CROSSING_NODE_THRESHOLD
 
@@ -1080,31 +1329,52 @@ class ConstraintMethod:
                 remove.extend(get_surrounding_in_shape(line2, p4, threshold, next_only=True))
                 remove_conflicts(remove, line1, line2)
 
+        changed = len(self.__constraints['nodes']) + len(self.__constraints['links']) != nb_conflicts
+
+        # Remove all the conflicts around the new crossings at once
+        if len(node_crossing) > 0 or (threshold > 0 and len(edge_crossing) > 0):
+            self.__constraints['nodes'] = [ c for c in self.__constraints['nodes'] if not is_removed_node_to_node(c) ]
+            self.__constraints['links'] = [ c for c in self.__constraints['links'] if not is_removed_node_to_link(c) ]
+            changed = True
+
+        return changed
+
     def __update_distances(self, points):
         """
-        Update the distance between pairs of nodes and pairs of nodes and links
-        """
-        # Loop through node to node conflicts
-        for i, n in enumerate(self.__constraints['nodes']):
-            # Retrieve coordinates of the two nodes
-            n1, n2 = points[n[0]], points[n[1]]
-            x1, x2, y1, y2 = n1[0], n2[0], n1[1], n2[1]
-            # Calculate the vector formed by those two points
-            v = np.array([x2 - x1, y2 - y1])
-            # Calculate its norm, i.e. distance and updating it
-            nodedistance = np.linalg.norm(v)
-            self.__constraints['nodes'][i][3] = nodedistance
-
-        # Loop through node to link conflicts
-        for i, l in enumerate(self.__constraints['links']):
-            # Retrieve coordinates of the three nodes as array
-            n0 = np.array(points[l[0]])
-            n1 = np.array(points[l[1]])
-            n2 = np.array(points[l[2]])
-            # Calculate the distance between the first node and the line formed by the other two
-            linkdistance = np.linalg.norm(np.cross(n2 - n1, n1 - n0)) / np.linalg.norm(n2 - n1)
-            # Updating the distance
-            self.__constraints['links'][i][4] = linkdistance
+        Update the distance between pairs of nodes and pairs of nodes and links.
+        Look for new conflicts around the points that moved enough since the last time conflicts were searched.
+        """
+        if self.__refresh_margin is not None:
+            moved = np.linalg.norm(points - self.__reference, axis=1) > self.__refresh_margin
+            if moved.any():
+                if self.__calculate_spatial_conflicts(points, moved):
+                    self.__index_constraints()
+                    self.__build_W(points)
+                self.__reference[moved] = points[moved]
+
+        self.__distances = self.__calculate_distances(points)
+
+    def __calculate_distances(self, points):
+        """
+        Calculate the distance between pairs of nodes and pairs of nodes and links.
+        """
+        n = self.__indexes['nodes']
+        # Calculate the norm of the vector formed by the two nodes, i.e. their distance
+        nodes = np.linalg.norm(points[n[:, 1]] - points[n[:, 0]], axis=1)
+
+        l = self.__indexes['links']
+        n0, n1, n2 = points[l[:, 0]], points[l[:, 1]], points[l[:, 2]]
+        e, r = n2 - n1, n1 - n0
+        # Calculate the distance between the first node and the line formed by the other two
+        links = np.abs(e[:, 0] * r[:, 1] - e[:, 1] * r[:, 0]) / np.linalg.norm(e, axis=1)
+
+        return { 'nodes': nodes, 'links': links }
+
+    def __residual(self, points):
+        """
+        Calculate the matrix B -> Y - S(X) for any position of the points, used by the line search.
+        """
+        return self.__build_B(points, self.__calculate_distances(points))
 
     def __reconstruct_geometries(self, points):
         """
@@ -1196,8 +1466,74 @@ class ConstraintMethod:
         else:
             return None
         
+    def get_iterations(self):
+        """
+        Return the records of the iterations of the last generalisation as a list of dict with the iteration number,
+        the infinity norm of the displacement, the weighted residual, the applied fraction of the displacement,
+        and the time spent assembling and solving the model in seconds.
+        When the objects are partitioned, records also contain the index of the partition.
+        """
+        return self.__ITERATIONS
+
+    def get_preparation_time(self):
+        """
+        Return the time in seconds spent preparing the geometries and the constraints during the last generalisation.
+        """
+        return self.__PREPARATION_TIME
+
     def get_objects_number(self):
         """
         Return the number of objects added to the generalisation algorithm.
         """
-        return len(self.__OBJECTS)
\ No newline at end of file
+        return len(self.__OBJECTS)
+
+def _get_coordinates(geometry):
+    """
+    Return the coordinates of a point, a line or the exterior of a polygon as a list of tuples.
+    """
+    if geometry.geom_type == 'Polygon':
+        return list(geometry.exterior.coords)
+    return list(geometry.coords)
+
+def _move_vertices(geometry, moved):
+    """
+    Return the geometry with the vertices found in the dictionary replaced by their new position.
+    """
+    def move(coordinates):
+        return np.array([ moved.get(tuple(c), tuple(c)) for c in coordinates.tolist() ], dtype=float).reshape(-1, 2)
+    return shapely.transform(geometry, move)
+
+def _pin_vertices(before, after, anchors):
+    """
+    Return the generalized geometry with the vertices found in the anchors set back to their position before the generalisation.
+    """
+    if len(anchors) == 0:
+        return after
+    original = shapely.get_coordinates(before)
+    if len(original) != shapely.get_num_coordinates(after):
+        return after
+    pinned = np.array([ tuple(c) in anchors for c in original.tolist() ], dtype=bool)
+    if not pinned.any():
+        return after
+    def pin(coordinates):
+        coordinates = coordinates.copy()
+        coordinates[pinned] = original[pinned]
+        return coordinates
+    return shapely.transform(after, pin)
+
+def _generalize_partition(task):
+    """
+    Generalize the objects of one partition with a new constraint method.
+    Return the generalized geometries of each object and the records of the iterations.
+    """
+    parameters, layers, distances, conflicts, warm_start = task
+
+    method = ConstraintMethod(**parameters)
+    for layer, weights in layers:
+        method.add(layer, **weights)
+    if distances is not None:
+        method.add_spatial_conflicts(distances, conflicts)
+
+    result = method.generalize(warm_start=warm_start)
+
+    return [ list(o.geometry) for o in result ], method.get_iterations()
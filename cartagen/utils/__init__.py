@@ -1,3 +1,4 @@
 from cartagen.utils.geometry import *
 from cartagen.utils.math import *
+from cartagen.utils.network import *
 from cartagen.utils.partitioning import *
\ No newline at end of file
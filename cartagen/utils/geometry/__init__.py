@@ -1,7 +1,7 @@
 from cartagen.utils.geometry.dilation import dilate_line, offset_line, circle_interpolation
 from cartagen.utils.geometry.line import (
-    douglas_peucker, visvalingam_whyatt, raposo, li_openshaw, gaussian_smoothing,
-    get_bend_side, resample_line, inflexion_points
+    douglas_peucker, visvalingam_whyatt, effective_areas, raposo, li_openshaw, gaussian_smoothing,
+    simplify_lines, smooth_lines, get_bend_side, resample_line, resample_lines, inflexion_points
 )
 from cartagen.utils.geometry.polygon import (
     polygon_compactness, polygon_concavity, polygon_elongation,
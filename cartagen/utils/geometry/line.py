@@ -1,12 +1,14 @@
+import heapq
+import functools
 import numpy as np
 import shapely
 import geopandas as gpd
-from shapely.ops import split, nearest_points, snap, transform
-from shapely.geometry import LineString, Point, Polygon, MultiPoint
+from shapely.ops import split, nearest_points, snap
+from shapely.geometry import LineString, Point, Polygon
+from shapely.strtree import STRtree
 
 from cartagen.utils.geometry.angle import angle_3_pts
-from cartagen.utils.partitioning.tessellation import HexagonalTessellation
-from cartagen.utils.partitioning import partition_grid
+from cartagen.utils.partitioning.tessellation import HexagonalTessellation, get_square_cells
 
 def douglas_peucker(line, threshold, preserve_topology=True):
     """
@@ -93,6 +95,15 @@ def visvalingam_whyatt(line, area_tolerance):
         Hexagon-based line simplification.
     li_openshaw :
         Square grid-based line simplification.
+    effective_areas :
+        Compute the Visvalingam-Whyatt effective area of each vertex of a line.
+
+    Notes
+    -----
+    The vertices are ranked once using :func:`effective_areas`, the line is then
+    filtered by keeping the vertices with an effective area above the tolerance.
+    When simplifying the same line with multiple tolerances, compute the effective
+    areas once and filter the coordinates directly.
 
     References
     ----------
@@ -101,51 +112,128 @@ def visvalingam_whyatt(line, area_tolerance):
     Examples
     --------
     >>> line = LineString([(0, 0), (1, 1), (2, 0), (5, 3)])
-    >>> visvalingam_whyatt(line, 5.0)
+    >>> visvalingam_whyatt(line, 2.0)
     <LINESTRING (0 0, 2 0, 5 3)>
     """
-    def contains_another_point(line, pt, index):
-        first = line.coords[index-1]
-        last = line.coords[index+1]
-        triangle_coords = [first, pt, last, first]
-        triangle = Polygon(triangle_coords)
-        for vertex in line.coords:
-            if (vertex == first):
-                continue
-            if (vertex == pt):
-                continue
-            if (vertex == last):
-                continue
-            if (triangle.contains(Point(vertex))):
-                return True
-        return False
-    def compute_area_point(line, pt, index):
-        first = line.coords[index-1]
-        last = line.coords[index+1]
-        triangle = [first, pt, last, first]
-        polygon = Polygon(triangle)
-        return polygon.area
-
-    final_coords = list(line.coords)
-    while (True):
-        pt_area_min = None
-        area_min = line.envelope.area
-        current_line = LineString(tuple(final_coords))
-        for i in range(1,len(final_coords)-2):
-            pt = final_coords[i]
-            if(contains_another_point(current_line, pt, i)):
+    coords = np.asarray(line.coords)
+    areas = _effective_areas(coords)
+    return LineString(coords[areas >= area_tolerance])
+
+def effective_areas(line):
+    """
+    Compute the Visvalingam-Whyatt effective area of each vertex of a line.
+
+    The effective area of a vertex is the area of the triangle it forms with its
+    two neighbours at the time it is removed by the Visvalingam-Whyatt
+    algorithm :footcite:p:`visvalingam:1993`. Areas are forced to be
+    monotonic, so the vertices kept by :func:`visvalingam_whyatt` for a given
+    tolerance are the ones whose effective area is above this tolerance.
+
+    Vertices whose triangle contains another vertex of the line are not removed
+    until this vertex is removed itself, to prevent self-intersections.
+    The first and last vertex of the line, as well as vertices that can never be
+    removed, have an infinite effective area.
+
+    Parameters
+    ----------
+    line : LineString
+        The line to rank the vertices from.
+
+    Returns
+    -------
+    numpy.ndarray
+        The effective area of every vertex of the line.
+
+    See Also
+    --------
+    visvalingam_whyatt :
+        Area-based line simplification.
+
+    References
+    ----------
+    .. footbibliography::
+
+    Examples
+    --------
+    >>> line = LineString([(0, 0), (1, 1), (2, 0), (5, 3)])
+    >>> effective_areas(line)
+    array([inf,  1.,  3., inf])
+    """
+    return _effective_areas(np.asarray(line.coords))
+
+def _effective_areas(coords):
+    """
+    Compute the effective areas from an array of coordinates using a min-heap
+    with lazy invalidation. The topology check relies on a spatial index of the vertices.
+    """
+    def triangle_area(a, b, c):
+        return abs((xy[b, 0] - xy[a, 0]) * (xy[c, 1] - xy[a, 1]) - (xy[c, 0] - xy[a, 0]) * (xy[b, 1] - xy[a, 1])) / 2.0
+
+    def contained_vertices(a, b, c):
+        triangle = Polygon([ xy[a], xy[b], xy[c] ])
+        contained = tree.query(triangle, predicate='contains')
+        return contained[alive[contained]]
+
+    xy = coords[:, :2]
+    n = len(xy)
+
+    areas = np.full(n, np.inf)
+    if n < 3:
+        return areas
+
+    # Vectorized computation of the initial triangle areas
+    a, b, c = xy[:-2], xy[1:-1], xy[2:]
+    current = np.full(n, np.inf)
+    current[1:-1] = np.abs((b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (c[:, 0] - a[:, 0]) * (b[:, 1] - a[:, 1])) / 2.0
+
+    # Doubly linked list of the remaining vertices
+    previous = np.arange(-1, n - 1)
+    following = np.arange(1, n + 1)
+    alive = np.ones(n, dtype=bool)
+
+    # Version of each vertex, used to discard outdated heap entries
+    version = np.zeros(n, dtype=int)
+    heap = [ (current[i], i, 0) for i in range(1, n - 1) ]
+    heapq.heapify(heap)
+
+    # For each vertex, the vertices whose triangle contains it
+    blocking = {}
+    tree = STRtree(shapely.points(xy))
+
+    level = 0.0
+    while len(heap) > 0:
+        area, i, v = heapq.heappop(heap)
+        if not alive[i] or v != version[i]:
+            continue
+
+        p, f = previous[i], following[i]
+
+        # Check that removing the vertex won't create a self-intersection
+        contained = contained_vertices(p, i, f)
+        if len(contained) > 0:
+            for j in contained:
+                blocking.setdefault(j, []).append(i)
+            continue
+
+        level = max(level, area)
+        areas[i] = level
+        alive[i] = False
+        following[p], previous[f] = f, p
+
+        # Update the neighbours of the removed vertex
+        for j in (p, f):
+            if j == 0 or j == n - 1:
                 continue
-            area = compute_area_point(current_line, pt, i)
-            if (area < area_min):
-                area_min = area
-                if(area < area_tolerance):
-                    pt_area_min = pt
-        if(pt_area_min is None):
-            break
-        # remove pt from the line
-        final_coords.remove(pt_area_min)
+            current[j] = triangle_area(previous[j], j, following[j])
+            version[j] += 1
+            heapq.heappush(heap, (current[j], j, version[j]))
+
+        # Vertices that were blocked by the removed vertex can be tested again
+        for j in blocking.pop(i, []):
+            if alive[j]:
+                heapq.heappush(heap, (current[j], j, version[j]))
 
-    return LineString(tuple(final_coords))
+    return areas
 
 def raposo(line, initial_scale, final_scale, centroid=True, tobler=False):
     """
@@ -206,34 +294,42 @@ def raposo(line, initial_scale, final_scale, centroid=True, tobler=False):
     --------
     >>> line = LineString([(0, 0), (1, 1), (2, 0), (5, 3)])
     >>> c4.raposo(line, 5000, 10000)
-    <LINESTRING (0 0, 1 0.3333333333333333, 5 3)>
+    <LINESTRING (0 0, 0.5 0.5, 2 0, 5 3)>
+    """
+    return LineString(_raposo_coords(np.asarray(line.coords), initial_scale, final_scale, centroid, tobler))
+
+def _raposo_coords(coords, initial_scale, final_scale, centroid=True, tobler=False):
     """
+    Apply the Raposo simplification to an array of coordinates and return the 2D simplified coordinates.
+    """
+    xy = coords[:, :2]
+
     width = 0
     if tobler:
         width = final_scale * 5 / 4000 
     else:
-        firstFactor = line.length / (len(line.coords)-1)
+        length = np.sum(np.hypot(*np.diff(xy, axis=0).T))
+        firstFactor = length / (len(xy)-1)
         secondFactor = final_scale / initial_scale
         width = firstFactor * secondFactor
 
     # compute hexagon tessellation
-    tessellation = HexagonalTessellation(line.envelope, width)
+    tessellation = HexagonalTessellation(shapely.multipoints(xy).envelope, width)
 
     current_index = 0
     final_coords = []
     # append the first point of the line, but without the z coordinate
-    twod_point = transform(lambda *args: args[:2], Point(line.coords[0]))
-    final_coords.append(twod_point.coords[0])
+    final_coords.append(tuple(xy[0]))
     previous_cell = None
-    while (current_index < len(line.coords)-1):
+    while (current_index < len(xy)-1):
         current_cell = None
         # now loop on the vertices from current index
-        # builds a point cloud as a multi-point geometry with all line vertices
+        # builds a point cloud with all line vertices
         # contained in the current cell.
         point_cloud = []
-        for i in range(current_index,len(line.coords)):
+        for i in range(current_index,len(xy)):
             # get the cells containing the point
-            point = line.coords[i]
+            point = tuple(xy[i])
             containing_cells = tessellation.get_containing_cells(point)
             if(current_cell is None):
                 if(previous_cell in containing_cells):
@@ -249,24 +345,22 @@ def raposo(line, initial_scale, final_scale, centroid=True, tobler=False):
                 current_index = i
                 previous_cell = current_cell
                 break
-        multipoint = MultiPoint(point_cloud)
+        cloud = np.array(point_cloud)
+        center = cloud.mean(axis=0)
         if (centroid):
             # replace the points by the centroid of the vertices in the cell
-            final_coords.append(multipoint.centroid.coords[0])
+            final_coords.append(tuple(center))
         else:
             # find the nearest vertex to the centroid
-            nearest = nearest_points(multipoint,multipoint.centroid)
-            final_coords.append(nearest[0].coords[0])
-        if (current_index == len(line.coords) - 1):
-            twod_final_point = transform(lambda *args: args[:2], Point(line.coords[current_index]))
-            final_coords.append(twod_final_point.coords[0])
+            nearest = np.argmin(np.hypot(cloud[:, 0] - center[0], cloud[:, 1] - center[1]))
+            final_coords.append(tuple(cloud[nearest]))
+        if (current_index == len(xy) - 1):
+            final_coords.append(tuple(xy[current_index]))
     # add the final point if it is not in the line
-    twod_final_point = transform(lambda *args: args[:2], Point(line.coords[len(line.coords) - 1]))
-    if(twod_final_point.coords[0] not in final_coords):
-        final_coords.append(twod_final_point.coords[0])
-    
-    # print(final_coords)
-    return LineString(final_coords)
+    if(tuple(xy[-1]) not in final_coords):
+        final_coords.append(tuple(xy[-1]))
+
+    return np.array(final_coords)
 
 def li_openshaw(line, cell_size):
     """
@@ -306,32 +400,62 @@ def li_openshaw(line, cell_size):
     >>> c4.li_openshaw(line, 1)
     <LINESTRING (0 0, 0.5 0.5, 2 0, 5 3)>
     """
-    vertexes = [ Point(x) for x in list(line.coords) ]
-
-    gdf = gpd.GeoDataFrame(geometry=vertexes)
-    groups, squares = partition_grid(gdf, cell_size)
-
-    simplified = []
-    previous = None
-    for i in range(0, len(vertexes)):
-        index = None
-        for gi, j in enumerate(groups):
-            if i in j:
-                index = gi
-        
-        if index is not None and index != previous:
-            group = groups[index]
-            centroid = shapely.centroid(MultiPoint([ vertexes[v] for v in group ]))
-            simplified.append(centroid)
-            previous = index
-
-    if vertexes[0] != simplified[0]:
-        simplified.insert(0, vertexes[0])
-    if vertexes[-1] != simplified[-1]:
-        simplified.append(vertexes[-1])
-
+    coords = np.asarray(line.coords)
+    simplified, _ = _li_openshaw_arrays(coords, np.array([0, len(coords)]), cell_size)
     return LineString(simplified)
 
+def _li_openshaw_arrays(coords, offsets, cell_size):
+    """
+    Apply the Li-Openshaw simplification to multiple lines stored as a flat array of coordinates
+    and an array of offsets. Return the simplified 2D coordinates and the index of the line each one belongs to.
+    """
+    xy = coords[:, :2]
+    starts, ends = offsets[:-1], offsets[1:]
+    nlines = len(starts)
+    line = np.repeat(np.arange(nlines), ends - starts)
+
+    # Assign each vertex to the square grid cell containing it, the grid starting at the
+    # lower left corner of each line. Vertices on a cell border belong to the lowest cell.
+    xmin = np.minimum.reduceat(xy[:, 0], starts)[line]
+    ymin = np.minimum.reduceat(xy[:, 1], starts)[line]
+    column, row = get_square_cells(xy[:, 0], xy[:, 1], xmin, ymin, cell_size, cell_size)
+
+    # Group the vertices of a same line inside a same cell and compute their centroids
+    order = np.lexsort((row, column, line))
+    changes = np.ones(len(xy), dtype=bool)
+    changes[1:] = (np.diff(line[order]) != 0) | (np.diff(column[order]) != 0) | (np.diff(row[order]) != 0)
+    group = np.empty(len(xy), dtype=int)
+    group[order] = np.cumsum(changes) - 1
+    size = np.bincount(group)
+    centroids = np.column_stack((
+        np.bincount(group, weights=xy[:, 0]) / size,
+        np.bincount(group, weights=xy[:, 1]) / size
+    ))
+
+    # A centroid is added each time the line enters a new cell
+    entering = np.ones(len(xy), dtype=bool)
+    entering[1:] = group[1:] != group[:-1]
+    entering[starts] = True
+    simplified = centroids[group[entering]]
+    simplified_line = line[entering]
+
+    # Keep the first and last vertex of the line if they differ from the first and last centroid
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(simplified_line, minlength=nlines))))
+    first, last = xy[starts], xy[ends - 1]
+    add_first = np.any(first != simplified[bounds[:-1]], axis=1)
+    add_last = np.any(last != simplified[bounds[1:] - 1], axis=1)
+
+    result = np.concatenate((first[add_first], simplified, last[add_last]))
+    result_line = np.concatenate((np.flatnonzero(add_first), simplified_line, np.flatnonzero(add_last)))
+    position = np.concatenate((
+        np.zeros(add_first.sum(), dtype=int),
+        np.ones(len(simplified), dtype=int),
+        np.full(add_last.sum(), 2, dtype=int)
+    ))
+    order = np.argsort(result_line * 3 + position, kind='stable')
+
+    return result[order], result_line[order]
+
 def gaussian_smoothing(geometry, sigma=30, sample=None, densify=True):
     """
     Smooth a line or a polygon and attenuate its inflexion points.
@@ -373,139 +497,277 @@ def gaussian_smoothing(geometry, sigma=30, sample=None, densify=True):
     >>> c4.gaussian_smoothing(polygon, 1)
     <POLYGON ((0.1168459780814714 0.3005282653219513, ... 0.1168459780814714 0.3005282653219513))>
     """
-    # Extend the given set of points at its first and last points of k points using central inversion.
-    def extend(line, interval):
-        # Compute the central inversion of a position. origin is the center of symmetry and p is the point to inverse.
-        def central_inversion(origin, p):
-            x = 2 * origin[0] - p[0]
-            y = 2 * origin[1] - p[1]
-            return (x,y)
-        
-        # Get the coordinates of the vertices
-        coords = list(line.coords)
-        # Get the first and last vertex
-        first, last = coords[0], coords[-1]
-
-        # Get the index of the penultimate vertex
-        # -2 is to avoid taking the last vertex
-        pen = len(coords) - 2
-
-        # Set the start of the line as the central inversion of n first vertices (n = interval)
-        result = [central_inversion(first, coords[i]) for i in range(interval, 0, -1)]
-
-        # Add the full line as the middle part of the line
-        result.extend(coords)
-
-        # Add the end of the line as the central inversion of n last vertices (n = interval)
-        result.extend([central_inversion(last, coords[i]) for i in range(pen, pen - interval, -1)])
-
-        return LineString(result)
-
-    polygon = None
-    ring = None
     geomtype = geometry.geom_type
     if geomtype == 'LineString':
-        polygon = False
-        ring = geometry
+        coords = np.asarray(geometry.coords)
+        return LineString(_gaussian_smoothing_coords(coords, False, sigma, sample, densify))
     elif geomtype == 'Polygon':
-        polygon = True
-        ring = geometry.exterior
+        coords = np.asarray(geometry.exterior.coords)
+        return Polygon(_gaussian_smoothing_coords(coords, True, sigma, sample, densify))
     else:
         raise Exception("{0} geometry cannot be smoothed.".format(geomtype))
 
-    coords = list(ring.coords)
+def _gaussian_smoothing_coords(coords, polygon, sigma=30, sample=None, densify=True):
+    """
+    Apply the gaussian smoothing to an array of coordinates. If polygon is True,
+    the coordinates are considered as a closed ring and the returned ring is closed.
+    """
+    xy = coords[:, :2]
 
     if sample is None:
-        distances = []
-        for i in range(0, len(coords) - 1):
-            v1, v2 = coords[i], coords[i + 1]
-            distances.append(shapely.Point(v1).distance(shapely.Point(v2)))
-        avg = (sum(distances) / len(distances))
-        sample = avg
+        sample = np.mean(np.hypot(*np.diff(xy, axis=0).T))
 
     # First resample the line, making sure there is a maximum distance between two consecutive vertices
-    resampled = resample_line(ring, sample)
+    resampled, _ = _resample_arrays(xy, np.array([0, len(xy)]), sample)
+    length = len(resampled)
 
     # Calculate the interval (number of vertex to take into consideration when smoothing)
     interval = round(4 * sigma / sample)
     # If the interval is longer than the input line, we change the interval and recalculate the sigma
-    if interval >= len(resampled.coords):
-        interval = len(resampled.coords) - 1
+    if interval >= length:
+        interval = length - 1
         sigma = interval * sample / 4
-    
-    # Compute gaussian coefficients
-    c2 = -1.0 / (2.0 * sigma * sigma)
-    c1 = 1.0 / (sigma * np.sqrt(2.0 * np.pi))
 
-    # Compute the gaussian weights and their sum
-    weights = []
-    total = 0
-    for k in range (0, interval + 1):
-        weight = c1 * np.exp(c2 * k * k)
-        weights.append(weight)
-        total += weight
-        if k > 0:
-            total += weight
-    
-    rline = list(resampled.coords)
-    length = len(rline)
+    kernel = _gaussian_kernel(sigma, interval)
 
     if polygon:
-        extended = LineString(rline[-interval:] + rline + rline[:interval])
+        # Wrap the ring around its first and last points
+        extended = np.concatenate((resampled[length - interval:], resampled, resampled[:interval]))
     else:
         # Extend the line at its first and last points with central inversion
-        extended = extend(resampled, interval)
-   
-    smoothed_coords = []
-    for i in range(0, length):
-        x, y = 0, 0
-        for k in range(-interval , interval + 1):
-            p1 = extended.coords[i - k + interval]
-            x += weights[abs(k)] * p1[0] / total
-            y += weights[abs(k)] * p1[1] / total
-        smoothed_coords.append((x,y))
+        first, last = resampled[0], resampled[-1]
+        extended = np.concatenate((
+            2 * first - resampled[interval:0:-1],
+            resampled,
+            2 * last - resampled[-2:-interval - 2:-1]
+        ))
+
+    smoothed = np.column_stack((
+        np.convolve(extended[:, 0], kernel, mode='valid'),
+        np.convolve(extended[:, 1], kernel, mode='valid')
+    ))
 
     if densify:
-        final_coords = smoothed_coords
+        final_coords = smoothed
     else:
         # Only return the points matching the input points in the resulting filtered line
-        final_coords = []
-        # Stores for index of already treated vertices
-        done = []
-        # Loop through initial vertices
-        for point in coords:
-            # Set the distance to infinite
-            distance = float("inf")
-            nearest = None
-            # Loop through smoothed coordinates
-            for i in range(len(smoothed_coords)):
-                # Check that the index has not been already added
-                if i not in done:
-                    # Calculate distance from the point
-                    d = Point(smoothed_coords[i]).distance(Point(point))
-                    if d < distance:
-                        # Update distance and nearest index if below existing
-                        distance, nearest = d, i
-
-            # If a nearest point has been found, add it to the new line
-            if nearest is not None:
-                final_coords.append(smoothed_coords[nearest])
-                # Add the index as treated already
-                done.append(nearest)
-            else:
-                final_coords.append(point)
-    
-    result = None
+        final_coords = xy.copy()
+        matches = _match_vertices(xy, smoothed)
+        matched = matches >= 0
+        final_coords[matched] = smoothed[matches[matched]]
+
     if polygon:
-        final_coords.append(final_coords[0])
-        result = Polygon(final_coords)
+        final_coords = np.concatenate((final_coords, final_coords[:1]))
     else:
         # Replace first and last vertex by the line's original ones
-        final_coords[0] = Point(coords[0])
-        final_coords[-1] = Point(coords[-1])
-        result = LineString(final_coords)
-    
-    return result
+        final_coords[0] = xy[0]
+        final_coords[-1] = xy[-1]
+
+    return final_coords
+
+@functools.lru_cache(maxsize=128)
+def _gaussian_kernel(sigma, interval):
+    """
+    Return the normalized gaussian kernel of size 2 * interval + 1.
+    The kernel is cached as it is the same for every line smoothed with the same sigma and sample.
+    """
+    # Compute gaussian coefficients
+    c2 = -1.0 / (2.0 * sigma * sigma)
+    c1 = 1.0 / (sigma * np.sqrt(2.0 * np.pi))
+
+    k = np.arange(-interval, interval + 1)
+    weights = c1 * np.exp(c2 * k * k)
+    kernel = weights / weights.sum()
+    kernel.flags.writeable = False
+    return kernel
+
+def _match_vertices(vertices, candidates):
+    """
+    Match each vertex, in order, with its nearest candidate that has not been matched to a previous vertex.
+    Return the index of the matched candidate for each vertex, or -1 when every candidate has been matched.
+    """
+    tree = STRtree(shapely.points(candidates))
+    points = shapely.points(vertices)
+    # Among equally near candidates, keep the one with the smallest index, candidates whose distance
+    # only differs by rounding errors, e.g. the first and last vertices of a ring, are equally near
+    distance = tree.query_nearest(points, all_matches=False, return_distance=True)[1]
+    found = tree.query(points, predicate='dwithin', distance=_tie_distance(distance))
+    nearest = np.full(len(points), len(candidates))
+    np.minimum.at(nearest, found[0], found[1])
+
+    # Average spacing between candidates, used as the initial search radius
+    step = np.mean(np.hypot(*np.diff(candidates, axis=0).T)) if len(candidates) > 1 else 1.0
+
+    done = np.zeros(len(candidates), dtype=bool)
+    matches = np.full(len(vertices), -1)
+    for i, point in enumerate(points):
+        if done.all():
+            break
+
+        nearest_index = nearest[i]
+        if done[nearest_index]:
+            # The nearest candidate is already taken, search the nearest free one
+            # within a growing radius around the vertex
+            radius = max(shapely.distance(point, tree.geometries[nearest_index]), step)
+            while True:
+                found = tree.query(point, predicate='dwithin', distance=radius)
+                found = np.sort(found[~done[found]])
+                if len(found) > 0:
+                    distances = np.hypot(*(candidates[found] - vertices[i]).T)
+                    nearest_index = found[np.flatnonzero(distances <= _tie_distance(distances.min()))[0]]
+                    break
+                radius *= 2
+
+        matches[i] = nearest_index
+        done[nearest_index] = True
+
+    return matches
+
+def _tie_distance(distance):
+    """
+    Return the distance below which a candidate is as near as a candidate at the given distance.
+    """
+    return distance * (1 + 1e-9) + 1e-9
+
+def simplify_lines(lines, method='douglas_peucker', **parameters):
+    """
+    Simplify a whole set of lines at once.
+
+    This function applies one of the line simplification algorithms
+    to every line of a GeoSeries or a GeoDataFrame. The lines are handled
+    as a single flat array of coordinates and an array of offsets instead of
+    one shapely geometry per line, and the simplified lines are built in one go.
+
+    Parameters
+    ----------
+    lines : GeoSeries or GeoDataFrame of LineString
+        The lines to simplify.
+    method : str, optional
+        The simplification algorithm to use, can be:
+
+        - *'douglas_peucker'*: see :func:`douglas_peucker`, parameters are
+          ``threshold`` and ``preserve_topology``.
+        - *'visvalingam_whyatt'*: see :func:`visvalingam_whyatt`, parameter is ``area_tolerance``.
+        - *'raposo'*: see :func:`raposo`, parameters are ``initial_scale``,
+          ``final_scale``, ``centroid`` and ``tobler``.
+        - *'li_openshaw'*: see :func:`li_openshaw`, parameter is ``cell_size``.
+    parameters
+        The parameters of the chosen algorithm.
+
+    Returns
+    -------
+    GeoSeries of LineString
+        The simplified lines, with the index and the crs of the provided lines.
+
+    See Also
+    --------
+    smooth_lines :
+        Smooth a whole set of lines at once.
+
+    Examples
+    --------
+    >>> lines = gpd.GeoSeries([ LineString([(0, 0), (1, 1), (2, 0), (5, 3)]), LineString([(0, 0), (1, 0.1), (2, 0)]) ])
+    >>> simplify_lines(lines, 'visvalingam_whyatt', area_tolerance=2.0)
+    0    LINESTRING (0 0, 2 0, 5 3)
+    1         LINESTRING (0 0, 2 0)
+    dtype: geometry
+    """
+    if method == 'douglas_peucker':
+        geometries = np.asarray(lines.geometry.values)
+        threshold = parameters['threshold']
+        preserve_topology = parameters.get('preserve_topology', True)
+        simplified = shapely.simplify(geometries, threshold, preserve_topology=preserve_topology)
+        return gpd.GeoSeries(simplified, index=lines.index, crs=lines.crs)
+
+    coords, offsets = _lines_to_arrays(lines)
+    starts, ends = offsets[:-1], offsets[1:]
+
+    if method == 'visvalingam_whyatt':
+        area_tolerance = parameters['area_tolerance']
+        areas = np.concatenate([ _effective_areas(coords[s:e]) for s, e in zip(starts, ends) ])
+        keep = areas >= area_tolerance
+        line = np.repeat(np.arange(len(starts)), ends - starts)
+        return _arrays_to_lines(coords[keep], line[keep], lines)
+
+    elif method == 'raposo':
+        initial_scale, final_scale = parameters['initial_scale'], parameters['final_scale']
+        centroid, tobler = parameters.get('centroid', True), parameters.get('tobler', False)
+        simplified = [ _raposo_coords(coords[s:e], initial_scale, final_scale, centroid, tobler) for s, e in zip(starts, ends) ]
+        return _arrays_to_lines(*_concatenate_lines(simplified), lines)
+
+    elif method == 'li_openshaw':
+        simplified, line = _li_openshaw_arrays(coords, offsets, parameters['cell_size'])
+        return _arrays_to_lines(simplified, line, lines)
+
+    else:
+        raise Exception('{0} simplification method not recognized.'.format(method))
+
+def smooth_lines(lines, sigma=30, sample=None, densify=True):
+    """
+    Smooth a whole set of lines at once.
+
+    This function applies the gaussian smoothing to every line of a GeoSeries or
+    a GeoDataFrame. As with :func:`simplify_lines`, the lines are handled as
+    a flat array of coordinates and the smoothed lines are built in one go.
+
+    Parameters
+    ----------
+    lines : GeoSeries or GeoDataFrame of LineString
+        The lines to smooth.
+    sigma : float, optional
+        Gaussian filter strength. Default value to 30, which is a high value.
+    sample : float, optional
+        The length in meter between each nodes after resampling the lines.
+        If not provided, the sample is derived from each line and is the average distance between
+        each consecutive vertex.
+    densify : bool, optional
+        Whether the resulting lines should keep the new vertex density. Default to True.
+
+    Returns
+    -------
+    GeoSeries of LineString
+        The smoothed lines, with the index and the crs of the provided lines.
+
+    See Also
+    --------
+    gaussian_smoothing :
+        Smooth a line or a polygon and attenuate its inflexion points.
+    simplify_lines :
+        Simplify a whole set of lines at once.
+    """
+    coords, offsets = _lines_to_arrays(lines)
+    smoothed = [ _gaussian_smoothing_coords(coords[s:e], False, sigma, sample, densify) for s, e in zip(offsets[:-1], offsets[1:]) ]
+    return _arrays_to_lines(*_concatenate_lines(smoothed), lines)
+
+def _lines_to_arrays(lines):
+    """
+    Return the coordinates of the provided lines as a flat array and the offsets of each line in this array.
+    """
+    geometries = np.asarray(lines.geometry.values)
+    types = shapely.get_type_id(geometries)
+    if np.any(types != shapely.GeometryType.LINESTRING):
+        raise Exception('Only LineString geometries can be handled.')
+
+    include_z = bool(np.any(shapely.has_z(geometries)))
+    coords = shapely.get_coordinates(geometries, include_z=include_z)
+    offsets = np.concatenate(([0], np.cumsum(shapely.get_num_coordinates(geometries))))
+    return coords, offsets
+
+def _concatenate_lines(lines):
+    """
+    Concatenate a list of arrays of coordinates into a flat array of coordinates and the index of their line.
+    """
+    line = np.repeat(np.arange(len(lines)), [ len(l) for l in lines ])
+    return np.concatenate(lines), line
+
+def _arrays_to_lines(coords, line, lines):
+    """
+    Build a GeoSeries of LineString from a flat array of coordinates and the index of their line,
+    using the index and the crs of the original lines.
+    """
+    result = np.empty(len(lines), dtype=object)
+    shapely.linestrings(coords, indices=line, out=result)
+    return gpd.GeoSeries(result, index=lines.index, crs=lines.crs)
 
 def get_bend_side(line):
     """
@@ -636,42 +898,102 @@ def resample_line(line, step, keep_vertices=False):
     <LINESTRING (1 1, 2 1, 3 1, 4 1, 5 1)>
     """
 
-    coords = list(line.coords)
-    original = []
+    coords = np.asarray(line.coords)
+    resampled, _ = _resample_arrays(coords, np.array([0, len(coords)]), step, keep_vertices)
 
-    if keep_vertices:
-        for i in range(1, len(coords) - 1):
-            c = coords[i]
-            d = shapely.line_locate_point(line, shapely.Point(c))
-            original.append((c, d))
-    
-    # Get the length of the line
-    length = line.length 
-    
-    # Storage for final vertices, starting with the start of the line
-    xy = [(line.coords[0])]
-    
-    for distance in np.arange(step, int(length), step):
-        if keep_vertices:
-            remove = 0
-            for i, o in enumerate(original):
-                if o[1] < distance:
-                    xy.append(o[0])
-                    remove += 1
-            for r in range(0, remove):
-                original.pop(0)
-
-        # Interpolate a point every step along the old line
-        point = line.interpolate(distance)
-        # Add the tuple of coordinates
-        xy.append((point.x, point.y))
-    
-    # Add the last point of the line if it doesn't already exist
-    if xy[-1] != line.coords[-1]:
-        xy.append(line.coords[-1])
-        
     # Here, we return a new line with densified points.
-    return LineString(xy)
+    return LineString(resampled)
+
+def resample_lines(lines, step, keep_vertices=False):
+    """
+    Densify a whole set of lines at once by adding vertices.
+
+    This function applies :func:`resample_line` to every line of a GeoSeries or a GeoDataFrame.
+    Every line is resampled in a single vectorized pass over the flat array of coordinates.
+
+    Parameters
+    ----------
+    lines : GeoSeries or GeoDataFrame of LineString
+        The lines to densify.
+    step : float
+        The step (in meters) to resample the lines.
+    keep_vertices : bool, optional
+        If set to true, original vertices of the lines are kept.
+
+    Returns
+    -------
+    GeoSeries of LineString
+        The densified lines, with the index and the crs of the provided lines.
+
+    See Also
+    --------
+    resample_line :
+        Densify a line by adding vertices.
+    """
+    coords, offsets = _lines_to_arrays(lines)
+    resampled, line = _resample_arrays(coords, offsets, step, keep_vertices)
+    return _arrays_to_lines(resampled, line, lines)
+
+def _resample_arrays(coords, offsets, step, keep_vertices=False):
+    """
+    Resample multiple lines stored as a flat array of coordinates and an array of offsets.
+    Return the 2D resampled coordinates and the index of the line each one belongs to.
+    """
+    xy = coords[:, :2]
+    starts, ends = offsets[:-1], offsets[1:]
+    nlines = len(starts)
+    counts = ends - starts
+    line = np.repeat(np.arange(nlines), counts)
+
+    # Cumulative length along the lines, segments joining two lines have a null length
+    segments = np.hypot(*np.diff(xy, axis=0).T)
+    segments[ends[:-1] - 1] = 0
+    cumulative = np.concatenate(([0], np.cumsum(segments)))
+    distances = cumulative - cumulative[starts][line]
+    lengths = distances[ends - 1]
+
+    # Number of vertices added along each line, a vertex every step until the truncated length
+    nsamples = np.maximum(np.ceil((np.trunc(lengths) - step) / step), 0).astype(int)
+    sample_line = np.repeat(np.arange(nlines), nsamples)
+    rank = np.arange(len(sample_line)) - np.repeat(np.cumsum(nsamples) - nsamples, nsamples)
+    sample_distances = step * (rank + 1)
+
+    # Interpolate every vertex on the segment containing it
+    position = cumulative[starts][sample_line] + sample_distances
+    segment = np.searchsorted(cumulative, position, side='right') - 1
+    segment = np.clip(segment, starts[sample_line], ends[sample_line] - 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.nan_to_num((position - cumulative[segment]) / segments[segment])
+    samples = xy[segment] + ratio[:, None] * (xy[segment + 1] - xy[segment])
+
+    sampled = np.ones(len(samples), dtype=bool)
+    inner = np.zeros(len(xy), dtype=bool)
+
+    if keep_vertices:
+        # Merge the inner vertices of the lines, the ones falling on an added vertex replace it
+        inner[:] = True
+        inner[starts] = False
+        inner[ends - 1] = False
+        k = np.round(distances / step).astype(int) - 1
+        same = inner & (k >= 0) & (k < nsamples[line]) & (step * (k + 1) == distances)
+        sampled[(np.cumsum(nsamples) - nsamples)[line[same]] + k[same]] = False
+
+    points = [ xy[starts], samples[sampled], xy[ends - 1], xy[inner] ]
+    point_line = [ np.arange(nlines), sample_line[sampled], np.arange(nlines), line[inner] ]
+    point_distances = [ np.full(nlines, -np.inf), sample_distances[sampled], np.full(nlines, np.inf), distances[inner] ]
+
+    points, point_line, point_distances = np.concatenate(points), np.concatenate(point_line), np.concatenate(point_distances)
+    order = np.lexsort((point_distances, point_line))
+    points, point_line = points[order], point_line[order]
+
+    # Remove the last vertex of the line if it already exists, while keeping at least two vertices
+    size = np.bincount(point_line, minlength=nlines)
+    last = np.cumsum(size) - 1
+    duplicate = np.all(points[last] == points[last - 1], axis=1) & (size > 2)
+    keep = np.ones(len(points), dtype=bool)
+    keep[last[duplicate]] = False
+
+    return points[keep], point_line[keep]
 
 # returns the index of a vertex in a line. Returns -1 if the point given is not a vertex of the line
 def get_index_of_vertex(line, vertex, tolerance = 0.01):
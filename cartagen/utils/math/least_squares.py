@@ -0,0 +1,167 @@
+import time
+import numpy as np
+
+def solve_normal_equations(A, W, B, solver='dense'):
+    """
+    Solve the weighted normal equations of a least squares model.
+
+    Calculate the displacement dx minimizing the weighted sum of the
+    squared residuals, *i.e.* solves :math:`A^TWA dx = A^TWB`.
+
+    Parameters
+    ----------
+    A : ndarray or scipy sparse matrix
+        The jacobian matrix of the model.
+    W : ndarray
+        The diagonal of the weighting matrix.
+    B : ndarray
+        The residuals of the model, *i.e.* the observations minus
+        the model evaluated at the current points.
+    solver : str, optional
+        The solver to use:
+
+        - **'dense'** solves the equations with numpy. A must be a numpy array.
+        - **'sparse'** solves the equations with a sparse direct factorization.
+        - **'cg'** solves the equations with the conjugate gradient method.
+
+        Sparse solvers require scipy and a scipy sparse matrix A.
+
+    Returns
+    -------
+    ndarray
+    """
+    if solver == 'dense':
+        # Weighting the columns of A transposed is the same as multiplying by the diagonal weighting matrix
+        atp = A.T * W
+        return np.linalg.solve(atp @ A, atp @ B)
+
+    from scipy import sparse
+    from scipy.sparse import linalg
+
+    atp = A.T @ sparse.diags(W)
+    atpa = (atp @ A).tocsc()
+    atpb = atp @ B
+
+    if solver == 'sparse':
+        return linalg.spsolve(atpa, atpb)
+    elif solver == 'cg':
+        dx, info = linalg.cg(atpa, atpb, rtol=1e-10, M=sparse.diags(1 / atpa.diagonal()))
+        if info > 0:
+            raise Exception('The conjugate gradient did not converge.')
+        return dx
+    else:
+        raise Exception('{0} solver does not exist. Available solvers: dense, sparse, cg.'.format(solver))
+
+def iterate_least_squares(
+        points, assemble, max_iteration=1000, norm_tolerance=0.05, solver='dense',
+        damping=1.0, line_search=False, residual=None, stagnation=None, patience=5,
+        update=None, verbose=False
+    ):
+    """
+    Iteratively adjust points using the method of least squares.
+
+    At each iteration, the model is linearized around the current points
+    and the weighted normal equations are solved to get a displacement.
+    The loop stops when the displacement is below the norm tolerance,
+    when the residuals stagnate, or when the maximum number of iteration is reached.
+
+    Parameters
+    ----------
+    points : ndarray
+        The initial coordinates of the points, of shape (n, 2).
+        Providing the result of a previous adjustment warm starts the process.
+    assemble : callable
+        A function taking the points and returning the jacobian matrix A,
+        the diagonal of the weighting matrix W and the residuals B.
+    max_iteration : int, optional
+        The maximum number of iteration.
+    norm_tolerance : float, optional
+        The threshold below which the infinity norm of the displacement stops the loop.
+    solver : str, optional
+        The solver of the normal equations, see :func:`solve_normal_equations`.
+    damping : float, optional
+        The fraction of the displacement applied at each iteration, between 0 and 1.
+    line_search : bool, optional
+        If set to True, the applied fraction of the displacement is halved
+        until the weighted residuals decrease. Requires ``residual``.
+    residual : callable, optional
+        A function taking the points and returning the residuals B,
+        used by the line search.
+    stagnation : float, optional
+        If provided, the loop stops when the weighted residuals decreased by
+        less than this ratio over the last ``patience`` iterations.
+    patience : int, optional
+        The number of iterations used to detect stagnation.
+    update : callable, optional
+        A function taking the points, called after each iteration that did not stop the loop.
+    verbose : bool, optional
+        If set to True, print the norm of the displacement at each iteration.
+
+    Returns
+    -------
+    points : ndarray
+        The adjusted points.
+    records : list of dict
+        One record per iteration with the ``iteration`` number, the infinity ``norm``
+        of the displacement, the weighted ``residual`` before the displacement,
+        the applied fraction of the displacement (``step``),
+        and the ``assembly_time`` and ``solve_time`` in seconds.
+    """
+    if line_search and residual is None:
+        raise Exception('A residual function must be provided to use the line search.')
+
+    points = np.array(points, dtype=float)
+    shape = points.shape
+
+    records = []
+    for i in range(max_iteration):
+        start = time.time()
+        A, W, B = assemble(points)
+        assembly_time = time.time() - start
+
+        start = time.time()
+        dx = solve_normal_equations(A, W, B, solver)
+        solve_time = time.time() - start
+
+        cost = np.sum(W * B * B)
+        dx = dx.reshape(shape)
+
+        step = damping
+        if line_search:
+            # Halve the step until the weighted residuals decrease
+            for j in range(10):
+                trial = residual(points + step * dx)
+                if np.sum(W * trial * trial) < cost:
+                    break
+                step /= 2
+
+        points += step * dx
+
+        # Calculate the norm
+        norm = np.linalg.norm(dx.ravel(), ord=np.inf)
+        if verbose:
+            print(norm)
+
+        records.append({
+            'iteration': i,
+            'norm': norm,
+            'residual': np.sqrt(cost),
+            'step': step,
+            'assembly_time': assembly_time,
+            'solve_time': solve_time,
+        })
+
+        # Break the loop if the norm is below the tolerance threshold
+        if norm < norm_tolerance:
+            break
+
+        # Break the loop if the residuals no longer decrease
+        if stagnation is not None and len(records) > patience:
+            previous = records[-1 - patience]['residual']
+            if previous - records[-1]['residual'] <= stagnation * previous:
+                break
+
+        if update is not None:
+            update(points)
+
+    return points, records
@@ -0,0 +1 @@
+from cartagen.utils.network.roads import RoadNetwork
@@ -6,39 +6,110 @@ class NetworkFace:
     An object representing a network face along with specific geometric properties.
     """
     def __init__(self, polygon):
-        ring = polygon.exterior
+        faces = NetworkFaces([polygon])
+        faces.calculate_rectangles()
 
         # Area and perimeter
-        self.area = polygon.area
-        self.perimeter = ring.length
+        self.area = faces.area[0]
+        self.perimeter = faces.perimeter[0]
 
         # Compactness
-        self.compactness = 4 * np.pi * self.area / (self.perimeter * self.perimeter)
+        self.compactness = faces.compactness[0]
 
         # Concavity, which is the factor between polygon surface and its convex hull surface
-        hull = shapely.convex_hull(polygon)
-        self.concavity = self.area / hull.area
+        self.concavity = faces.concavity[0]
 
-        # Calculate length, width and elongation
-        points = ring.coords
-        ssr = shapely.MultiPoint(points).minimum_rotated_rectangle.exterior.coords
+        # Length, width and elongation
+        self.length = faces.length[0]
+        self.width = faces.width[0]
+        self.elongation = faces.elongation[0]
 
-        x0, x1, x2 = ssr[0][0], ssr[1][0], ssr[2][0]
-        y0, y1, y2 = ssr[0][1], ssr[1][1], ssr[2][1]
+        # Huber's width
+        self.huber = faces.huber[0]
 
-        length = np.sqrt((x1 - x0) * (x1 - x0) + (y1 - y0) * (y1 - y0))
-        width = np.sqrt((x2 - x1) * (x2 - x1) + (y2 - y1) * (y2 - y1))
+class NetworkFaces:
+    """
+    An object storing the geometric properties of multiple network faces.
 
-        if length < width:
-            length, width = width, length
+    Properties are calculated for every face at once when they are first needed.
+    The length, width and elongation, which rely on the minimum rotated rectangle,
+    are the most expensive and are only calculated for the requested faces.
+    They are NaN for the other faces.
+    """
+    def __init__(self, polygons):
+        self.polygons = np.empty(len(polygons), dtype=object)
+        self.polygons[:] = list(polygons)
 
-        self.length = length
-        self.width = width
-        self.elongation = length / width
+        # Area and perimeter
+        self.area = shapely.area(self.polygons)
+        self.perimeter = shapely.length(shapely.get_exterior_ring(self.polygons))
+
+        # Compactness
+        self.compactness = 4 * np.pi * self.area / (self.perimeter * self.perimeter)
 
         # Calculate huber's width
         insqrt = (self.perimeter * self.perimeter) - (16.0 * self.area)
-        if insqrt < 0:
-            self.huber = 100
-        else:
-            self.huber = (self.perimeter - np.sqrt(insqrt)) / 4
+        self.huber = np.full(len(self), 100.0)
+        valid = insqrt >= 0
+        self.huber[valid] = (self.perimeter[valid] - np.sqrt(insqrt[valid])) / 4
+
+        self.__hulls = None
+        self.__concavity = None
+
+        self.length = np.full(len(self), np.nan)
+        self.width = np.full(len(self), np.nan)
+        self.elongation = np.full(len(self), np.nan)
+        self.__rectangles = np.zeros(len(self), dtype=bool)
+
+    def __len__(self):
+        return len(self.polygons)
+
+    @property
+    def concavity(self):
+        """
+        The factor between the area of the faces and the area of their convex hull.
+        """
+        if self.__concavity is None:
+            self.__hulls = shapely.convex_hull(self.polygons)
+            self.__concavity = self.area / shapely.area(self.__hulls)
+        return self.__concavity
+
+    @property
+    def minimum_width(self):
+        """
+        A lower bound of the width of the faces calculated from their convex hull, without the minimum rotated rectangle.
+        """
+        self.concavity
+        # The convex hull lies between two parallel lines distant of its width and is not longer than half its perimeter
+        return 2 * shapely.area(self.__hulls) / shapely.length(self.__hulls)
+
+    def calculate_rectangles(self, indexes=None):
+        """
+        Calculate the length, width and elongation of the given faces using their minimum rotated rectangle.
+        Faces already calculated are skipped. If indexes is None, calculate them for every face.
+        """
+        if indexes is None:
+            indexes = np.arange(len(self))
+        indexes = np.asarray(indexes, dtype=int)
+        indexes = indexes[~self.__rectangles[indexes]]
+        self.__rectangles[indexes] = True
+
+        if len(indexes) == 0:
+            return
+
+        rectangles = shapely.oriented_envelope(self.polygons[indexes])
+
+        # Keep the three first vertices of each rectangle
+        polygons = shapely.get_type_id(rectangles) == 3
+        indexes, rectangles = indexes[polygons], rectangles[polygons]
+        coords = shapely.get_coordinates(shapely.get_exterior_ring(rectangles)).reshape(len(rectangles), -1, 2)
+        p0, p1, p2 = coords[:, 0], coords[:, 1], coords[:, 2]
+
+        d1, d2 = p1 - p0, p2 - p1
+        length = np.sqrt(d1[:, 0] * d1[:, 0] + d1[:, 1] * d1[:, 1])
+        width = np.sqrt(d2[:, 0] * d2[:, 0] + d2[:, 1] * d2[:, 1])
+
+        self.length[indexes] = np.maximum(length, width)
+        self.width[indexes] = np.minimum(length, width)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.elongation[indexes] = self.length[indexes] / self.width[indexes]
@@ -1,3 +1,5 @@
+import numpy as np
+import shapely
 import networkx as nx
 
 def make_planar():
@@ -9,13 +11,15 @@ def longest_path(graph):
     Get the longest path of the graph.
     """
 
-def create_graph(roads, cost=None):
+def create_graph(roads, cost=None, tolerance=None):
     """
     Create a graph object from a road network.
 
     Create a networkx graph object from the provided road network.
     The nodes of the returned graph has coordinates as attributes.
     The edges of the returned graph has cost and the index of the roads as attributes.
+    The nodes of each road, ordered by road index, are stored as an array of shape (n, 2)
+    in the ``'roads'`` attribute of the graph, *i.e.* ``graph.graph['roads']``.
     
     Parameters
     ----------
@@ -24,51 +28,123 @@ def create_graph(roads, cost=None):
     cost : str optional
         The name of the attribute giving the cost of the road section. Make sure the attribute is a number.
         Default to None, which means the length of the road is used as the cost.
+    tolerance : float optional
+        If provided, the extremities of the roads are snapped on a grid of this size,
+        and extremities falling inside the same cell of the grid are considered the same node.
+        Default to None, which means only extremities with the same coordinates are the same node.
+
+    See Also
+    --------
+    create_adjacency :
+        Create a compressed sparse row adjacency of a road network.
     """
-    roads = roads.to_dict('records')
-
-    # Create storages for nodes and links of the graph
-    nodes = []
-    edges = []
-
-    # Create the graph from the network
-    for rid, road in enumerate(roads):
-        # Retrieve geometry
-        geom = road['geometry']
-
-        # Retrieve start and end point of the road
-        startcoords, endcoords = geom.coords[0], geom.coords[-1]
-        start, end = None, None
-
-        # If start coordinates already in nodes
-        if startcoords in nodes:
-            # Set the start as the index of the node
-            start = nodes.index(startcoords)
-        # Else...
-        else:
-            # Set the start as the length of the node list and add the new node
-            start = len(nodes)
-            nodes.append(startcoords)
-
-        # Same as starting node for the end node
-        if endcoords in nodes:
-            end = nodes.index(endcoords)
-        else:
-            end = len(nodes)
-            nodes.append(endcoords)
-
-        # Set the weight value depending if cost is set or not
-        weight = road[cost] if cost is not None else geom.length
-
-        # Create the link with the start and end point along with attributes
-        edges.append((start, end, { 'weight': weight, 'rid': rid }))
+    nodes, edges, weights = _graph_arrays(roads, cost, tolerance)
 
     # Create the graph and add its edges
-    graph = nx.Graph()
-    graph.add_edges_from(edges)
+    graph = nx.Graph(roads=edges)
+    graph.add_edges_from(
+        (start, end, { 'weight': weight, 'rid': rid })
+        for rid, (start, end, weight) in enumerate(zip(edges[:, 0].tolist(), edges[:, 1].tolist(), weights.tolist()))
+    )
 
     # Add coordinates to the graph nodes
     for node in graph.nodes:
         graph.nodes[node]['coords'] = nodes[node]
 
-    return graph
\ No newline at end of file
+    return graph
+
+def create_adjacency(roads, cost=None, tolerance=None):
+    """
+    Create a compressed sparse row adjacency of a road network.
+
+    The nodes of the network are numbered in the same way as :func:`create_graph`.
+    The neighbours of the node i are ``indices[indptr[i]:indptr[i + 1]]``,
+    reached using the roads ``rids[indptr[i]:indptr[i + 1]]``
+    with a cost of ``weights[indptr[i]:indptr[i + 1]]``.
+    Each road is stored in both directions.
+
+    Parameters
+    ----------
+    roads : geopandas GeoDataFrame of LineStrings.
+        The road network to create the adjacency from.
+    cost : str optional
+        The name of the attribute giving the cost of the road section. Make sure the attribute is a number.
+        Default to None, which means the length of the road is used as the cost.
+    tolerance : float optional
+        If provided, the extremities of the roads are snapped on a grid of this size.
+
+    Returns
+    -------
+    nodes : list of tuple
+        The coordinates of the nodes.
+    indptr, indices, weights, rids : ndarray
+        The compressed sparse row adjacency.
+
+    See Also
+    --------
+    create_graph :
+        Create a graph object from a road network.
+    """
+    nodes, edges, weights = _graph_arrays(roads, cost, tolerance)
+    rids = np.arange(len(edges))
+
+    # Store each road in both directions
+    sources = np.concatenate((edges[:, 0], edges[:, 1]))
+    targets = np.concatenate((edges[:, 1], edges[:, 0]))
+    weights = np.concatenate((weights, weights))
+    rids = np.concatenate((rids, rids))
+
+    # Self loops are stored once
+    keep = np.ones(len(sources), dtype=bool)
+    keep[len(edges):] = edges[:, 0] != edges[:, 1]
+    sources, targets, weights, rids = sources[keep], targets[keep], weights[keep], rids[keep]
+
+    order = np.argsort(sources, kind='stable')
+    indptr = np.zeros(len(nodes) + 1, dtype=int)
+    np.cumsum(np.bincount(sources, minlength=len(nodes)), out=indptr[1:])
+
+    return nodes, indptr, targets[order], weights[order], rids[order]
+
+def _graph_arrays(roads, cost=None, tolerance=None):
+    """
+    Return the coordinates of the nodes of a road network, the start and end node
+    of each road and their cost. Nodes are numbered in order of appearance.
+    """
+    geometries = np.asarray(roads.geometry)
+
+    # Retrieve start and end point of each road, interleaved to keep the order of appearance
+    include_z = bool(np.all(shapely.has_z(geometries))) if len(geometries) > 0 else False
+    coordinates = shapely.get_coordinates(geometries, include_z=include_z)
+    last = np.cumsum(shapely.get_num_coordinates(geometries)) - 1
+    extremities = np.empty((2 * len(geometries), coordinates.shape[1]))
+    extremities[0::2] = coordinates[last - shapely.get_num_coordinates(geometries) + 1]
+    extremities[1::2] = coordinates[last]
+
+    # Hash the coordinates, snapped on a grid if a tolerance is provided
+    keys = extremities if tolerance is None else np.floor(extremities / tolerance)
+
+    # Sort the keys, the stable sort keeps the first appearance first among equal keys
+    order = np.lexsort(keys.T[::-1])
+    ordered = keys[order]
+    new = np.ones(len(keys), dtype=bool)
+    new[1:] = np.any(ordered[1:] != ordered[:-1], axis=1)
+    groups = np.cumsum(new) - 1
+    first = order[new]
+
+    # Number the nodes in order of appearance
+    rank = np.empty(len(first), dtype=int)
+    rank[np.argsort(first)] = np.arange(len(first))
+    ids = np.empty(len(keys), dtype=int)
+    ids[order] = rank[groups]
+
+    # The coordinates of a node are the ones of its first appearance
+    nodes = [ tuple(c) for c in extremities[np.sort(first)].tolist() ]
+    edges = ids.reshape(-1, 2)
+
+    # Set the weight value depending if cost is set or not
+    if cost is not None:
+        weights = np.asarray(roads[cost])
+    else:
+        weights = shapely.length(geometries)
+
+    return nodes, edges, weights
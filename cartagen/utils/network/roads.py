@@ -1,18 +1,178 @@
+import numpy as np
 import shapely
 from shapely.geometry.polygon import orient
 from shapely.ops import linemerge, unary_union
 
 from cartagen.utils.geometry.angle import angle_3_pts, angle_to_zero_pi
+from cartagen.utils.partitioning.network import network_faces
+
+class RoadNetwork:
+    """
+    Topology of a road network shared between the network algorithms.
+
+    This object calculates the faces of a road network, the roads
+    bordering each face and the spatial indexes of the roads
+    and the faces only once, when they are first needed.
+    It can be provided to the detection and collapsing algorithms
+    of the road network to avoid calculating them each time.
+
+    Parameters
+    ----------
+    roads : GeoDataFrame of LineString
+        The road network.
+
+    See Also
+    --------
+    network_faces :
+        Calculates the faces of one or multiple networks.
+    detect_roundabouts :
+        Detect roundabouts inside the road network.
+    detect_branching_crossroads :
+        Detect branching crossroads inside the road network.
+    detect_dual_carriageways :
+        Detect dual carriageways based on geometric properties.
+    detect_dead_ends :
+        Detect dead-ends groups.
+
+    Notes
+    -----
+    The topology is linked to the geometries of the provided roads.
+    If the roads are modified, for example after collapsing roundabouts,
+    the topology must be updated with :meth:`update` before being used again.
+    Algorithms raise an exception when provided with a topology that does
+    not match their roads.
+
+    Examples
+    --------
+    >>> network = RoadNetwork(roads)
+    >>> roundabouts = detect_roundabouts(roads, topology=network)
+    >>> crossroads = detect_branching_crossroads(roads, roundabouts, topology=network)
+    >>> roads = collapse_roundabouts(roads, roundabouts, crossroads, topology=network)
+    >>> network.update(roads)
+    """
+    def __init__(self, roads):
+        self.geometries = list(roads.geometry)
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Remove the calculated faces and spatial indexes.
+        They will be calculated again when needed.
+        """
+        self.__tree = None
+        # Faces, face spatial index and face incidence are stored by value of convex_hull
+        self.__faces = {}
+        self.__face_trees = {}
+        self.__face_roads = {}
+
+    def update(self, roads):
+        """
+        Replace the road network and invalidate the topology
+        if any geometry has changed.
+
+        Parameters
+        ----------
+        roads : GeoDataFrame of LineString
+            The new road network.
+
+        Returns
+        -------
+        bool
+            True if the topology has been invalidated.
+        """
+        geometries = list(roads.geometry)
+        if self.matches(geometries):
+            return False
+        self.geometries = geometries
+        self.invalidate()
+        return True
+
+    def matches(self, geometries):
+        """
+        Return True if the provided list of geometries is the one the topology is built on.
+        Geometries are compared by identity, which is cheap and detects any edit of the roads.
+        """
+        if len(geometries) != len(self.geometries):
+            return False
+        for g1, g2 in zip(geometries, self.geometries):
+            if g1 is not g2:
+                return False
+        return True
+
+    def check(self, geometries):
+        """
+        Raise an exception if the provided list of geometries is not the one the topology is built on.
+        """
+        if not self.matches(geometries):
+            raise Exception('The road network topology does not match the provided roads, it must be updated.')
+
+    @property
+    def tree(self):
+        """
+        The spatial index of the roads.
+        """
+        if self.__tree is None:
+            self.__tree = shapely.STRtree(self.geometries)
+        return self.__tree
+
+    def faces(self, convex_hull=False):
+        """
+        Return the faces of the road network.
+
+        Parameters
+        ----------
+        convex_hull : bool, optional
+            If True, add the convex hull of the network to create the outside faces.
+
+        Returns
+        -------
+        list of Polygon
+        """
+        if convex_hull not in self.__faces:
+            self.__faces[convex_hull] = list(network_faces(self.geometries, convex_hull=convex_hull))
+        return self.__faces[convex_hull]
+
+    def face_tree(self, convex_hull=False):
+        """
+        Return the spatial index of the faces of the road network.
+        """
+        if convex_hull not in self.__face_trees:
+            self.__face_trees[convex_hull] = shapely.STRtree(self.faces(convex_hull))
+        return self.__face_trees[convex_hull]
+
+    def face_roads(self, convex_hull=False):
+        """
+        Return the indexes of the roads intersecting each face of the road network.
+
+        Returns
+        -------
+        list of list of int
+        """
+        if convex_hull not in self.__face_roads:
+            faces = self.faces(convex_hull)
+            incidence = [ [] for f in faces ]
+            if len(faces) > 0:
+                fids, rids = self.tree.query(faces, predicate='intersects')
+                # Group by face while keeping the order of the spatial index query
+                order = np.argsort(fids, kind='stable')
+                for fid, rid in zip(fids[order].tolist(), rids[order].tolist()):
+                    incidence[fid].append(rid)
+            self.__face_roads[convex_hull] = incidence
+        return self.__face_roads[convex_hull]
 
 class Crossroad:
     """
     An object representing a crossroad from one or multiple face(s) of a network.
+    The indexes of the roads intersecting the face can be provided if they are already known.
     """
-    def __init__(self, roads, tree, *faces):
+    def __init__(self, roads, tree, *faces, original=None):
         self.face = unary_union(*faces)
 
-        # Retrieve objects that intersects the considered network face using strtree
-        self.original = tree.query(self.face, predicate='intersects').tolist()
+        if original is None:
+            # Retrieve objects that intersects the considered network face using strtree
+            self.original = tree.query(self.face, predicate='intersects').tolist()
+        else:
+            self.original = list(original)
 
         self.original_geoms = []
         for i in self.original:
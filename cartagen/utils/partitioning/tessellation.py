@@ -1,15 +1,18 @@
 import math
 import numpy as np
+import shapely
 from shapely.geometry import Point, Polygon
 from shapely.strtree import STRtree
 
-def partition_grid(objects, width, height=None, shape='square'):
+def partition_grid(objects, width, height=None, shape='square', compact=False):
     """
     Partition objects using a grid of a given shape.
 
     This algorithm divides the extent of the provided objects
     using a regular grid of the specified shape and size and assign
-    the objects to the cell they intersects.
+    the objects to the cell they intersects. Objects are assigned
+    arithmetically from their coordinates in square grids, and using
+    a single :class:`STRtree <shapely.STRtree>` query for the other shapes.
 
     Parameters
     ----------
@@ -22,13 +25,19 @@ def partition_grid(objects, width, height=None, shape='square'):
         If set to None, the height equals the width.
     shape : str, optional
         Shape of the grid cells, can be 'square', 'diamond', 'hexagonal'.
+    compact : bool, optional
+        If set to True, the partition is returned as a compact index
+        instead of a list of lists. See the Returns section.
 
     Returns
     -------
     partition : tuple
         A tuple containing two elements :
 
-        #. A list of lists of index ordered by the grid cells
+        #. A list of lists of index ordered by the grid cells. If compact is True,
+           a tuple of two arrays (offsets, members) where members contains the index
+           of the objects ordered by grid cells, and the objects of the cell i are
+           ``members[offsets[i]:offsets[i + 1]]``.
         #. A list of the geometry of the grid cells
 
     See Also
@@ -43,31 +52,54 @@ def partition_grid(objects, width, height=None, shape='square'):
     >>> points = gpd.GeoDataFrame(geometry=[ Point(2, 1), Point(4, 2) ])
     >>> partition_grid(points, 1)
     ([[0], [1]], [<POLYGON ((2 1, 3 1, 3 2, 2 2, 2 1))>, <POLYGON ((3 1, 4 1, 4 2, 3 2, 3 1))>])
+    >>> partition_grid(points, 1, compact=True)
+    ((array([0, 1, 2]), array([0, 1])), [<POLYGON ((2 1, 3 1, 3 2, 2 2, 2 1))>, <POLYGON ((3 1, 4 1, 4 2, 3 2, 3 1))>])
     """
-    partition = ([], [])
-    grid = tessellate(objects.total_bounds, width, height, shape)
-
-    centroids = []
-    for i, o in objects.iterrows():
-        if o['geometry'].geom_type == 'Polygon':
-            centroids.append(o['geometry'].point_on_surface())
-        else:
-            centroids.append(o['geometry'].centroid)
-
-    done = []
-    for cell in grid:
-        contained = []
-        for i, c in enumerate(centroids):
-            # Using intersects to ensure every vertex is assigned
-            if cell.intersects(c):
-                # Check if it is not already added
-                if i not in done:
-                    contained.append(i)
-                    done.append(i)
-        partition[0].append(contained)
-        partition[1].append(cell)
-    
-    return partition
+    if height is None:
+        height = width
+
+    extent = objects.total_bounds
+    grid = tessellate(extent, width, height, shape)
+
+    geometries = np.asarray(objects.geometry.values)
+    polygons = shapely.get_type_id(geometries) == shapely.GeometryType.POLYGON
+    centroids = np.where(polygons, shapely.point_on_surface(geometries), shapely.centroid(geometries))
+
+    if shape == 'square':
+        xmin, ymin, xmax, ymax = extent
+        nb_columns = len(np.arange(xmin, xmax + width, width)) - 1
+        nb_rows = len(np.arange(ymin, ymax + height, height)) - 1
+        column, row = get_square_cells(shapely.get_x(centroids), shapely.get_y(centroids), xmin, ymin, width, height)
+        # Cells are ordered by column, then by row
+        cells = np.minimum(column, nb_columns - 1) * nb_rows + np.minimum(row, nb_rows - 1)
+        members = np.arange(len(centroids))
+    else:
+        cells, members = STRtree(centroids).query(grid, predicate='intersects')
+        # Using intersects to ensure every object is assigned, objects
+        # on the border of multiple cells are assigned to the first one
+        order = np.lexsort((cells, members))
+        cells, members = cells[order], members[order]
+        first = np.ones(len(members), dtype=bool)
+        first[1:] = members[1:] != members[:-1]
+        cells, members = cells[first], members[first]
+
+    order = np.lexsort((members, cells))
+    members = members[order]
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(cells, minlength=len(grid)))))
+
+    if compact:
+        return (offsets, members), grid
+
+    return [ members[offsets[i]:offsets[i + 1]].tolist() for i in range(len(grid)) ], grid
+
+def get_square_cells(x, y, xmin, ymin, width, height):
+    """
+    Return the column and the row of the cells of a square grid containing the provided coordinates.
+    The grid starts at (xmin, ymin). Coordinates lying on the border between cells belong to the lowest cell.
+    """
+    column = np.maximum(np.ceil((x - xmin) / width) - 1, 0).astype(int)
+    row = np.maximum(np.ceil((y - ymin) / height) - 1, 0).astype(int)
+    return column, row
 
 def tessellate(extent, width, height=None, shape='square'):
     """
@@ -185,23 +217,32 @@ def tessellate(extent, width, height=None, shape='square'):
         raise Exception('{0} shape not recognized.'.format(shape))
 
 class HexagonalTessellation:
-    corner = None # the top left corner of the tessellation
-    width = 0 # the width of the cells in the tessellation
-    envelope = None # the envelope of the tessellation
-    nb_columns = 0
-    nb_rows = 0
-    cells = []
+    """
+    A tessellation of flat-topped hexagonal cells covering an envelope.
 
+    Cells are identified by their row and column and are only created when they are requested.
+    The cells containing a point are found arithmetically using axial coordinates,
+    without building any geometry.
+
+    Parameters
+    ----------
+    envelope : Geometry
+        The geometry whose bounds define the extent of the tessellation.
+    width : float
+        The width of the cells in the tessellation, i.e. the distance between two opposite vertices.
+    """
     def __init__(self, envelope, width):
         self.envelope = envelope
         self.width = width
-        env_width = self.envelope.bounds[2] - self.envelope.bounds[0]
-        env_height = self.envelope.bounds[3] - self.envelope.bounds[1]
-        self.corner = Point(envelope.centroid.x
-        - (env_width / 2), envelope.centroid.y
-        + (env_height / 2))
+        # the radius of the circumscribed circle of the cells
+        self.radius = width / 2
+        xmin, ymin, xmax, ymax = self.envelope.bounds
+        # the top left corner of the tessellation
+        self.corner = Point(xmin, ymax)
+        self.nb_columns = 0
+        self.nb_rows = 0
+        self.__cells = {}
         self.__compute_row_col_nb()
-        self.__create_cells()
     
     def __compute_row_col_nb(self):
         col_size = self.width * 3 / 4
@@ -210,48 +251,77 @@ class HexagonalTessellation:
         self.nb_columns = round(env_width / col_size) + 2
         self.nb_rows = round(env_height / col_size) * 2 + 3
         return
-    
-    def __create_cells(self):
-        for i in range(0,self.nb_rows):
-            for j in range(0,self.nb_columns):
-                if (i % 2 == 0) and (j % 2 != 0):
-                    continue
-                if (i % 2 != 0) and (j % 2 == 0):
-                    continue
-                # now compute the center for hexagon (i,j)
-                xCenter = self.corner.x + (0.75 * self.width * (j - 1))
-                yCenter = self.corner.y + (math.sqrt(3) * self.width / 4) - (math.sqrt(3) * self.width * (i - 1) / 4)
-                self.cells.append(HexagonalCell(self,i,j,Point(xCenter,yCenter),self.width))
 
-        return
-    
-    def get_containing_cells(self, point):
+    @property
+    def cells(self):
+        """
+        The list of all the cells of the tessellation, ordered by row and column.
+        """
         cells = []
-        hexagons = []
-        for cell in self.cells:
-            hexagons.append(cell.get_geometry())
-            
-        tree = self.__get_STRtree(hexagons)
-        hids = tree.query(Point(point))
-
-        for hid in hids:
-            cells.append(self.cells[hid])
-            
+        for i in range(0, self.nb_rows):
+            for j in range(i % 2, self.nb_columns, 2):
+                cells.append(self.get_cell(i, j))
         return cells
-    
-    def __get_STRtree(self, hexagons):
-        tree = STRtree(hexagons)
-        return tree
 
-class HexagonalCell:
-    row = 0
-    column = 0
-    tessellation = None
-    center = None
-    radius = 0
-    width = 0
-    segment_size = 0
+    def get_cell(self, row, column):
+        """
+        Return the cell at the given row and column. Cells only exist where the
+        row and the column have the same parity.
+        """
+        key = (row, column)
+        cell = self.__cells.get(key)
+        if cell is None:
+            # now compute the center for hexagon (row, column)
+            x, y = self.__get_center(row, column)
+            cell = HexagonalCell(self, row, column, Point(x, y), self.width)
+            self.__cells[key] = cell
+        return cell
+
+    def get_containing_cells(self, point):
+        """
+        Return the cells containing the given point, ordered by row and column.
+        A point lying on the border between cells is contained by all of them.
+        """
+        return [ self.get_cell(i, j) for i, j in self.__locate(point[0], point[1]) ]
 
+    def __get_center(self, row, column):
+        x = self.corner.x + (0.75 * self.width * (column - 1))
+        y = self.corner.y + (math.sqrt(3) * self.width / 4) - (math.sqrt(3) * self.width * (row - 1) / 4)
+        return x, y
+
+    def __locate(self, x, y):
+        # The center of the cell (1, 1) is the origin of the axial coordinates
+        ox, oy = self.__get_center(1, 1)
+        dx, dy = x - ox, oy - y
+
+        # Convert to fractional axial coordinates and round them using cube coordinates
+        q = (2 / 3 * dx) / self.radius
+        r = (-1 / 3 * dx + math.sqrt(3) / 3 * dy) / self.radius
+        s = -q - r
+        rq, rr, rs = round(q), round(r), round(s)
+        dq, dr, ds = abs(rq - q), abs(rr - r), abs(rs - s)
+        if dq > dr and dq > ds:
+            rq = -rr - rs
+        elif dr > ds:
+            rr = -rq - rs
+
+        # The hexagonal cells are the Voronoi cells of their centers, so the cells
+        # containing the point are the ones with the nearest center
+        candidates = []
+        for nq, nr in ((0, 0), (1, 0), (1, -1), (0, -1), (-1, 0), (-1, 1), (0, 1)):
+            q1, r1 = rq + nq, rr + nr
+            row, column = 1 + 2 * r1 + q1, 1 + q1
+            cx, cy = self.__get_center(row, column)
+            candidates.append((math.hypot(x - cx, y - cy), row, column))
+
+        nearest = min(c[0] for c in candidates)
+        tolerance = self.width * 1e-9
+        return sorted((row, column) for d, row, column in candidates if d <= nearest + tolerance)
+
+class HexagonalCell:
+    """
+    A hexagonal cell of a hexagonal tessellation.
+    """
     def __init__(self, tessellation, row, column, center, width):
         self.tessellation = tessellation
         self.row = row
@@ -278,3 +348,6 @@ class HexagonalCell:
             return NotImplemented
 
         return self.row == other.row and self.column == other.column
+
+    def __hash__(self):
+        return hash((self.row, self.column))